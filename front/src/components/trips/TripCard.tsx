@@ -75,10 +75,10 @@ const TripCard: React.FC<TripCardProps> = ({
                         </div>
                     )}
 
-                    {trip.participants && (
+                    {(trip.participant_count !== undefined || trip.participants) && (
                         <div className="flex items-center text-gray-600">
                             <Users className="h-4 w-4 mr-2 text-teal-600" />
-                            <span>{trip.participants.length} participant(s)</span>
+                            <span>{trip.participant_count ?? trip.participants?.length} participant(s)</span>
                         </div>
                     )}
                 </div>
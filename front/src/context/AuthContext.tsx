@@ -1,5 +1,5 @@
 import React, { createContext, useState, useEffect, useContext } from 'react';
-import { User, LoginCredentials, RegistrationData } from '../types';
+import { User, LoginCredentials, RegistrationData, TokenPair } from '../types';
 import { authApi } from '../services/api';
 
 interface AuthContextType {
@@ -37,12 +37,32 @@ export const AuthProvider: React.FC<{ children: React.ReactNode }> = ({ children
         validateToken();
     }, [token]);
 
+    const storeTokens = (pair: TokenPair) => {
+        localStorage.setItem('token', pair.access_token);
+        localStorage.setItem('refreshToken', pair.refresh_token);
+        localStorage.setItem('tokenExpiresAt', String(Date.now() + pair.expires_in * 1000));
+        setToken(pair.access_token);
+    };
+
+    useEffect(() => {
+        // Access tokens are short-lived: renew a minute before expiry using the refresh token
+        const refreshToken = localStorage.getItem('refreshToken');
+        if (!token || !refreshToken) return;
+        const expiresAt = Number(localStorage.getItem('tokenExpiresAt') || 0);
+        const timer = setTimeout(async () => {
+            try {
+                storeTokens(await authApi.refresh(refreshToken));
+            } catch {
+                logout();
+            }
+        }, Math.max(expiresAt - Date.now() - 60_000, 0));
+        return () => clearTimeout(timer);
+    }, [token]);
+
     const login = async (credentials: LoginCredentials) => {
         setIsLoading(true);
         try {
-            const response = await authApi.login(credentials);
-            localStorage.setItem('token', response.access_token);
-            setToken(response.access_token);
+            storeTokens(await authApi.login(credentials));
             // In a real app, you'd make another call to get user details
             // or decode the JWT token if it contains user information
         } catch (error) {
@@ -67,7 +87,13 @@ export const AuthProvider: React.FC<{ children: React.ReactNode }> = ({ children
     };
 
     const logout = () => {
+        const refreshToken = localStorage.getItem('refreshToken');
+        if (localStorage.getItem('token')) {
+            authApi.logout(refreshToken).catch(() => undefined);
+        }
         localStorage.removeItem('token');
+        localStorage.removeItem('refreshToken');
+        localStorage.removeItem('tokenExpiresAt');
         setToken(null);
         setUser(null);
     };
@@ -1,6 +1,6 @@
 import React, { useState, useEffect } from 'react';
 import { useParams, Link, useNavigate } from 'react-router-dom';
-import { tripsApi, itineraryApi, messagesApi } from '../../services/api';
+import { tripsApi, messagesApi, MESSAGES_PAGE_SIZE } from '../../services/api';
 import { Trip, ItineraryItem, Message, MessageFormData } from '../../types';
 import { Calendar, MapPin, Users, Clock, Edit, ArrowLeft, Send, Trash } from 'lucide-react';
 import Button from '../../components/common/Button';
@@ -13,6 +13,9 @@ const TripDetailPage: React.FC = () => {
     const [trip, setTrip] = useState<Trip | null>(null);
     const [itinerary, setItinerary] = useState<ItineraryItem[]>([]);
     const [messages, setMessages] = useState<Message[]>([]);
+    // before_id of the next older history page; null when the whole history is loaded
+    const [olderMessagesBefore, setOlderMessagesBefore] = useState<number | null>(null);
+    const [isLoadingOlder, setIsLoadingOlder] = useState(false);
     const [newMessage, setNewMessage] = useState('');
     const [isLoading, setIsLoading] = useState(true);
     const [error, setError] = useState('');
@@ -32,15 +35,12 @@ const TripDetailPage: React.FC = () => {
             setIsLoading(true);
 
             try {
-                const [tripData, itineraryData, messagesData] = await Promise.all([
-                    tripsApi.getTrip(parseInt(tripId, 10)),
-                    itineraryApi.getItineraryItems(parseInt(tripId, 10)),
-                    messagesApi.getMessages(parseInt(tripId, 10))
-                ]);
+                const { trip: tripData, olderMessagesBefore: beforeId } = await tripsApi.getTripDetail(parseInt(tripId, 10));
 
                 setTrip(tripData);
-                setItinerary(itineraryData);
-                setMessages(messagesData);
+                setItinerary(tripData.itinerary_items || []);
+                setMessages(tripData.messages || []);
+                setOlderMessagesBefore(beforeId);
             } catch (err: any) {
                 setError(err.message || 'Не удалось загрузить данные о поездке');
             } finally {
@@ -51,6 +51,29 @@ const TripDetailPage: React.FC = () => {
         fetchData();
     }, [tripId]);
 
+    useEffect(() => {
+        if (!tripId) return;
+
+        return messagesApi.subscribe(parseInt(tripId, 10), (message) => {
+            setMessages(prev => prev.some(m => m.id === message.id) ? prev : [...prev, message]);
+        });
+    }, [tripId]);
+
+    const loadOlderMessages = async () => {
+        if (olderMessagesBefore === null) return;
+        setIsLoadingOlder(true);
+        try {
+            const older = await messagesApi.getMessagesBefore(numericTripId, olderMessagesBefore);
+            // the page comes newest first; the list is shown oldest first
+            setMessages(prev => [...[...older].reverse(), ...prev]);
+            setOlderMessagesBefore(older.length === MESSAGES_PAGE_SIZE ? older[older.length - 1].id : null);
+        } catch (err: any) {
+            alert(err.message || 'Failed to load older messages');
+        } finally {
+            setIsLoadingOlder(false);
+        }
+    };
+
     const handleJoinTrip = async () => {
         if (!isAuthenticated) {
             navigate('/login', { state: { redirect: `/trips/${tripId}` } });
@@ -102,7 +125,7 @@ const TripDetailPage: React.FC = () => {
 
         try {
             const sentMessage = await messagesApi.createMessage(numericTripId, messageData);
-            setMessages(prev => [...prev, sentMessage]);
+            setMessages(prev => prev.some(m => m.id === sentMessage.id) ? prev : [...prev, sentMessage]);
             setNewMessage('');
         } catch (err: any) {
             alert(err.message || 'Не удалось отправить сообщение');
@@ -308,6 +331,13 @@ const TripDetailPage: React.FC = () => {
                             <h2 className="text-xl font-semibold mb-4">Trip Discussion</h2>
 
                             <div className="bg-gray-50 rounded-lg border border-gray-200 mb-4">
+                                {olderMessagesBefore !== null && (
+                                    <div className="flex justify-center border-b border-gray-200 p-2">
+                                        <Button variant="outline" onClick={loadOlderMessages} disabled={isLoadingOlder}>
+                                            {isLoadingOlder ? 'Loading...' : 'Load older messages'}
+                                        </Button>
+                                    </div>
+                                )}
                                 <MessageList messages={messages} users={trip.participants || []} />
 
                                 {isAuthenticated ? (
@@ -11,6 +11,8 @@ const TripListPage: React.FC = () => {
     const [trips, setTrips] = useState<Trip[]>([]);
     const [filteredTrips, setFilteredTrips] = useState<Trip[]>([]);
     const [isLoading, setIsLoading] = useState(true);
+    const [isLoadingMore, setIsLoadingMore] = useState(false);
+    const [nextCursor, setNextCursor] = useState<string | null>(null);
     const [error, setError] = useState('');
     const { user, isAuthenticated } = useAuth();
 
@@ -19,14 +21,19 @@ const TripListPage: React.FC = () => {
     const [locationFilter, setLocationFilter] = useState('');
     const [startDateFilter, setStartDateFilter] = useState('');
     const [showFilters, setShowFilters] = useState(false);
+    const [myTripsOnly, setMyTripsOnly] = useState(false);
+
+    // The server returns trips page by page; the start date filter is applied server-side
+    const fetchPage = (cursor: string | null) =>
+        myTripsOnly ? tripsApi.getMyTrips(cursor) : tripsApi.getTrips(cursor, startDateFilter || undefined);
 
     useEffect(() => {
         const fetchTrips = async () => {
             setIsLoading(true);
             try {
-                const data = await tripsApi.getTrips();
-                setTrips(data);
-                setFilteredTrips(data);
+                const page = await fetchPage(null);
+                setTrips(page.items);
+                setNextCursor(page.nextCursor);
             } catch (err: any) {
                 setError(err.message || 'Failed to load trips');
             } finally {
@@ -35,7 +42,21 @@ const TripListPage: React.FC = () => {
         };
 
         fetchTrips();
-    }, []);
+    }, [myTripsOnly, startDateFilter]);
+
+    const loadMore = async () => {
+        if (!nextCursor) return;
+        setIsLoadingMore(true);
+        try {
+            const page = await fetchPage(nextCursor);
+            setTrips(prev => [...prev, ...page.items]);
+            setNextCursor(page.nextCursor);
+        } catch (err: any) {
+            setError(err.message || 'Failed to load trips');
+        } finally {
+            setIsLoadingMore(false);
+        }
+    };
 
     useEffect(() => {
         // Apply filters
@@ -122,6 +143,16 @@ const TripListPage: React.FC = () => {
                         />
                     </div>
 
+                    {isAuthenticated && (
+                        <Button
+                            variant={myTripsOnly ? 'primary' : 'outline'}
+                            onClick={() => setMyTripsOnly(!myTripsOnly)}
+                            className="flex items-center mb-4 md:mb-0"
+                        >
+                            {myTripsOnly ? 'All Trips' : 'My Trips'}
+                        </Button>
+                    )}
+
                     <Button
                         variant="outline"
                         onClick={() => setShowFilters(!showFilters)}
@@ -213,6 +244,14 @@ const TripListPage: React.FC = () => {
                     ))}
                 </div>
             )}
+
+            {!isLoading && !error && nextCursor && (
+                <div className="flex justify-center mt-8">
+                    <Button variant="outline" onClick={loadMore} disabled={isLoadingMore}>
+                        {isLoadingMore ? 'Loading...' : 'Load more trips'}
+                    </Button>
+                </div>
+            )}
         </div>
     );
 };
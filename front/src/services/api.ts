@@ -7,7 +7,9 @@ import {
     RegistrationData,
     TripFormData,
     ItineraryItemFormData,
-    MessageFormData
+    MessageFormData,
+    TokenPair,
+    Page
 } from '../types';
 
 const API_BASE_URL = 'http://localhost:8000';
@@ -21,6 +23,12 @@ const handleResponse = async (response: Response) => {
     return response.json();
 };
 
+// Paginated lists return the cursor of the next page in the X-Next-Cursor header
+const handlePageResponse = async <T>(response: Response): Promise<Page<T>> => {
+    const items: T[] = await handleResponse(response);
+    return { items, nextCursor: response.headers.get('X-Next-Cursor') };
+};
+
 // Function to get the auth token from localStorage
 const getToken = (): string | null => localStorage.getItem('token');
 
@@ -35,7 +43,7 @@ export const authApi = {
         return handleResponse(response);
     },
 
-    login: async (credentials: LoginCredentials): Promise<{ access_token: string }> => {
+    login: async (credentials: LoginCredentials): Promise<TokenPair> => {
         const formData = new FormData();
         formData.append('username', credentials.username);
         formData.append('password', credentials.password);
@@ -46,15 +54,48 @@ export const authApi = {
         });
         return handleResponse(response);
     },
+
+    // New token pair without the password; the refresh token is single-use
+    refresh: async (refreshToken: string): Promise<TokenPair> => {
+        const response = await fetch(`${API_BASE_URL}/token/refresh`, {
+            method: 'POST',
+            headers: { 'Content-Type': 'application/json' },
+            body: JSON.stringify({ refresh_token: refreshToken }),
+        });
+        return handleResponse(response);
+    },
+
+    logout: async (refreshToken: string | null): Promise<{ status: string }> => {
+        const response = await fetch(`${API_BASE_URL}/logout`, {
+            method: 'POST',
+            headers: { 'Content-Type': 'application/json', Authorization: `Bearer ${getToken()}` },
+            body: refreshToken ? JSON.stringify({ refresh_token: refreshToken }) : undefined,
+        });
+        return handleResponse(response);
+    },
 };
 
 // Trips API functions
 export const tripsApi = {
-    getTrips: async (): Promise<Trip[]> => {
-        const response = await fetch(`${API_BASE_URL}/trips`, {
+    // One page of trips ordered by id; pass nextCursor of the previous page to get the next one
+    getTrips: async (cursor?: string | null, startDateFrom?: string): Promise<Page<Trip>> => {
+        const params = new URLSearchParams();
+        if (cursor) params.set('after_id', cursor);
+        if (startDateFrom) params.set('start_date_from', startDateFrom);
+        const query = params.toString() ? `?${params}` : '';
+        const response = await fetch(`${API_BASE_URL}/trips${query}`, {
             headers: { Authorization: `Bearer ${getToken()}` },
         });
-        return handleResponse(response);
+        return handlePageResponse<Trip>(response);
+    },
+
+    // Trips the current user owns or joined, sorted by start date (keyset cursor in X-Next-Cursor)
+    getMyTrips: async (cursor?: string | null): Promise<Page<Trip>> => {
+        const query = cursor ? `?cursor=${encodeURIComponent(cursor)}` : '';
+        const response = await fetch(`${API_BASE_URL}/users/me/trips${query}`, {
+            headers: { Authorization: `Bearer ${getToken()}` },
+        });
+        return handlePageResponse<Trip>(response);
     },
 
     getTrip: async (id: number): Promise<Trip> => {
@@ -64,6 +105,19 @@ export const tripsApi = {
         return handleResponse(response);
     },
 
+    // Trip with owner, participants, itinerary and the latest messages in a single request;
+    // olderMessagesBefore is the before_id of the previous history page (X-Messages-Next), null if there is none
+    getTripDetail: async (id: number, include?: string[]): Promise<{ trip: Trip; olderMessagesBefore: number | null }> => {
+        const query = include ? `?include=${include.join(',')}` : '';
+        const response = await fetch(`${API_BASE_URL}/trips/${id}/detail${query}`, {
+            headers: { Authorization: `Bearer ${getToken()}` },
+        });
+        const trip: Trip = await handleResponse(response);
+        const next = response.headers.get('X-Messages-Next');
+        const beforeId = next ? new URL(next, API_BASE_URL).searchParams.get('before_id') : null;
+        return { trip, olderMessagesBefore: beforeId ? parseInt(beforeId, 10) : null };
+    },
+
     createTrip: async (data: TripFormData): Promise<Trip> => {
         const response = await fetch(`${API_BASE_URL}/trips`, {
             method: 'POST',
@@ -144,6 +198,8 @@ export const itineraryApi = {
 };
 
 // Messages API functions
+export const MESSAGES_PAGE_SIZE = 50;
+
 export const messagesApi = {
     getMessages: async (tripId: number): Promise<Message[]> => {
         const response = await fetch(`${API_BASE_URL}/trips/${tripId}/messages`, {
@@ -152,6 +208,14 @@ export const messagesApi = {
         return handleResponse(response);
     },
 
+    // Page of history older than beforeId, returned newest first
+    getMessagesBefore: async (tripId: number, beforeId: number, limit: number = MESSAGES_PAGE_SIZE): Promise<Message[]> => {
+        const response = await fetch(`${API_BASE_URL}/trips/${tripId}/messages?before_id=${beforeId}&limit=${limit}`, {
+            headers: { Authorization: `Bearer ${getToken()}` },
+        });
+        return handleResponse(response);
+    },
+
     createMessage: async (tripId: number, data: MessageFormData): Promise<Message> => {
         const response = await fetch(`${API_BASE_URL}/trips/${tripId}/messages`, {
             method: 'POST',
@@ -163,4 +227,11 @@ export const messagesApi = {
         });
         return handleResponse(response);
     },
+
+    // Subscribe to new messages of a trip; returns an unsubscribe function
+    subscribe: (tripId: number, onMessage: (message: Message) => void): (() => void) => {
+        const socket = new WebSocket(`${API_BASE_URL.replace(/^http/, 'ws')}/trips/${tripId}/ws`);
+        socket.onmessage = (event) => onMessage(JSON.parse(event.data));
+        return () => socket.close();
+    },
 };
\ No newline at end of file
@@ -16,6 +16,7 @@ export interface Trip {
     destination: string;
     duration_days?: number;
     owner_id: number;
+    participant_count?: number;
     owner?: User;
     participants?: User[];
     itinerary_items?: ItineraryItem[];
@@ -70,4 +71,17 @@ export interface ItineraryItemFormData {
 
 export interface MessageFormData {
     content: string;
-}
\ No newline at end of file
+}
+
+export interface TokenPair {
+    access_token: string;
+    refresh_token: string;
+    token_type: string;
+    expires_in: number;
+}
+
+// One page of a keyset-paginated list; nextCursor comes from the X-Next-Cursor header
+export interface Page<T> {
+    items: T[];
+    nextCursor: string | null;
+}
@@ -0,0 +1,86 @@
+from sqlalchemy import delete, insert, literal, update
+from sqlalchemy.dialects import postgresql, sqlite
+from sqlmodel import select
+
+from app.models import Trip, TripParticipantLink, ItineraryItem, Message, _utcnow
+
+
+# Проверки доступа как условия WHERE: права проверяются тем же запросом, который меняет данные,
+# без предварительной загрузки строки. Пустой результат означает «нет строки или нет прав».
+
+def is_trip_owner(trip_id: int, user_id: int):
+    """
+    Условие на таблицу trip: поездка trip_id принадлежит user_id
+    """
+    return (Trip.id == trip_id) & (Trip.owner_id == user_id)
+
+
+def owned_trip_id(trip_id: int, user_id: int):
+    """
+    Скалярный подзапрос: trip_id, если поездка принадлежит user_id, иначе NULL
+    """
+    return select(Trip.id).where(is_trip_owner(trip_id, user_id)).scalar_subquery()
+
+
+def update_trip_statement(trip_id: int, user_id: int, values: dict):
+    return update(Trip).where(is_trip_owner(trip_id, user_id)).values(**values).returning(Trip)
+
+
+def delete_trip_statements(trip_id: int, user_id: int):
+    """
+    Удаление поездки владельцем. Связанные строки обрабатываются так же, как раньше при session.delete:
+    участия удаляются, пункты маршрута и сообщения отвязываются. Каждое выражение ограничено
+    подзапросом владения, последнее возвращает id удалённой поездки.
+    """
+    owned = owned_trip_id(trip_id, user_id)
+    return [
+        delete(TripParticipantLink).where(TripParticipantLink.trip_id == owned),
+        update(ItineraryItem).where(ItineraryItem.trip_id == owned).values(trip_id=None),
+        update(Message).where(Message.trip_id == owned).values(trip_id=None),
+        delete(Trip).where(is_trip_owner(trip_id, user_id)).returning(Trip.id),
+    ]
+
+
+def insert_itinerary_item_statement(trip_id: int, user_id: int, values: dict):
+    """
+    INSERT ... SELECT из trip: строка вставляется, только если поездка принадлежит user_id
+    """
+    columns = list(values)
+    source = select(*(literal(values[name], ItineraryItem.__table__.c[name].type) for name in columns), Trip.id)
+    return insert(ItineraryItem).from_select(
+        columns + ["trip_id"], source.where(is_trip_owner(trip_id, user_id))
+    ).returning(ItineraryItem)
+
+
+def delete_itinerary_item_statement(trip_id: int, item_id: int, user_id: int):
+    return delete(ItineraryItem).where(
+        ItineraryItem.id == item_id,
+        ItineraryItem.trip_id == owned_trip_id(trip_id, user_id),
+    ).returning(ItineraryItem.id)
+
+
+def join_trip_statement(dialect: str, trip_id: int, user_id: int):
+    """
+    INSERT ... SELECT FROM trip ... ON CONFLICT DO NOTHING RETURNING: строка появляется, только если
+    поездка существует и пользователь ещё не участник. Повторный join ничего не вставляет и не падает.
+    """
+    source = select(literal(trip_id), literal(user_id), literal(_utcnow(), TripParticipantLink.__table__.c.joined_at.type))
+    dialect_insert = postgresql.insert if dialect == "postgresql" else sqlite.insert
+    return dialect_insert(TripParticipantLink).from_select(
+        ["trip_id", "user_id", "joined_at"], source.where(Trip.id == trip_id)
+    ).on_conflict_do_nothing().returning(TripParticipantLink.trip_id)
+
+
+def leave_trip_statement(trip_id: int, user_id: int):
+    return delete(TripParticipantLink).where(
+        TripParticipantLink.trip_id == trip_id, TripParticipantLink.user_id == user_id
+    ).returning(TripParticipantLink.trip_id)
+
+
+def change_participant_count_statement(trip_id: int, delta: int):
+    """
+    Атомарный сдвиг счётчика участников; вызывается в той же транзакции, что и вставка/удаление связи
+    """
+    return update(Trip).where(Trip.id == trip_id).values(
+        participant_count=Trip.participant_count + delta
+    ).returning(Trip.participant_count)
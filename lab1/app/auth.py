@@ -3,23 +3,66 @@ import time
 import json
 import hmac
 import hashlib
-from typing import Optional
+from typing import Dict, Optional
 import base64
 import secrets
+import asyncio
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from collections import OrderedDict
 from dotenv import load_dotenv
 
+from app.revocation import REVOCATION_SYNC_SECONDS
+
 load_dotenv()
 
 DEFAULT_SECRET = "66666666666666666666666"
 SECRET_KEY = os.getenv("SECRET_KEY", DEFAULT_SECRET)
 JWT_ALGORITHM = "HS256"
-JWT_EXPIRATION_SECONDS = 3600
+# kid ключа SECRET_KEY; им же проверяются токены без kid в заголовке
+LEGACY_KID = "default"
+
+def _parse_jwt_keys(value: str) -> Dict[str, str]:
+    """
+    JWT_KEYS="kid1:secret1,kid2:secret2" — все действующие ключи; без JWT_KEYS один ключ SECRET_KEY
+    """
+    if not value:
+        return {LEGACY_KID: SECRET_KEY}
+    keys = {}
+    for item in value.split(","):
+        kid, _, secret = item.strip().partition(":")
+        if not kid or not secret:
+            raise ValueError("JWT_KEYS must look like kid1:secret1,kid2:secret2")
+        keys[kid] = secret
+    return keys
+
+JWT_KEYS = _parse_jwt_keys(os.getenv("JWT_KEYS", ""))
+# ключ, которым подписываются новые токены; по умолчанию первый из JWT_KEYS
+JWT_ACTIVE_KID = os.getenv("JWT_ACTIVE_KID")
+# короткий access-токен на каждый запрос и долгий refresh-токен для его обновления без пароля
+ACCESS_TOKEN_TTL = int(os.getenv("ACCESS_TOKEN_TTL", "900"))
+REFRESH_TOKEN_TTL = int(os.getenv("REFRESH_TOKEN_TTL", str(30 * 24 * 3600)))
+TOKEN_CACHE_SIZE = int(os.getenv("TOKEN_CACHE_SIZE", "10000"))
+# не дольше интервала синхронизации отзывов: logout и смена пароля (tokens_valid_after) в другом воркере
+# сбрасывают кэш только у себя, здесь их запись кэша токенов переживёт не более REVOCATION_SYNC_SECONDS
+TOKEN_CACHE_TTL = min(float(os.getenv("TOKEN_CACHE_TTL", "300")), REVOCATION_SYNC_SECONDS)
+
+# параметры scrypt (N — CPU/память, r — размер блока, p — параллелизм)
+SCRYPT_N = int(os.getenv("PASSWORD_SCRYPT_N", "16384"))
+SCRYPT_R = int(os.getenv("PASSWORD_SCRYPT_R", "8"))
+SCRYPT_P = int(os.getenv("PASSWORD_SCRYPT_P", "1"))
+# сколько хэшей считается одновременно и сколько может ждать в очереди
+PASSWORD_HASH_WORKERS = int(os.getenv("PASSWORD_HASH_WORKERS", str(os.cpu_count() or 2)))
+PASSWORD_HASH_QUEUE = int(os.getenv("PASSWORD_HASH_QUEUE", "64"))
 
 def _urlsafe_base64_encode(data: bytes) -> str:
 
     raw = base64.urlsafe_b64encode(data).decode("utf-8")
     return raw.rstrip('=')
 
+def _urlsafe_base64_decode(data: str) -> bytes:
+    return base64.urlsafe_b64decode(data + '=' * (-len(data) % 4))
+
 class PasswordHasher:
     """
     Класс для хэширования паролей с уникальными солями
@@ -37,85 +80,303 @@ class PasswordHasher:
     def verify_password(password: str, salt: str, expected_hash: str) -> bool:
         return PasswordHasher.hash_password(password, salt) == expected_hash
 
+class ScryptHasher:
+    """
+    Хэширование паролей через scrypt (memory-hard KDF).
+    Формат: scrypt$N$r$p$соль$хэш — параметры хранятся вместе с хэшем,
+    поэтому стоимость можно поднимать без поломки старых записей.
+    """
+    PREFIX = "scrypt"
+
+    def __init__(self, n: int = SCRYPT_N, r: int = SCRYPT_R, p: int = SCRYPT_P, dklen: int = 64):
+        self.n = n
+        self.r = r
+        self.p = p
+        self.dklen = dklen
+
+    @staticmethod
+    def _derive(password: str, salt: str, n: int, r: int, p: int, dklen: int) -> str:
+        return hashlib.scrypt(
+            password.encode("utf-8"), salt=salt.encode("utf-8"),
+            n=n, r=r, p=p, dklen=dklen, maxmem=256 * n * r + 1024 * 1024
+        ).hex()
+
+    def hash(self, password: str) -> str:
+        salt = secrets.token_hex(16)
+        pass_hash = self._derive(password, salt, self.n, self.r, self.p, self.dklen)
+        return f"{self.PREFIX}${self.n}${self.r}${self.p}${salt}${pass_hash}"
+
+    def verify(self, password: str, stored_value: str) -> bool:
+        try:
+            _, n, r, p, salt, expected_hash = stored_value.split('$')
+            actual_hash = self._derive(password, salt, int(n), int(r), int(p), len(expected_hash) // 2)
+        except ValueError:
+            return False
+        return hmac.compare_digest(actual_hash, expected_hash)
+
+    def needs_rehash(self, stored_value: str) -> bool:
+        """
+        Хэш старого формата (salt$sha256) или с другими параметрами стоимости
+        """
+        return not stored_value.startswith(f"{self.PREFIX}${self.n}${self.r}${self.p}$")
+
+
+class HashingPoolBusy(RuntimeError):
+    """
+    Очередь на хэширование переполнена
+    """
+
+
+class HashingPool:
+    """
+    Отдельный ограниченный пул потоков для KDF: hashlib.scrypt отпускает GIL,
+    а event loop и общий threadpool не блокируются долгими вычислениями.
+    """
+    def __init__(self, workers: int = PASSWORD_HASH_WORKERS, max_queue: int = PASSWORD_HASH_QUEUE):
+        self.workers = workers
+        self.max_queue = max_queue
+        self._executor = ThreadPoolExecutor(max_workers=workers, thread_name_prefix="password-hash")
+        self._lock = threading.Lock()
+        self.pending = 0
+        self.completed = 0
+        self.rejected = 0
+        self.total_time = 0.0
+
+    async def run(self, fn, *args):
+        with self._lock:
+            if self.pending >= self.workers + self.max_queue:
+                self.rejected += 1
+                raise HashingPoolBusy("Password hashing queue is full")
+            self.pending += 1
+        loop = asyncio.get_running_loop()
+        try:
+            return await loop.run_in_executor(self._executor, self._timed, fn, args)
+        finally:
+            with self._lock:
+                self.pending -= 1
+
+    def _timed(self, fn, args):
+        start = time.perf_counter()
+        try:
+            return fn(*args)
+        finally:
+            elapsed = time.perf_counter() - start
+            with self._lock:
+                self.completed += 1
+                self.total_time += elapsed
+
+    def metrics(self) -> dict:
+        with self._lock:
+            return {
+                "workers": self.workers,
+                "in_flight": min(self.pending, self.workers),
+                "queue_depth": max(self.pending - self.workers, 0),
+                "max_queue": self.max_queue,
+                "completed": self.completed,
+                "rejected": self.rejected,
+                "avg_hash_ms": self.total_time / self.completed * 1000 if self.completed else 0.0,
+            }
+
+
 class TokenService:
     """
-    Класс для генерации и проверки jwt токенов.
+    Класс для генерации и проверки jwt токенов (HS256).
+    Всё, что не зависит от payload, считается один раз в конструкторе: закодированный header
+    для каждого ключа и HMAC-объект с уже обработанным ключом — на токен остаётся copy() + update().
+    Несколько ключей с kid: подписывает активный, проверяет любой из действующих (ротация без разлогина).
     """
-    def __init__(self, secret: str = SECRET_KEY, algorithm: str = JWT_ALGORITHM):
-        self.secret = secret
+    def __init__(self, keys: Optional[Dict[str, str]] = None, active_kid: Optional[str] = None, algorithm: str = JWT_ALGORITHM):
+        if algorithm != "HS256":
+            raise ValueError(f"Unsupported JWT algorithm: {algorithm}")
         self.algorithm = algorithm
+        keys = keys or JWT_KEYS
+        self.active_kid = active_kid or JWT_ACTIVE_KID or next(iter(keys))
+        if self.active_kid not in keys:
+            raise ValueError(f"Unknown JWT_ACTIVE_KID: {self.active_kid}")
+        self._macs = {kid: hmac.new(secret.encode("utf-8"), digestmod=hashlib.sha256) for kid, secret in keys.items()}
+        self._headers = {kid: self._encode_header({"alg": algorithm, "typ": "JWT", "kid": kid}) for kid in keys}
+        # header_b64 -> HMAC: известные заголовки проверяются без разбора JSON
+        self._mac_by_header = {self._headers[kid]: mac for kid, mac in self._macs.items()}
+        if LEGACY_KID in self._macs:
+            # токены, выпущенные до появления kid
+            self._mac_by_header[self._encode_header({"alg": algorithm, "typ": "JWT"})] = self._macs[LEGACY_KID]
+
+    @staticmethod
+    def _encode_header(header: dict) -> str:
+        return _urlsafe_base64_encode(json.dumps(header).encode("utf-8"))
+
+    def _sign(self, mac, signing_input: bytes) -> str:
+        signer = mac.copy()
+        signer.update(signing_input)
+        return _urlsafe_base64_encode(signer.digest())
 
-    def create_jwt(self, payload: dict) -> str:
-        header = {"alg": self.algorithm, "typ": "JWT"}
-        # кодирование header
-        header_b64 = _urlsafe_base64_encode(json.dumps(header).encode("utf-8"))
+    def _mac_for(self, header_b64: str):
+        mac = self._mac_by_header.get(header_b64)
+        if mac is not None:
+            return mac
+        # заголовок в другой сериализации (например, от другой библиотеки): разбираем и ищем по kid
+        header = json.loads(_urlsafe_base64_decode(header_b64))
+        if header.get("alg") != self.algorithm:
+            return None
+        return self._macs.get(header.get("kid", LEGACY_KID))
 
-        # добавление времени истечения
+    def create_jwt(self, payload: dict, ttl: int = ACCESS_TOKEN_TTL) -> str:
+        # время выпуска, истечения и уникальный jti (по нему токен можно отозвать)
+        now = int(time.time())
         payload_copy = dict(payload)
-        payload_copy["exp"] = int(time.time()) + JWT_EXPIRATION_SECONDS
-        payload_b64 = _urlsafe_base64_encode(json.dumps(payload_copy).encode("utf-8"))
-
-        # подписываем
-        signing_input = f"{header_b64}.{payload_b64}".encode("utf-8")
-        signature_bytes = hmac.new(
-            self.secret.encode("utf-8"),
-            signing_input,
-            hashlib.sha256
-        ).digest()
-        signature_b64 = _urlsafe_base64_encode(signature_bytes)
-        return f"{header_b64}.{payload_b64}.{signature_b64}"
-
-    def verify_jwt(self, token: str) -> Optional[dict]:
+        payload_copy["iat"] = now
+        payload_copy["exp"] = now + ttl
+        payload_copy.setdefault("jti", secrets.token_urlsafe(16))
+        payload_b64 = _urlsafe_base64_encode(json.dumps(payload_copy, separators=(",", ":")).encode("utf-8"))
+
+        signing_input = f"{self._headers[self.active_kid]}.{payload_b64}"
+        return f"{signing_input}.{self._sign(self._macs[self.active_kid], signing_input.encode('utf-8'))}"
+
+    def verify_jwt(self, token: str, token_type: str = "access") -> Optional[dict]:
+        """
+        payload проверенного токена или None. Токены без type (выпущенные до refresh-токенов) считаются access.
+        """
         try:
             header_b64, payload_b64, signature_b64 = token.split('.')
-            signing_input = f"{header_b64}.{payload_b64}".encode("utf-8")
-
-            expected_signature = hmac.new(
-                self.secret.encode("utf-8"),
-                signing_input,
-                hashlib.sha256
-            ).digest()
-            expected_b64 = _urlsafe_base64_encode(expected_signature)
+            mac = self._mac_for(header_b64)
+            if mac is None:
+                return None
+            expected_b64 = self._sign(mac, f"{header_b64}.{payload_b64}".encode("utf-8"))
             if not hmac.compare_digest(expected_b64, signature_b64):
                 return None
 
-            # декодирование payload
-            padded_b64 = payload_b64 + '=' * (-len(payload_b64) % 4)
-            payload_data = base64.urlsafe_b64decode(padded_b64.encode("utf-8"))
-            payload_json = json.loads(payload_data.decode("utf-8"))
+            payload_json = json.loads(_urlsafe_base64_decode(payload_b64))
 
             # проверка срока действия
             if payload_json.get("exp", 0) < time.time():
                 return None
+            if payload_json.get("type", "access") != token_type:
+                return None
 
             return payload_json
         except Exception:
             return None
 
 
+class TokenCache:
+    """
+    LRU-кэш проверенных токенов: payload и снимок пользователя живут до exp токена
+    (но не дольше ttl), чтобы не пересчитывать подпись и не ходить в БД на каждый запрос.
+    """
+    def __init__(self, max_size: int = TOKEN_CACHE_SIZE, ttl: float = TOKEN_CACHE_TTL):
+        self.max_size = max_size
+        self.ttl = ttl
+        self._entries: "OrderedDict[str, tuple]" = OrderedDict()
+        self._by_user: dict = {}
+        self._lock = threading.Lock()
+
+    def get(self, token: str):
+        """
+        Возвращает (payload, user) или None, если записи нет или она устарела
+        """
+        with self._lock:
+            entry = self._entries.get(token)
+            if entry is None:
+                return None
+            payload, user, expires_at = entry
+            if expires_at < time.time():
+                self._drop(token)
+                return None
+            self._entries.move_to_end(token)
+            return payload, user
+
+    def put(self, token: str, payload: dict, user) -> None:
+        expires_at = min(payload.get("exp", 0), time.time() + self.ttl)
+        with self._lock:
+            if token in self._entries:
+                self._drop(token)
+            self._entries[token] = (payload, user, expires_at)
+            self._by_user.setdefault(user.id, set()).add(token)
+            while len(self._entries) > self.max_size:
+                self._drop(next(iter(self._entries)))
+
+    def invalidate_token(self, token: str) -> None:
+        with self._lock:
+            if token in self._entries:
+                self._drop(token)
+
+    def invalidate_user(self, user_id: int) -> None:
+        """
+        Сбрасывает все токены пользователя (смена пароля, удаление)
+        """
+        with self._lock:
+            for token in list(self._by_user.get(user_id, ())):
+                self._drop(token)
+
+    def clear(self) -> None:
+        with self._lock:
+            self._entries.clear()
+            self._by_user.clear()
+
+    def _drop(self, token: str) -> None:
+        _, user, _ = self._entries.pop(token)
+        tokens = self._by_user.get(user.id)
+        if tokens is not None:
+            tokens.discard(token)
+            if not tokens:
+                del self._by_user[user.id]
+
+
 hasher = PasswordHasher()
+scrypt_hasher = ScryptHasher()
+hashing_pool = HashingPool()
 token_service = TokenService()
+token_cache = TokenCache()
+# хэш случайного пароля с текущими параметрами: проверка по нему для несуществующего пользователя
+# стоит столько же, сколько для настоящего, и время ответа /login не выдаёт, есть ли такой логин
+DUMMY_PASSWORD_HASH = scrypt_hasher.hash(secrets.token_hex(16))
 
 def hash_password(password: str) -> str:
     """
-    Генерирует соль, хэш + соль в одну строку
+    Хэш пароля в формате scrypt$N$r$p$соль$хэш
     """
-    salt = hasher.generate_salt()
-    pass_hash = hasher.hash_password(password, salt)
-    return f"{salt}${pass_hash}"
+    return scrypt_hasher.hash(password)
 
 def verify_password(password: str, stored_value: str) -> bool:
     """
-    Извлекает соль и сравнивает хэш
+    Проверяет пароль по scrypt-хэшу или по старому формату соль$sha256
     """
+    if stored_value.startswith(f"{ScryptHasher.PREFIX}$"):
+        return scrypt_hasher.verify(password, stored_value)
     try:
         salt, actual_hash = stored_value.split('$', 1)
     except ValueError:
         return False
-    return hasher.verify_password(password, salt, actual_hash)
+    return hmac.compare_digest(hasher.hash_password(password, salt), actual_hash)
 
-def create_jwt(payload: dict) -> str:
-    return token_service.create_jwt(payload)
+def needs_rehash(stored_value: str) -> bool:
+    return scrypt_hasher.needs_rehash(stored_value)
 
-def verify_jwt(token: str) -> Optional[dict]:
-    return token_service.verify_jwt(token)
+async def hash_password_async(password: str) -> str:
+    return await hashing_pool.run(hash_password, password)
+
+async def verify_password_async(password: str, stored_value: Optional[str]) -> bool:
+    """
+    stored_value=None (пользователь не найден) — проверка по DUMMY_PASSWORD_HASH, результат всегда False
+    """
+    if stored_value is None:
+        await hashing_pool.run(verify_password, password, DUMMY_PASSWORD_HASH)
+        return False
+    return await hashing_pool.run(verify_password, password, stored_value)
+
+def create_jwt(payload: dict, ttl: int = ACCESS_TOKEN_TTL) -> str:
+    return token_service.create_jwt(payload, ttl)
+
+def verify_jwt(token: str, token_type: str = "access") -> Optional[dict]:
+    return token_service.verify_jwt(token, token_type)
+
+def create_token_pair(user_id: int) -> dict:
+    """
+    Ответ login/refresh: короткий access-токен и refresh-токен для его обновления
+    """
+    return {
+        "access_token": create_jwt({"user_id": user_id, "type": "access"}),
+        "refresh_token": create_jwt({"user_id": user_id, "type": "refresh"}, REFRESH_TOKEN_TTL),
+        "token_type": "bearer",
+        "expires_in": ACCESS_TOKEN_TTL,
+    }
@@ -0,0 +1,179 @@
+import os
+import time
+import threading
+from collections import OrderedDict
+from typing import Any, Awaitable, Callable, Dict, Optional
+
+from fastapi import Response
+from fastapi.concurrency import run_in_threadpool
+from pydantic import TypeAdapter
+
+# кэш готовых JSON-ответов для редко меняющихся справочников
+RESPONSE_CACHE_BACKEND = os.getenv("RESPONSE_CACHE_BACKEND", "memory")
+RESPONSE_CACHE_TTL = float(os.getenv("RESPONSE_CACHE_TTL", "300"))
+RESPONSE_CACHE_SIZE = int(os.getenv("RESPONSE_CACHE_SIZE", "256"))
+REDIS_URL = os.getenv("REDIS_URL", "redis://localhost:6379/0")
+
+
+class CacheStats:
+    """
+    Счётчики попаданий и промахов по пространствам имён
+    """
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._counters: Dict[str, Dict[str, int]] = {}
+
+    def incr(self, namespace: str, name: str) -> None:
+        with self._lock:
+            counters = self._counters.setdefault(namespace, {"hits": 0, "misses": 0, "invalidations": 0})
+            counters[name] = counters.get(name, 0) + 1
+
+    def snapshot(self) -> dict:
+        with self._lock:
+            return {namespace: dict(counters) for namespace, counters in self._counters.items()}
+
+
+class MemoryResponseCache:
+    """
+    LRU в памяти процесса: не больше max_entries ответов, каждый живёт ttl секунд
+    """
+    def __init__(self, ttl: float = RESPONSE_CACHE_TTL, max_entries: int = RESPONSE_CACHE_SIZE):
+        self.ttl = ttl
+        self.max_entries = max_entries
+        self.stats = CacheStats()
+        self._entries: "OrderedDict[tuple, tuple]" = OrderedDict()
+        self._lock = threading.Lock()
+        # растёт при каждой инвалидации пространства: ответ, посчитанный во время записи, не кэшируется
+        self._generations: Dict[str, int] = {}
+
+    def get(self, namespace: str, key: str) -> Optional[bytes]:
+        with self._lock:
+            entry = self._entries.get((namespace, key))
+            if entry is not None and entry[0] <= time.monotonic():
+                del self._entries[(namespace, key)]
+                entry = None
+            if entry is not None:
+                self._entries.move_to_end((namespace, key))
+        self.stats.incr(namespace, "hits" if entry is not None else "misses")
+        return entry[1] if entry is not None else None
+
+    def generation(self, namespace: str) -> int:
+        with self._lock:
+            return self._generations.get(namespace, 0)
+
+    def set(self, namespace: str, key: str, body: bytes, generation: Optional[int] = None) -> None:
+        """
+        generation — значение generation(namespace) до загрузки данных: если с тех пор была инвалидация, ответ не кладётся
+        """
+        with self._lock:
+            if generation is not None and generation != self._generations.get(namespace, 0):
+                return
+            self._entries[(namespace, key)] = (time.monotonic() + self.ttl, body)
+            self._entries.move_to_end((namespace, key))
+            while len(self._entries) > self.max_entries:
+                evicted, _ = self._entries.popitem(last=False)
+                self.stats.incr(evicted[0], "evictions")
+
+    def invalidate(self, namespace: str) -> None:
+        with self._lock:
+            self._generations[namespace] = self._generations.get(namespace, 0) + 1
+            for key in [k for k in self._entries if k[0] == namespace]:
+                del self._entries[key]
+        self.stats.incr(namespace, "invalidations")
+
+    def metrics(self) -> dict:
+        with self._lock:
+            size = len(self._entries)
+        return {"backend": "memory", "size": size, "max_entries": self.max_entries, "namespaces": self.stats.snapshot()}
+
+
+class RedisResponseCache(MemoryResponseCache):
+    """
+    Тот же интерфейс поверх Redis (общий кэш для нескольких воркеров);
+    размер ограничивается maxmemory-policy самого Redis, здесь только TTL
+    """
+    def __init__(self, url: str = REDIS_URL, ttl: float = RESPONSE_CACHE_TTL, prefix: str = "response-cache"):
+        import redis
+
+        super().__init__(ttl=ttl)
+        self.client = redis.Redis.from_url(url)
+        self.prefix = prefix
+        # запись только при неизменном поколении — атомарно на стороне Redis
+        self._set_if_generation = self.client.register_script(
+            "if (redis.call('GET', KEYS[1]) or '0') == ARGV[1] then "
+            "return redis.call('SET', KEYS[2], ARGV[2], 'EX', ARGV[3]) end return nil"
+        )
+
+    def _key(self, namespace: str, key: str) -> str:
+        return f"{self.prefix}:{namespace}:{key}"
+
+    def _generation_key(self, namespace: str) -> str:
+        # вне шаблона _key(namespace, "*"), чтобы invalidate не удалял счётчик вместе с ответами
+        return f"{self.prefix}-generation:{namespace}"
+
+    def generation(self, namespace: str) -> int:
+        return int(self.client.get(self._generation_key(namespace)) or 0)
+
+    def get(self, namespace: str, key: str) -> Optional[bytes]:
+        body = self.client.get(self._key(namespace, key))
+        self.stats.incr(namespace, "hits" if body is not None else "misses")
+        return body
+
+    def set(self, namespace: str, key: str, body: bytes, generation: Optional[int] = None) -> None:
+        ttl = max(1, int(self.ttl))
+        if generation is None:
+            self.client.set(self._key(namespace, key), body, ex=ttl)
+            return
+        self._set_if_generation(
+            keys=[self._generation_key(namespace), self._key(namespace, key)], args=[generation, body, ttl]
+        )
+
+    def invalidate(self, namespace: str) -> None:
+        # сначала поколение, потом удаление: запись, успевшая проскочить до INCR, будет удалена ниже
+        self.client.incr(self._generation_key(namespace))
+        keys = list(self.client.scan_iter(match=self._key(namespace, "*")))
+        if keys:
+            self.client.delete(*keys)
+        self.stats.incr(namespace, "invalidations")
+
+    def metrics(self) -> dict:
+        return {"backend": "redis", "namespaces": self.stats.snapshot()}
+
+
+def create_response_cache(backend: str = RESPONSE_CACHE_BACKEND) -> MemoryResponseCache:
+    """
+    Выбор реализации по RESPONSE_CACHE_BACKEND: memory или redis (нужен пакет redis)
+    """
+    if backend == "memory":
+        return MemoryResponseCache()
+    if backend == "redis":
+        return RedisResponseCache()
+    raise RuntimeError(f"Unknown RESPONSE_CACHE_BACKEND: {backend}")
+
+
+response_cache = create_response_cache()
+
+
+async def _call(func, *args):
+    # обращения к Redis блокирующие — уводим их из event loop, память дёргаем напрямую
+    if isinstance(response_cache, RedisResponseCache):
+        return await run_in_threadpool(func, *args)
+    return func(*args)
+
+
+async def cached_json_response(namespace: str, key: str, load: Callable[[], Awaitable[Any]], adapter: TypeAdapter) -> Response:
+    """
+    Отдаёт сериализованный ответ из кэша, а при промахе загружает данные, сериализует их и кладёт в кэш
+    """
+    body = await _call(response_cache.get, namespace, key)
+    status = "HIT"
+    if body is None:
+        generation = await _call(response_cache.generation, namespace)
+        body = adapter.dump_json(await load())
+        await _call(response_cache.set, namespace, key, body, generation)
+        status = "MISS"
+    return Response(content=body, media_type="application/json", headers={"X-Cache": status})
+
+
+async def invalidate(namespace: str) -> None:
+    await _call(response_cache.invalidate, namespace)
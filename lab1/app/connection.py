@@ -1,9 +1,17 @@
 import os
+import time
+import threading
 from contextlib import contextmanager
 from typing import Generator
 
 from dotenv import load_dotenv
+from fastapi.concurrency import run_in_threadpool
+from sqlalchemy import exc
+from sqlalchemy.engine import make_url
+from sqlalchemy.pool import QueuePool, AsyncAdaptedQueuePool
+from sqlalchemy.ext.asyncio import create_async_engine
 from sqlmodel import SQLModel, create_engine, Session
+from sqlmodel.ext.asyncio.session import AsyncSession
 
 # Загрузка переменных окружения из .env
 load_dotenv()
@@ -13,30 +21,211 @@ DATABASE_URL = os.getenv("DB_ADMIN")
 if not DATABASE_URL:
     raise RuntimeError("Environment variable DB_ADMIN is not set")
 
+# Режим работы с БД: async — asyncpg в event loop, sync — psycopg2 в пуле потоков
+DB_MODE = os.getenv("DB_MODE", "async")
+if DB_MODE not in ("sync", "async"):
+    raise RuntimeError("Environment variable DB_MODE must be 'sync' or 'async'")
+
+_ASYNC_DRIVERS = {"postgresql": "postgresql+asyncpg", "sqlite": "sqlite+aiosqlite"}
+
+
+def _async_url(url: str) -> str:
+    """
+    URL для async-драйвера: DB_ASYNC_ADMIN, либо DB_ADMIN с заменой драйвера
+    """
+    explicit = os.getenv("DB_ASYNC_ADMIN")
+    if explicit:
+        return explicit
+    parsed = make_url(url)
+    backend = parsed.get_backend_name()
+    if backend not in _ASYNC_DRIVERS:
+        raise RuntimeError(f"No async driver for '{backend}', set DB_ASYNC_ADMIN")
+    return parsed.set(drivername=_ASYNC_DRIVERS[backend]).render_as_string(hide_password=False)
+
+
+def _env_flag(name: str, default: str) -> bool:
+    return os.getenv(name, default).lower() in ("1", "true", "yes")
+
+
+# Настройки пула соединений (echo по умолчанию выключен: логирование каждого SQL бьёт по пропускной способности)
+DB_ECHO = _env_flag("DB_ECHO", "0")
+DB_POOL_SIZE = int(os.getenv("DB_POOL_SIZE", "5"))
+DB_MAX_OVERFLOW = int(os.getenv("DB_MAX_OVERFLOW", "10"))
+DB_POOL_TIMEOUT = float(os.getenv("DB_POOL_TIMEOUT", "30"))
+DB_POOL_RECYCLE = int(os.getenv("DB_POOL_RECYCLE", "1800"))
+DB_POOL_PRE_PING = _env_flag("DB_POOL_PRE_PING", "1")
+DB_STATEMENT_TIMEOUT_MS = int(os.getenv("DB_STATEMENT_TIMEOUT_MS", "0"))
+
+
+class PoolWaitStats:
+    """
+    Сколько запросов ждали соединение из пула и как долго
+    """
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.checkouts = 0
+        self.timeouts = 0
+        self.total_wait = 0.0
+        self.max_wait = 0.0
+
+    def record(self, elapsed: float, timed_out: bool = False) -> None:
+        with self._lock:
+            self.checkouts += 1
+            self.timeouts += timed_out
+            self.total_wait += elapsed
+            self.max_wait = max(self.max_wait, elapsed)
+
+    def snapshot(self) -> dict:
+        with self._lock:
+            return {
+                "checkouts": self.checkouts,
+                "timeouts": self.timeouts,
+                "avg_wait_ms": self.total_wait / self.checkouts * 1000 if self.checkouts else 0.0,
+                "max_wait_ms": self.max_wait * 1000,
+            }
+
+
+def _timed_pool(base):
+    """
+    Подкласс пула, замеряющий время ожидания свободного соединения.
+    Класс и статистика создаются на каждый движок, поэтому пулы не смешивают счётчики,
+    а pool.recreate() (dispose, переподключение) продолжает ту же статистику.
+    """
+    stats = PoolWaitStats()
+
+    class TimedPool(base):
+        wait_stats = stats
+
+        def _do_get(self):
+            start = time.perf_counter()
+            try:
+                conn = super()._do_get()
+            except exc.TimeoutError:
+                stats.record(time.perf_counter() - start, timed_out=True)
+                raise
+            stats.record(time.perf_counter() - start)
+            return conn
+
+    return TimedPool
+
+
+def _engine_options(url: str, is_async: bool) -> dict:
+    options = {
+        "echo": DB_ECHO,
+        "poolclass": _timed_pool(AsyncAdaptedQueuePool if is_async else QueuePool),
+        "pool_size": DB_POOL_SIZE,
+        "max_overflow": DB_MAX_OVERFLOW,
+        "pool_timeout": DB_POOL_TIMEOUT,
+        "pool_recycle": DB_POOL_RECYCLE,
+        "pool_pre_ping": DB_POOL_PRE_PING,
+    }
+    if DB_STATEMENT_TIMEOUT_MS and make_url(url).get_backend_name() == "postgresql":
+        if is_async:
+            options["connect_args"] = {"server_settings": {"statement_timeout": str(DB_STATEMENT_TIMEOUT_MS)}}
+        else:
+            options["connect_args"] = {"options": f"-c statement_timeout={DB_STATEMENT_TIMEOUT_MS}"}
+    return options
+
+
 # Создание движка SQLAlchemy через SQLModel
-engine = create_engine(DATABASE_URL, echo=True)
+# (sync-движок нужен в обоих режимах: create_all, потоковая выгрузка, LISTEN/NOTIFY)
+engine = create_engine(DATABASE_URL, **_engine_options(DATABASE_URL, is_async=False))
+if DB_MODE == "async":
+    ASYNC_DATABASE_URL = _async_url(DATABASE_URL)
+    async_engine = create_async_engine(ASYNC_DATABASE_URL, **_engine_options(ASYNC_DATABASE_URL, is_async=True))
+else:
+    async_engine = None
+
+
+def _pool_status(pool) -> dict:
+    return {
+        "size": pool.size(),
+        "checked_out": pool.checkedout(),
+        "checked_in": pool.checkedin(),
+        "overflow": pool.overflow(),
+        **pool.wait_stats.snapshot(),
+    }
+
+
+def pool_metrics() -> dict:
+    """
+    Состояние пулов соединений: занятые, overflow и время ожидания
+    """
+    metrics = {"mode": DB_MODE, "sync": _pool_status(engine.pool)}
+    if async_engine is not None:
+        metrics["async"] = _pool_status(async_engine.sync_engine.pool)
+    return metrics
 
 def init_db():
     """
-    Инициализирует базу данных, создавая все таблицы
+    Инициализирует базу данных, создавая все таблицы и индексы поиска (tsvector в Postgres, FTS5 в SQLite)
     """
+    from app.search import install_postgres_search, install_sqlite_fts
+
     SQLModel.metadata.create_all(engine)
+    install_postgres_search(engine)
+    install_sqlite_fts(engine)
 
 @contextmanager
 def _session_manager() -> Generator[Session, None, None]:
     """
     Создание сессии с последующим закрытием после её завершения
     """
-    session = Session(engine)
+    session = Session(engine, expire_on_commit=False)
     try:
         yield session
     finally:
         session.close()
 
-def get_session():
+class SyncSessionAdapter:
+    """
+    Sync Session с тем же awaitable-интерфейсом, что у AsyncSession.
+    Блокирующие вызовы уходят в пул потоков, поэтому роуты не зависят от DB_MODE.
+    """
+    def __init__(self, session: Session):
+        self.session = session
+
+    def add(self, instance) -> None:
+        self.session.add(instance)
+
+    def add_all(self, instances) -> None:
+        self.session.add_all(instances)
+
+    async def exec(self, statement, **kwargs):
+        return await run_in_threadpool(self.session.exec, statement, **kwargs)
+
+    async def execute(self, statement, *args, **kwargs):
+        return await run_in_threadpool(self.session.execute, statement, *args, **kwargs)
+
+    async def get(self, entity, ident, **kwargs):
+        return await run_in_threadpool(self.session.get, entity, ident, **kwargs)
+
+    async def delete(self, instance) -> None:
+        await run_in_threadpool(self.session.delete, instance)
+
+    async def flush(self) -> None:
+        await run_in_threadpool(self.session.flush)
+
+    async def commit(self) -> None:
+        await run_in_threadpool(self.session.commit)
+
+    async def rollback(self) -> None:
+        await run_in_threadpool(self.session.rollback)
+
+    async def refresh(self, instance, **kwargs) -> None:
+        await run_in_threadpool(self.session.refresh, instance, **kwargs)
+
+async def get_session():
     """
-    Зависимость FastAPI для получения сессии к базе данных
+    Зависимость FastAPI для получения сессии к базе данных:
+    AsyncSession в режиме async, SyncSessionAdapter в режиме sync
     """
-    from sqlmodel import Session
-    with Session(engine) as session:
-        yield session
\ No newline at end of file
+    if DB_MODE == "async":
+        async with AsyncSession(async_engine, expire_on_commit=False) as session:
+            yield session
+    else:
+        session = Session(engine, expire_on_commit=False)
+        try:
+            yield SyncSessionAdapter(session)
+        finally:
+            await run_in_threadpool(session.close)
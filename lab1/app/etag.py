@@ -0,0 +1,36 @@
+import hashlib
+from typing import Optional
+
+from fastapi import Request, Response
+from sqlalchemy import func
+from sqlmodel import select
+
+
+def weak_etag(*parts) -> str:
+    """
+    Слабый ETag из версий строк: одинаковые данные дают одинаковый тег
+    """
+    digest = hashlib.md5(repr(parts).encode("utf-8")).hexdigest()
+    return f'W/"{digest}"'
+
+
+def fingerprint_statement(statement):
+    """
+    Дешёвый отпечаток выборки: count, max(updated_at) и сумма id по тем же строкам.
+    Меняется при вставке, удалении и изменении любой строки страницы.
+    """
+    page = statement.subquery()
+    return select(func.count(), func.max(page.c.updated_at), func.sum(page.c.id))
+
+
+def check_not_modified(request: Request, response: Response, etag: str) -> Optional[Response]:
+    """
+    Ставит ETag в ответ; если клиент прислал совпадающий If-None-Match — возвращает 304
+    """
+    if_none_match = request.headers.get("if-none-match")
+    if if_none_match:
+        tags = {tag.strip().removeprefix("W/") for tag in if_none_match.split(",")}
+        if "*" in tags or etag.removeprefix("W/") in tags:
+            return Response(status_code=304, headers={"ETag": etag})
+    response.headers["ETag"] = etag
+    return None
@@ -1,30 +1,50 @@
-from fastapi import FastAPI, Depends, HTTPException
+import asyncio
+import logging
+import time
+
+from fastapi import FastAPI, Depends, HTTPException, Query, Request, Response, WebSocket, WebSocketDisconnect
+from fastapi.concurrency import run_in_threadpool
+from fastapi.responses import StreamingResponse, JSONResponse
 from fastapi.middleware.cors import CORSMiddleware
 
-from typing import List
-from datetime import datetime, timedelta
-from sqlmodel import select, SQLModel, Session
+from typing import Any, List, Optional
+from datetime import date, datetime, timezone
+from pydantic import ValidationError, TypeAdapter
+from sqlalchemy import insert, tuple_, union
+from sqlalchemy.orm import selectinload
+from sqlmodel import select, SQLModel
 from fastapi.security import OAuth2PasswordBearer, OAuth2PasswordRequestForm, HTTPBearer, HTTPAuthorizationCredentials
 
-from app.auth import verify_jwt, verify_password, create_jwt, hash_password
-from app.connection import init_db, get_session
+from app.auth import (
+    verify_jwt, create_token_pair, token_cache,
+    hash_password_async, verify_password_async, needs_rehash,
+    hashing_pool, HashingPoolBusy
+)
+from app.connection import init_db, get_session, _session_manager, pool_metrics, engine, async_engine
+from app.pubsub import hub
+from app.etag import weak_etag, fingerprint_statement, check_not_modified
+from app.profiling import QueryProfilerMiddleware, instrument_engine
+from app import cache
+from app.fastjson import default_response_class, json_response
+from app.search import trip_search_statement, message_search_statement
+from app.revocation import revocation_store
+from app.access import (
+    update_trip_statement, delete_trip_statements,
+    insert_itinerary_item_statement, delete_itinerary_item_statement,
+    join_trip_statement, leave_trip_statement, change_participant_count_statement
+)
 from app.models import (
-    UserProfile, UserCreate,
+    UserProfile, UserCreate, RefreshRequest,
     Trip, TripCreate,
     TripParticipantLink,
     ItineraryItem, ItineraryItemCreate,
-    Message, MessageCreate, ChangePassword
+    Message, MessageCreate, ChangePassword,
+    TripDetail, TripParticipant, BulkItemError, ItineraryBulkResult, MessageBulkResult
 )
-import hashlib
-import jwt
-
-# jwt
-SECRET_KEY = "9f8aC3nVgB1rX5dZ7qW2LkE0mJsRtY4uAaTbHpN6xOiVzPgQeChMwKldUFyXEr39"
-ALGORITHM = "HS256"
-ACCESS_TOKEN_EXPIRE_MINUTES = 60
 
+logger = logging.getLogger(__name__)
 oauth2_scheme = OAuth2PasswordBearer(tokenUrl="/login")
-app = FastAPI()
+app = FastAPI(default_response_class=default_response_class())
 http_bearer = HTTPBearer()
 
 # CORS
@@ -36,55 +56,91 @@ app.add_middleware(
     ],
     allow_methods=["GET", "POST", "PUT", "PATCH", "DELETE", "OPTIONS"],
     allow_headers=["*"],
+    expose_headers=["X-Next-Cursor", "X-Next-Offset", "X-Messages-Next", "ETag"],
 )
 
+# число SQL-запросов и время в БД на каждый запрос (Server-Timing, лог медленных)
+instrument_engine(engine)
+if async_engine is not None:
+    instrument_engine(async_engine.sync_engine)
+app.add_middleware(QueryProfilerMiddleware)
+
 # инициализация бд
 @app.on_event("startup")
 def on_startup():
     init_db()
+    hub.start()
+
+@app.on_event("shutdown")
+def on_shutdown():
+    hub.stop()
 
-# хэширование паролей и генерация токенов
-# def hash_password(password: str) -> str:
-#     return hashlib.sha256(password.encode()).hexdigest()
+# метрики пула соединений для подбора DB_POOL_SIZE / DB_MAX_OVERFLOW
+@app.get("/health/db")
+def db_health():
+    return pool_metrics()
 
-def create_access_token(data: dict, expires_minutes: int = ACCESS_TOKEN_EXPIRE_MINUTES) -> str:
-    to_encode = data.copy()
-    expire = datetime.utcnow() + timedelta(minutes=expires_minutes)
-    to_encode.update({"exp": expire})
-    return jwt.encode(to_encode, SECRET_KEY, algorithm=ALGORITHM)
+# загрузка пула хэширования паролей (очередь, время хэша, отказы)
+@app.get("/health/auth")
+def auth_health():
+    return {**hashing_pool.metrics(), "revocation": revocation_store.metrics()}
 
-def get_current_user(
+# попадания и промахи кэша ответов (список пользователей)
+@app.get("/health/cache")
+def cache_health():
+    return cache.response_cache.metrics()
+
+@app.exception_handler(HashingPoolBusy)
+async def hashing_pool_busy_handler(request, exc: HashingPoolBusy):
+    return JSONResponse(status_code=503, content={"detail": "Server is busy, try again later"}, headers={"Retry-After": "1"})
+
+async def get_current_user(
     credentials: HTTPAuthorizationCredentials = Depends(http_bearer),
-    session: Session = Depends(get_session)
+    session=Depends(get_session)
 ) -> UserProfile:
     """
     Извлекаем пользователя по JWT-токену из заголовка Authorization: Bearer <token>.
+    Проверенные токены кэшируются вместе со снимком пользователя (не привязан к сессии).
     """
     token = credentials.credentials
+    # список отозванных jti в памяти; из БД читается лениво и раз в REVOCATION_SYNC_SECONDS
+    await revocation_store.ensure_loaded(session)
+    cached = token_cache.get(token)
+    if cached:
+        if revocation_store.is_revoked(cached[0].get("jti")):
+            raise HTTPException(status_code=401, detail="Token revoked")
+        return cached[1]
+
     payload = verify_jwt(token)
     if not payload:
         raise HTTPException(status_code=401, detail="Invalid or expired token")
+    if revocation_store.is_revoked(payload.get("jti")):
+        raise HTTPException(status_code=401, detail="Token revoked")
 
     user_id = payload.get("user_id")
-    user = session.get(UserProfile, user_id)
+    user = await session.get(UserProfile, user_id)
     if not user:
         raise HTTPException(status_code=401, detail="User not found")
+    if payload.get("iat", 0) < user.tokens_valid_after:
+        raise HTTPException(status_code=401, detail="Token revoked")
 
-    return user
+    snapshot = UserProfile.model_validate(user.model_dump())
+    token_cache.put(token, payload, snapshot)
+    return snapshot
 
 # Аутентификация
 @app.post("/register", response_model=UserProfile)
-def register(
+async def register(
         user: UserCreate,
-        session: Session = Depends(get_session)
+        session=Depends(get_session)
 ):
-    existing_user = session.exec(
+    existing_user = (await session.exec(
         select(UserProfile).where(UserProfile.username == user.username)
-    ).first()
+    )).first()
     if existing_user:
         raise HTTPException(status_code=400, detail="Username already exists")
 
-    hashed = hash_password(user.password)
+    hashed = await hash_password_async(user.password)
     db_user = UserProfile(
         username=user.username,
         hashed_password=hashed,
@@ -93,54 +149,160 @@ def register(
         preferences=user.preferences
     )
     session.add(db_user)
-    session.commit()
-    session.refresh(db_user)
+    await session.commit()
+    await cache.invalidate("users")
+    await session.refresh(db_user)
     return db_user
 
 @app.post("/login")
-def login(
+async def login(
     user_in: UserCreate,
-    session: Session = Depends(get_session)
+    session=Depends(get_session)
 ):
-    user = session.exec(
+    user = (await session.exec(
         select(UserProfile).where(UserProfile.username == user_in.username)
-    ).first()
-    if not user or not verify_password(user_in.password, user.hashed_password):
+    )).first()
+    # неизвестный логин проверяется по фиктивному хэшу — за то же время, что и существующий
+    if not await verify_password_async(user_in.password, user.hashed_password if user else None):
         raise HTTPException(status_code=401, detail="Invalid credentials")
 
-    token = create_jwt({"user_id": user.id})
-    return {"access_token": token, "token_type": "bearer"}
+    # старый формат или устаревшие параметры scrypt — перехэшируем, пока знаем пароль
+    if needs_rehash(user.hashed_password):
+        user.hashed_password = await hash_password_async(user_in.password)
+        session.add(user)
+        await session.commit()
+        await cache.invalidate("users")
+
+    return create_token_pair(user.id)
+
+async def _revoke(session, payload: Optional[dict]) -> None:
+    # токены, выпущенные до появления jti, отозвать по отдельности нельзя — их отсекает tokens_valid_after
+    if payload and payload.get("jti"):
+        await revocation_store.revoke(session, engine.dialect.name, payload["jti"], payload["exp"])
+
+@app.post("/token/refresh")
+async def refresh_token(body: RefreshRequest, session=Depends(get_session)):
+    """
+    Новая пара токенов по refresh-токену: только подпись и поиск пользователя по id, без хэша пароля.
+    Refresh-токен одноразовый — его jti отзывается, повторное использование даёт 401.
+    """
+    payload = verify_jwt(body.refresh_token, token_type="refresh")
+    if not payload:
+        raise HTTPException(status_code=401, detail="Invalid or expired refresh token")
+    await revocation_store.ensure_loaded(session)
+    if revocation_store.is_revoked(payload.get("jti")):
+        raise HTTPException(status_code=401, detail="Token revoked")
+    user = await session.get(UserProfile, payload.get("user_id"))
+    if not user or payload.get("iat", 0) < user.tokens_valid_after:
+        raise HTTPException(status_code=401, detail="Token revoked")
+    # одновременный refresh тем же токеном: вставка jti пройдёт только у одного запроса
+    if not await revocation_store.revoke(session, engine.dialect.name, payload["jti"], payload["exp"]):
+        raise HTTPException(status_code=401, detail="Token revoked")
+    return create_token_pair(user.id)
+
+@app.post("/logout")
+async def logout(
+        body: Optional[RefreshRequest] = None,
+        credentials: HTTPAuthorizationCredentials = Depends(http_bearer),
+        current_user: UserProfile = Depends(get_current_user),
+        session=Depends(get_session)
+):
+    """
+    Отзывает текущий access-токен и, если передан, refresh-токен того же пользователя
+    """
+    await _revoke(session, verify_jwt(credentials.credentials))
+    token_cache.invalidate_token(credentials.credentials)
+    if body is not None:
+        refresh = verify_jwt(body.refresh_token, token_type="refresh")
+        if refresh and refresh.get("user_id") == current_user.id:
+            await _revoke(session, refresh)
+    return {"status": "logged_out"}
+
+# схемы для прямой сериализации ответов (кэш и FAST_JSON)
+USER_ADAPTER = TypeAdapter(UserProfile)
+USERS_ADAPTER = TypeAdapter(List[UserProfile])
+TRIP_ADAPTER = TypeAdapter(Trip)
+TRIPS_ADAPTER = TypeAdapter(List[Trip])
+TRIP_DETAIL_ADAPTER = TypeAdapter(TripDetail)
+ITINERARY_ADAPTER = TypeAdapter(List[ItineraryItem])
+MESSAGES_ADAPTER = TypeAdapter(List[Message])
+PARTICIPANTS_ADAPTER = TypeAdapter(List[TripParticipant])
 
 # получения данных текущего пользователя
 @app.get("/users/me", response_model=UserProfile)
-def read_current_user(current_user: UserProfile = Depends(get_current_user)):
+async def read_current_user(current_user: UserProfile = Depends(get_current_user)):
     """
     Возвращаем текущего авторизованного пользователя
     """
-    return current_user
+    return json_response(current_user, USER_ADAPTER)
+
+def _parse_trip_cursor(cursor: str):
+    # курсор ленты поездок: "<start_date>,<id>" последней поездки предыдущей страницы
+    try:
+        start_date, trip_id = cursor.split(",")
+        return date.fromisoformat(start_date), int(trip_id)
+    except ValueError:
+        raise HTTPException(status_code=422, detail="Invalid cursor")
+
+@app.get("/users/me/trips", response_model=List[Trip])
+async def list_my_trips(
+        response: Response,
+        cursor: Optional[str] = Query(None, description="Курсор из X-Next-Cursor: start_date,id"),
+        limit: int = Query(50, ge=1, le=200),
+        current_user: UserProfile = Depends(get_current_user),
+        session=Depends(get_session)
+):
+    """
+    Поездки, которые пользователь создал или в которых участвует, по возрастанию start_date.
+    id берутся одним UNION по покрывающим индексам (owner_id, id) и (user_id, trip_id),
+    поэтому стоимость зависит от числа поездок пользователя, а не от размера таблицы trip.
+    """
+    my_trip_ids = union(
+        select(Trip.id).where(Trip.owner_id == current_user.id),
+        select(TripParticipantLink.trip_id).where(TripParticipantLink.user_id == current_user.id),
+    ).subquery()
+    statement = select(Trip).join(my_trip_ids, my_trip_ids.c.id == Trip.id)
+    if cursor is not None:
+        statement = statement.where(tuple_(Trip.start_date, Trip.id) > tuple_(*_parse_trip_cursor(cursor)))
+    trips = (await session.exec(statement.order_by(Trip.start_date, Trip.id).limit(limit))).all()
+    if len(trips) == limit:
+        response.headers["X-Next-Cursor"] = f"{trips[-1].start_date.isoformat()},{trips[-1].id}"
+    return json_response(trips, TRIPS_ADAPTER, response)
+
+# получение списка всех пользователей: готовый JSON из кэша, сбрасывается при записи в userprofile
 
-# получение списка всех пользователей
 @app.get("/users", response_model=List[UserProfile])
-def list_users(session=Depends(get_session)):
-    return session.exec(select(UserProfile)).all()
+async def list_users(session=Depends(get_session)):
+    async def load():
+        return (await session.exec(select(UserProfile))).all()
+    return await cache.cached_json_response("users", "list", load, USERS_ADAPTER)
 
 # смена пароля текущего пользователя
 @app.post("/users/me/password")
-def change_password(
+async def change_password(
         passwords: ChangePassword,
+        credentials: HTTPAuthorizationCredentials = Depends(http_bearer),
         current_user: UserProfile = Depends(get_current_user),
         session=Depends(get_session)
 ):
 
+    # current_user — снимок из кэша токенов, изменяем запись из текущей сессии
+    db_user = await session.get(UserProfile, current_user.id)
+
     # проверка old пароля
-    if not verify_password(passwords.old_password, current_user.hashed_password):
+    if not await verify_password_async(passwords.old_password, db_user.hashed_password):
         raise HTTPException(status_code=400, detail="Old password is incorrect")
 
-    # установка new пароля
-    current_user.hashed_password = hash_password(passwords.new_password)
-    session.add(current_user)
-    session.commit()
-    return {"status": "password_changed"}
+    # установка new пароля; все выпущенные ранее токены (и access, и refresh) перестают приниматься
+    db_user.hashed_password = await hash_password_async(passwords.new_password)
+    db_user.tokens_valid_after = int(time.time())
+    session.add(db_user)
+    await session.commit()
+    token_cache.invalidate_user(db_user.id)
+    await cache.invalidate("users")
+    # текущий токен мог быть выпущен в ту же секунду — отзываем его явно
+    await _revoke(session, verify_jwt(credentials.credentials))
+    return {"status": "password_changed", **create_token_pair(db_user.id)}
 
 
 
@@ -148,105 +310,443 @@ def change_password(
 
 # CRUD поездок
 @app.post("/trips", response_model=Trip)
-def create_trip(trip: TripCreate, current_user: UserProfile = Depends(get_current_user), session=Depends(get_session)):
+async def create_trip(trip: TripCreate, current_user: UserProfile = Depends(get_current_user), session=Depends(get_session)):
     db_trip = Trip(**trip.dict(), owner_id=current_user.id)
     session.add(db_trip)
-    session.commit()
-    session.refresh(db_trip)
+    await session.commit()
+    await session.refresh(db_trip)
     return db_trip
 
 @app.get("/trips", response_model=List[Trip])
-def list_trips(session=Depends(get_session)):
-    return session.exec(select(Trip)).all()
+async def list_trips(
+        request: Request,
+        response: Response,
+        after_id: Optional[int] = Query(None, ge=0, description="Курсор: id последней поездки предыдущей страницы"),
+        limit: int = Query(50, ge=1, le=200),
+        origin: Optional[str] = None,
+        destination: Optional[str] = None,
+        owner_id: Optional[int] = None,
+        start_date_from: Optional[date] = None,
+        end_date_to: Optional[date] = None,
+        session=Depends(get_session)
+):
+    """
+    Keyset-пагинация по Trip.id: страница берётся через WHERE id > after_id,
+    поэтому стоимость запроса не зависит от номера страницы и размера таблицы.
+    Курсор следующей страницы возвращается в заголовке X-Next-Cursor.
+    """
+    statement = select(Trip)
+    if after_id is not None:
+        statement = statement.where(Trip.id > after_id)
+    if origin is not None:
+        statement = statement.where(Trip.origin == origin)
+    if destination is not None:
+        statement = statement.where(Trip.destination == destination)
+    if owner_id is not None:
+        statement = statement.where(Trip.owner_id == owner_id)
+    if start_date_from is not None:
+        statement = statement.where(Trip.start_date >= start_date_from)
+    if end_date_to is not None:
+        statement = statement.where(Trip.end_date <= end_date_to)
+
+    statement = statement.order_by(Trip.id).limit(limit)
+    stats = (await session.exec(fingerprint_statement(statement))).one()
+    not_modified = check_not_modified(request, response, weak_etag("trips", str(request.query_params), *stats))
+    if not_modified:
+        return not_modified
+
+    trips = (await session.exec(statement)).all()
+    if len(trips) == limit:
+        response.headers["X-Next-Cursor"] = str(trips[-1].id)
+    return json_response(trips, TRIPS_ADAPTER, response)
 
 @app.get("/trips/{trip_id}", response_model=Trip)
-def get_trip(trip_id: int, session=Depends(get_session)):
-    trip = session.get(Trip, trip_id)
+async def get_trip(trip_id: int, request: Request, response: Response, session=Depends(get_session)):
+    trip = await session.get(Trip, trip_id)
+    if not trip:
+        raise HTTPException(status_code=404, detail="Trip not found")
+    not_modified = check_not_modified(request, response, weak_etag("trip", trip.id, trip.updated_at))
+    if not_modified:
+        return not_modified
+    return json_response(trip, TRIP_ADAPTER, response)
+
+# связи, которые можно запросить в /trips/{trip_id}/detail
+TRIP_DETAIL_RELATIONS = {
+    "owner": Trip.owner,
+    "participants": Trip.participants,
+    "itinerary_items": Trip.itinerary_items,
+    "messages": Trip.messages,
+}
+# история сообщений в detail ограничена последними N, остальное — через GET /trips/{id}/messages?before_id=
+TRIP_DETAIL_MESSAGES = 50
+
+@app.get("/trips/{trip_id}/detail", response_model=TripDetail, response_model_exclude_unset=True)
+async def get_trip_detail(
+        trip_id: int,
+        response: Response,
+        include: str = Query(",".join(TRIP_DETAIL_RELATIONS), description="Связи через запятую: owner, participants, itinerary_items, messages"),
+        session=Depends(get_session)
+):
+    """
+    Вся страница поездки за один вызов: поездка плюс запрошенные связи,
+    каждая связь догружается одним SELECT ... IN (selectinload), итого не больше 1 + len(include) запросов.
+    messages — только последние TRIP_DETAIL_MESSAGES по возрастанию id; если есть более ранние,
+    ссылка на следующую страницу истории возвращается в заголовке X-Messages-Next.
+    """
+    fields = [name.strip() for name in include.split(",") if name.strip()]
+    unknown = [name for name in fields if name not in TRIP_DETAIL_RELATIONS]
+    if unknown:
+        raise HTTPException(status_code=422, detail=f"Unknown include: {', '.join(unknown)}")
+    relations = [name for name in fields if name != "messages"]
+
+    statement = select(Trip).where(Trip.id == trip_id).options(
+        *(selectinload(TRIP_DETAIL_RELATIONS[name]) for name in relations)
+    )
+    trip = (await session.exec(statement)).first()
     if not trip:
         raise HTTPException(status_code=404, detail="Trip not found")
-    return trip
+
+    data = trip.model_dump()
+    for name in relations:
+        related = getattr(trip, name)
+        data[name] = [obj.model_dump() for obj in related] if isinstance(related, list) else related
+    if "messages" in fields:
+        latest = (await session.exec(
+            select(Message).where(Message.trip_id == trip_id).order_by(Message.id.desc()).limit(TRIP_DETAIL_MESSAGES + 1)
+        )).all()
+        if len(latest) > TRIP_DETAIL_MESSAGES:
+            latest = latest[:TRIP_DETAIL_MESSAGES]
+            response.headers["X-Messages-Next"] = (
+                f"/trips/{trip_id}/messages?before_id={latest[-1].id}&limit={TRIP_DETAIL_MESSAGES}"
+            )
+        data["messages"] = [msg.model_dump() for msg in reversed(latest)]
+    return json_response(TripDetail.model_validate(data), TRIP_DETAIL_ADAPTER, response, exclude_unset=True)
 
 @app.patch("/trips/{trip_id}", response_model=Trip)
-def update_trip(trip_id: int, trip_data: TripCreate, current_user: UserProfile = Depends(get_current_user), session=Depends(get_session)):
-    db_trip = session.get(Trip, trip_id)
-    if not db_trip or db_trip.owner_id != current_user.id:
+async def update_trip(trip_id: int, trip_data: TripCreate, current_user: UserProfile = Depends(get_current_user), session=Depends(get_session)):
+    # владелец проверяется в WHERE самого UPDATE ... RETURNING — один запрос вместо get + update + refresh
+    result = await session.exec(update_trip_statement(trip_id, current_user.id, trip_data.model_dump(exclude_unset=True)))
+    db_trip = result.scalars().first()
+    if db_trip is None:
         raise HTTPException(status_code=404, detail="Trip not found or access denied")
-    update_data = trip_data.dict(exclude_unset=True)
-    for key, val in update_data.items():
-        setattr(db_trip, key, val)
-    session.add(db_trip)
-    session.commit()
-    session.refresh(db_trip)
+    await session.commit()
     return db_trip
 
 @app.delete("/trips/{trip_id}")
-def delete_trip(trip_id: int, current_user: UserProfile = Depends(get_current_user), session=Depends(get_session)):
-    db_trip = session.get(Trip, trip_id)
-    if not db_trip or db_trip.owner_id != current_user.id:
+async def delete_trip(trip_id: int, current_user: UserProfile = Depends(get_current_user), session=Depends(get_session)):
+    for statement in delete_trip_statements(trip_id, current_user.id):
+        result = await session.exec(statement)
+    if result.first() is None:
+        await session.rollback()
         raise HTTPException(status_code=404, detail="Trip not found or access denied")
-    session.delete(db_trip)
-    session.commit()
+    await session.commit()
     return {"status": "deleted"}
 
 # Управление участниками поездки
+async def _participant_count(session, trip_id: int) -> int:
+    count = (await session.exec(select(Trip.participant_count).where(Trip.id == trip_id))).first()
+    if count is None:
+        raise HTTPException(status_code=404, detail="Trip not found")
+    return count
+
 @app.post("/trips/{trip_id}/join")
-def join_trip(trip_id: int, current_user: UserProfile = Depends(get_current_user), session=Depends(get_session)):
-    link = TripParticipantLink(trip_id=trip_id, user_id=current_user.id, joined_at=str(datetime.utcnow()))
-    session.add(link)
-    session.commit()
-    return {"status": "joined"}
+async def join_trip(trip_id: int, current_user: UserProfile = Depends(get_current_user), session=Depends(get_session)):
+    """
+    Идемпотентно: повторный join не ошибка. Связь и счётчик меняются в одной транзакции.
+    """
+    joined = (await session.exec(join_trip_statement(engine.dialect.name, trip_id, current_user.id))).first()
+    if joined is not None:
+        count = (await session.exec(change_participant_count_statement(trip_id, 1))).scalar_one()
+        await session.commit()
+    else:
+        # поездки нет (404) или пользователь уже участник
+        count = await _participant_count(session, trip_id)
+    return {"status": "joined", "participant_count": count}
 
 @app.delete("/trips/{trip_id}/leave")
-def leave_trip(trip_id: int, current_user: UserProfile = Depends(get_current_user), session=Depends(get_session)):
-    link = session.get(TripParticipantLink, (trip_id, current_user.id))
-    if not link:
-        raise HTTPException(status_code=404, detail="Not a participant")
-    session.delete(link)
-    session.commit()
-    return {"status": "left"}
+async def leave_trip(trip_id: int, current_user: UserProfile = Depends(get_current_user), session=Depends(get_session)):
+    left = (await session.exec(leave_trip_statement(trip_id, current_user.id))).first()
+    if left is not None:
+        count = (await session.exec(change_participant_count_statement(trip_id, -1))).scalar_one()
+        await session.commit()
+    else:
+        count = await _participant_count(session, trip_id)
+    return {"status": "left", "participant_count": count}
+
+@app.get("/trips/{trip_id}/participants", response_model=List[TripParticipant])
+async def list_participants(
+        trip_id: int,
+        response: Response,
+        after_id: Optional[int] = Query(None, ge=0, description="Курсор: id последнего участника предыдущей страницы"),
+        limit: int = Query(50, ge=1, le=200),
+        since: Optional[datetime] = Query(None, description="Только вступившие не раньше (ISO 8601)"),
+        until: Optional[datetime] = Query(None, description="Только вступившие раньше (ISO 8601)"),
+        session=Depends(get_session)
+):
+    """
+    Участники поездки страницами по user_id (первичный ключ trip_id, user_id),
+    без загрузки всей связи participants. Курсор следующей страницы — в X-Next-Cursor.
+    """
+    statement = select(
+        UserProfile.id, UserProfile.username, UserProfile.full_name, UserProfile.bio, TripParticipantLink.joined_at
+    ).join(TripParticipantLink, TripParticipantLink.user_id == UserProfile.id).where(TripParticipantLink.trip_id == trip_id)
+    if after_id is not None:
+        statement = statement.where(TripParticipantLink.user_id > after_id)
+    if since is not None:
+        statement = statement.where(TripParticipantLink.joined_at >= _as_utc(since))
+    if until is not None:
+        statement = statement.where(TripParticipantLink.joined_at < _as_utc(until))
+    rows = (await session.exec(statement.order_by(TripParticipantLink.user_id).limit(limit))).all()
+    if not rows:
+        # пустая страница: отличаем несуществующую поездку
+        await _participant_count(session, trip_id)
+    participants = [TripParticipant(**row._asdict()) for row in rows]
+    if len(participants) == limit:
+        response.headers["X-Next-Cursor"] = str(participants[-1].id)
+    return json_response(participants, PARTICIPANTS_ADAPTER, response)
 
 # Эндпоинты для маршрута (itinerary)
 @app.post("/trips/{trip_id}/itinerary", response_model=ItineraryItem)
-def create_itinerary_item(trip_id: int, item: ItineraryItemCreate, current_user: UserProfile = Depends(get_current_user), session=Depends(get_session)):
-    trip = session.get(Trip, trip_id)
-    if not trip or trip.owner_id != current_user.id:
+async def create_itinerary_item(trip_id: int, item: ItineraryItemCreate, current_user: UserProfile = Depends(get_current_user), session=Depends(get_session)):
+    # INSERT ... SELECT FROM trip WHERE owner_id = ...: без прав строка просто не вставляется
+    result = await session.exec(insert_itinerary_item_statement(trip_id, current_user.id, item.model_dump()))
+    db_item = result.scalars().first()
+    if db_item is None:
         raise HTTPException(status_code=403, detail="Access denied")
-    db_item = ItineraryItem(**item.dict(), trip_id=trip_id)
-    session.add(db_item)
-    session.commit()
-    session.refresh(db_item)
+    await session.commit()
     return db_item
 
+# ограничение размера пакета для bulk-эндпоинтов
+MAX_BULK_ITEMS = 500
+
+def _validate_bulk(model, items: List[Any]):
+    """
+    Проверяет элементы пакета по отдельности: валидные уходят в вставку, остальные — в errors
+    """
+    if len(items) > MAX_BULK_ITEMS:
+        raise HTTPException(status_code=413, detail=f"At most {MAX_BULK_ITEMS} items per request")
+    valid, errors = [], []
+    for index, raw in enumerate(items):
+        try:
+            valid.append(model.model_validate(raw))
+        except ValidationError as e:
+            errors.append(BulkItemError(index=index, errors=e.errors(include_url=False, include_context=False)))
+    return valid, errors
+
+@app.post("/trips/{trip_id}/itinerary/bulk", response_model=ItineraryBulkResult)
+async def create_itinerary_items_bulk(trip_id: int, items: List[Any], current_user: UserProfile = Depends(get_current_user), session=Depends(get_session)):
+    """
+    Пакетное добавление пунктов маршрута: одна проверка владельца
+    и один многострочный INSERT ... RETURNING в одной транзакции
+    """
+    owner_id = (await session.exec(select(Trip.owner_id).where(Trip.id == trip_id))).first()
+    if owner_id is None or owner_id != current_user.id:
+        raise HTTPException(status_code=403, detail="Access denied")
+
+    valid, errors = _validate_bulk(ItineraryItemCreate, items)
+    created = []
+    if valid:
+        rows = [dict(item.model_dump(), trip_id=trip_id) for item in valid]
+        result = await session.exec(insert(ItineraryItem).returning(ItineraryItem), params=rows)
+        created = list(result.scalars())
+        await session.commit()
+    return ItineraryBulkResult(created=created, errors=errors)
+
 @app.get("/trips/{trip_id}/itinerary", response_model=List[ItineraryItem])
-def list_itinerary(trip_id: int, session=Depends(get_session)):
+async def list_itinerary(trip_id: int, request: Request, response: Response, session=Depends(get_session)):
     statement = select(ItineraryItem).where(ItineraryItem.trip_id == trip_id)
-    return session.exec(statement).all()
+    stats = (await session.exec(fingerprint_statement(statement))).one()
+    not_modified = check_not_modified(request, response, weak_etag("itinerary", trip_id, *stats))
+    if not_modified:
+        return not_modified
+    return json_response((await session.exec(statement)).all(), ITINERARY_ADAPTER, response)
 
 @app.delete("/trips/{trip_id}/itinerary/{item_id}")
-def delete_itinerary_item(trip_id: int, item_id: int, current_user: UserProfile = Depends(get_current_user), session=Depends(get_session)):
-    db_item = session.get(ItineraryItem, item_id)
-    if not db_item or db_item.trip_id != trip_id:
-        raise HTTPException(status_code=404, detail="Item not found")
-    trip = session.get(Trip, trip_id)
-    if trip.owner_id != current_user.id:
+async def delete_itinerary_item(trip_id: int, item_id: int, current_user: UserProfile = Depends(get_current_user), session=Depends(get_session)):
+    deleted = (await session.exec(delete_itinerary_item_statement(trip_id, item_id, current_user.id))).first()
+    if deleted is None:
+        # только на пути ошибки: отличаем «нет такого пункта» (404) от «чужая поездка» (403)
+        await session.rollback()
+        item = (await session.exec(
+            select(ItineraryItem.id).where(ItineraryItem.id == item_id, ItineraryItem.trip_id == trip_id)
+        )).first()
+        if item is None:
+            raise HTTPException(status_code=404, detail="Item not found")
         raise HTTPException(status_code=403, detail="Access denied")
-    session.delete(db_item)
-    session.commit()
+    await session.commit()
     return {"status": "deleted"}
 
+async def _publish(trip_id: int, messages: List[Message]) -> None:
+    """
+    Рассылка подписчикам после commit одним вызовом hub на весь пакет: сообщения уже сохранены,
+    поэтому сбой pub/sub только логируется, а не превращается в 500
+    """
+    try:
+        await run_in_threadpool(hub.publish_many, trip_id, messages)
+    except Exception:
+        logger.exception("failed to publish %d message(s) of trip %s", len(messages), trip_id)
+
 # Эндпоинты для сообщений
 @app.post("/trips/{trip_id}/messages", response_model=Message)
-def post_message(trip_id: int, msg: MessageCreate, current_user: UserProfile = Depends(get_current_user), session=Depends(get_session)):
-    trip = session.get(Trip, trip_id)
+async def post_message(trip_id: int, msg: MessageCreate, current_user: UserProfile = Depends(get_current_user), session=Depends(get_session)):
+    trip = await session.get(Trip, trip_id)
     if not trip:
         raise HTTPException(status_code=404, detail="Trip not found")
-    db_msg = Message(**msg.dict(), trip_id=trip_id, sender_id=current_user.id, timestamp=str(datetime.utcnow()))
+    db_msg = Message(**msg.dict(), trip_id=trip_id, sender_id=current_user.id)
     session.add(db_msg)
-    session.commit()
-    session.refresh(db_msg)
+    await session.commit()
+    await session.refresh(db_msg)
+    await _publish(trip_id, [db_msg])
     return db_msg
 
-@app.get("/trips/{trip_id}/messages", response_model=List[Message])
-def list_messages(trip_id: int, session=Depends(get_session)):
+@app.post("/trips/{trip_id}/messages/bulk", response_model=MessageBulkResult)
+async def post_messages_bulk(trip_id: int, items: List[Any], current_user: UserProfile = Depends(get_current_user), session=Depends(get_session)):
+    """
+    Пакетная отправка сообщений одним INSERT ... RETURNING
+    """
+    if (await session.exec(select(Trip.id).where(Trip.id == trip_id))).first() is None:
+        raise HTTPException(status_code=404, detail="Trip not found")
+
+    valid, errors = _validate_bulk(MessageCreate, items)
+    created = []
+    if valid:
+        timestamp = datetime.now(timezone.utc)
+        rows = [dict(msg.model_dump(), trip_id=trip_id, sender_id=current_user.id, timestamp=timestamp) for msg in valid]
+        result = await session.exec(insert(Message).returning(Message), params=rows)
+        created = list(result.scalars())
+        await session.commit()
+        await _publish(trip_id, created)
+    return MessageBulkResult(created=created, errors=errors)
+
+MESSAGES_STREAM_BATCH = 500
+
+
+def _as_utc(value: Optional[datetime]) -> Optional[datetime]:
+    # время без смещения в запросе считается UTC; SQLite хранит время без зоны, поэтому всё приводится к UTC
+    if value is None:
+        return None
+    if value.tzinfo is None:
+        return value.replace(tzinfo=timezone.utc)
+    return value.astimezone(timezone.utc)
+
+
+def _messages_statement(
+        trip_id: int, since_id: Optional[int], before_id: Optional[int], limit: Optional[int],
+        since: Optional[datetime] = None, until: Optional[datetime] = None,
+):
+    """
+    Выборка сообщений поездки по курсорам id (индекс trip_id, id) и интервалу времени
+    [since, until) (индекс trip_id, timestamp).
+    С before_id история листается назад, поэтому порядок обратный — от новых к старым.
+    """
     statement = select(Message).where(Message.trip_id == trip_id)
-    return session.exec(statement).all()
\ No newline at end of file
+    if since_id is not None:
+        statement = statement.where(Message.id > since_id)
+    if since is not None:
+        statement = statement.where(Message.timestamp >= since)
+    if until is not None:
+        statement = statement.where(Message.timestamp < until)
+    if before_id is not None:
+        statement = statement.where(Message.id < before_id).order_by(Message.id.desc())
+    else:
+        statement = statement.order_by(Message.id)
+    if limit is not None:
+        statement = statement.limit(limit)
+    return statement
+
+
+def _stream_messages_ndjson(statement):
+    """
+    Отдаёт сообщения построчно в NDJSON по мере чтения серверным курсором,
+    не собирая всю историю в памяти. Сессия своя: генератор живёт дольше зависимости.
+    """
+    with _session_manager() as session:
+        rows = session.exec(statement.execution_options(yield_per=MESSAGES_STREAM_BATCH))
+        for msg in rows:
+            yield msg.model_dump_json() + "\n"
+
+
+@app.get("/trips/{trip_id}/messages", response_model=List[Message])
+async def list_messages(
+        trip_id: int,
+        request: Request,
+        response: Response,
+        since_id: Optional[int] = Query(None, ge=0, description="Только сообщения с id больше указанного"),
+        before_id: Optional[int] = Query(None, ge=1, description="Страница истории до указанного id (от новых к старым)"),
+        since: Optional[datetime] = Query(None, description="Только сообщения, отправленные не раньше (ISO 8601)"),
+        until: Optional[datetime] = Query(None, description="Только сообщения, отправленные раньше (ISO 8601)"),
+        limit: Optional[int] = Query(None, ge=1, le=1000),
+        stream: bool = Query(False, description="Отдать ответ потоком в формате NDJSON"),
+        session=Depends(get_session)
+):
+    statement = _messages_statement(trip_id, since_id, before_id, limit, _as_utc(since), _as_utc(until))
+    if stream:
+        return StreamingResponse(_stream_messages_ndjson(statement), media_type="application/x-ndjson")
+    stats = (await session.exec(fingerprint_statement(statement))).one()
+    not_modified = check_not_modified(request, response, weak_etag("messages", str(request.query_params), *stats))
+    if not_modified:
+        return not_modified
+    return json_response((await session.exec(statement)).all(), MESSAGES_ADAPTER, response)
+
+
+# полнотекстовый поиск: tsvector + pg_trgm в Postgres, FTS5 в SQLite
+MAX_SEARCH_OFFSET = 1000
+
+@app.get("/search/trips", response_model=List[Trip])
+async def search_trips(
+        response: Response,
+        q: str = Query(..., min_length=1, max_length=200),
+        fuzzy: bool = Query(True, description="Нечёткое совпадение origin/destination (триграммы)"),
+        limit: int = Query(20, ge=1, le=100),
+        offset: int = Query(0, ge=0, le=MAX_SEARCH_OFFSET),
+        session=Depends(get_session)
+):
+    """
+    Поездки по релевантности. Ранжированную выдачу нельзя листать по id,
+    поэтому пагинация через offset, следующий offset — в заголовке X-Next-Offset.
+    """
+    statement = trip_search_statement(engine.dialect.name, q, fuzzy)
+    if statement is None:
+        return []
+    trips = (await session.exec(statement.offset(offset).limit(limit))).all()
+    if len(trips) == limit and offset + limit <= MAX_SEARCH_OFFSET:
+        response.headers["X-Next-Offset"] = str(offset + limit)
+    return json_response(trips, TRIPS_ADAPTER, response)
+
+@app.get("/search/messages", response_model=List[Message])
+async def search_messages(
+        response: Response,
+        q: str = Query(..., min_length=1, max_length=200),
+        trip_id: Optional[int] = None,
+        limit: int = Query(20, ge=1, le=100),
+        offset: int = Query(0, ge=0, le=MAX_SEARCH_OFFSET),
+        session=Depends(get_session)
+):
+    statement = message_search_statement(engine.dialect.name, q, trip_id)
+    if statement is None:
+        return []
+    messages = (await session.exec(statement.offset(offset).limit(limit))).all()
+    if len(messages) == limit and offset + limit <= MAX_SEARCH_OFFSET:
+        response.headers["X-Next-Offset"] = str(offset + limit)
+    return json_response(messages, MESSAGES_ADAPTER, response)
+
+@app.websocket("/trips/{trip_id}/ws")
+async def messages_ws(websocket: WebSocket, trip_id: int):
+    """
+    Канал новых сообщений поездки: вместо опроса /messages клиент получает только дельты
+    """
+    await websocket.accept()
+    async with hub.subscribe(trip_id) as queue:
+        async def forward():
+            while True:
+                await websocket.send_text(await queue.get())
+
+        sender = asyncio.create_task(forward())
+        try:
+            # входящие сообщения не нужны, ждём только отключения клиента
+            while True:
+                await websocket.receive_text()
+        except WebSocketDisconnect:
+            pass
+        finally:
+            sender.cancel()
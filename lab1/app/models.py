@@ -1,29 +1,73 @@
-from typing import Optional, List
+from datetime import date, datetime, timezone
+from typing import Any, Optional, List
+from sqlalchemy import DateTime, Index
 from sqlmodel import SQLModel, Field, Relationship
 
+def _utcnow() -> datetime:
+    return datetime.now(timezone.utc)
+
+def _updated_at_field():
+    """
+    Время последнего изменения строки — основа для ETag в read-эндпоинтах
+    """
+    return Field(
+        default_factory=_utcnow,
+        sa_type=DateTime(timezone=True),
+        sa_column_kwargs={"default": _utcnow, "onupdate": _utcnow},
+    )
+
+def _created_at_field():
+    """
+    Момент создания строки (UTC, timestamptz) — для фильтров since/until по времени
+    """
+    return Field(
+        default_factory=_utcnow,
+        sa_type=DateTime(timezone=True),
+        sa_column_kwargs={"default": _utcnow},
+    )
+
 # Ассоциативная таблица для участников поездки
 class TripParticipantLink(SQLModel, table=True):
+    # участники поездки в порядке вступления
+    __table_args__ = (
+        Index("ix_tripparticipantlink_trip_id_joined_at", "trip_id", "joined_at"),
+        # поездки пользователя: покрывающий индекс, trip_id берётся без обращения к таблице
+        Index("ix_tripparticipantlink_user_id_trip_id", "user_id", "trip_id"),
+    )
+
     trip_id: Optional[int] = Field(default=None, foreign_key="trip.id", primary_key=True)
     user_id: Optional[int] = Field(default=None, foreign_key="userprofile.id", primary_key=True)
-    joined_at: Optional[str]
+    joined_at: Optional[datetime] = _created_at_field()
 
 # Сущность для пункта маршрута (itinerary)
 class ItineraryItem(SQLModel, table=True):
+    __table_args__ = (
+        Index("ix_itineraryitem_trip_id", "trip_id"),
+    )
+
     id: Optional[int] = Field(default=None, primary_key=True)
     trip_id: Optional[int] = Field(default=None, foreign_key="trip.id")
     day_number: int
     location: str
     description: Optional[str]
+    updated_at: Optional[datetime] = _updated_at_field()
 
     trip: Optional["Trip"] = Relationship(back_populates="itinerary_items")
 
 # Сущность сообщений внутри поездки
 class Message(SQLModel, table=True):
+    # курсоры since_id / before_id и диапазоны since / until внутри одной поездки
+    __table_args__ = (
+        Index("ix_message_trip_id_id", "trip_id", "id"),
+        Index("ix_message_trip_id_timestamp", "trip_id", "timestamp"),
+    )
+
     id: Optional[int] = Field(default=None, primary_key=True)
     trip_id: Optional[int] = Field(default=None, foreign_key="trip.id")
     sender_id: Optional[int] = Field(default=None, foreign_key="userprofile.id")
     content: str
-    timestamp: Optional[str]
+    timestamp: Optional[datetime] = _created_at_field()
+    updated_at: Optional[datetime] = _updated_at_field()
 
     trip: Optional["Trip"] = Relationship(back_populates="messages")
     sender: Optional["UserProfile"] = Relationship(back_populates="sent_messages")
@@ -36,6 +80,8 @@ class UserProfile(SQLModel, table=True):
     full_name: Optional[str]
     bio: Optional[str]
     preferences: Optional[str]
+    # токены, выпущенные раньше этого момента (unix time, iat), не принимаются — сдвигается при смене пароля
+    tokens_valid_after: int = Field(default=0, sa_column_kwargs={"server_default": "0"}, exclude=True)
 
     # Поездки, созданные пользователем (one-to-many)
     trips: List["Trip"] = Relationship(back_populates="owner")
@@ -48,17 +94,34 @@ class UserProfile(SQLModel, table=True):
     # Отправленные сообщения (one-to-many)
     sent_messages: List[Message] = Relationship(back_populates="sender")
 
+# Отозванные токены (logout, ротация refresh-токенов); строка нужна только до exp токена
+class RevokedToken(SQLModel, table=True):
+    jti: str = Field(primary_key=True, max_length=64)
+    expires_at: int = Field(index=True)
+
 # Основная таблица поездок
 class Trip(SQLModel, table=True):
+    # составные индексы под фильтры и keyset-пагинацию по id в GET /trips
+    __table_args__ = (
+        Index("ix_trip_origin_id", "origin", "id"),
+        Index("ix_trip_destination_id", "destination", "id"),
+        Index("ix_trip_owner_id_id", "owner_id", "id"),
+        Index("ix_trip_start_date_id", "start_date", "id"),
+        Index("ix_trip_end_date_id", "end_date", "id"),
+    )
+
     id: Optional[int] = Field(default=None, primary_key=True)
     title: str
     description: Optional[str]
-    start_date: str
-    end_date: str
+    start_date: date
+    end_date: date
     origin: str
     destination: str
     duration_days: Optional[int]
     owner_id: Optional[int] = Field(default=None, foreign_key="userprofile.id")
+    # денормализованное число участников, меняется в той же транзакции, что и TripParticipantLink
+    participant_count: int = Field(default=0, sa_column_kwargs={"server_default": "0"})
+    updated_at: Optional[datetime] = _updated_at_field()
 
     # Владелец поездки (one-to-many)
     owner: Optional[UserProfile] = Relationship(back_populates="trips")
@@ -82,6 +145,9 @@ class UserCreate(SQLModel):
     preferences: Optional[str]  = None
     password: str  # будет хэшироваться при регистрации
 
+class RefreshRequest(SQLModel):
+    refresh_token: str
+
 # dto для смены пароля
 class ChangePassword(SQLModel):
     old_password: str
@@ -90,8 +156,8 @@ class ChangePassword(SQLModel):
 class TripCreate(SQLModel):
     title: str
     description: Optional[str]
-    start_date: str
-    end_date: str
+    start_date: date
+    end_date: date
     origin: str
     destination: str
     duration_days: Optional[int]
@@ -103,3 +169,45 @@ class ItineraryItemCreate(SQLModel):
 
 class MessageCreate(SQLModel):
     content: str
+
+# DTO-модели для ответов
+class UserPublic(SQLModel):
+    id: int
+    username: str
+    full_name: Optional[str] = None
+    bio: Optional[str] = None
+
+class TripParticipant(UserPublic):
+    joined_at: Optional[datetime] = None
+
+class TripDetail(SQLModel):
+    id: int
+    title: str
+    description: Optional[str]
+    start_date: date
+    end_date: date
+    origin: str
+    destination: str
+    duration_days: Optional[int]
+    owner_id: Optional[int]
+    participant_count: int = 0
+    updated_at: Optional[datetime] = None
+
+    # заполняются только запрошенные через include
+    owner: Optional[UserPublic] = None
+    participants: Optional[List[UserPublic]] = None
+    itinerary_items: Optional[List[ItineraryItem]] = None
+    messages: Optional[List[Message]] = None
+
+# результат пакетной вставки: созданные записи и ошибки по индексам входного массива
+class BulkItemError(SQLModel):
+    index: int
+    errors: List[Any]
+
+class ItineraryBulkResult(SQLModel):
+    created: List[ItineraryItem]
+    errors: List[BulkItemError]
+
+class MessageBulkResult(SQLModel):
+    created: List[Message]
+    errors: List[BulkItemError]
@@ -0,0 +1,125 @@
+import os
+import re
+import time
+import random
+import logging
+from contextvars import ContextVar
+from typing import Optional
+
+from sqlalchemy import event
+from starlette.datastructures import MutableHeaders
+
+logger = logging.getLogger(__name__)
+
+# запрос считается медленным по времени или по числу SQL (признак N+1)
+PROFILER_SLOW_MS = float(os.getenv("PROFILER_SLOW_MS", "500"))
+PROFILER_SLOW_QUERIES = int(os.getenv("PROFILER_SLOW_QUERIES", "20"))
+PROFILER_SAMPLE_RATE = float(os.getenv("PROFILER_SAMPLE_RATE", "1.0"))
+
+_VALUES_RE = re.compile(r"(\(\s*(?:\?|%\(\w+\)s|\$\d+|:\w+)(?:\s*,\s*(?:\?|%\(\w+\)s|\$\d+|:\w+))*\s*\))(?:\s*,\s*\1)+")
+_PARAM_RE = re.compile(r"%\(\w+\)s|\$\d+|:\w+|\?")
+_SPACE_RE = re.compile(r"\s+")
+
+
+def fingerprint(statement: str) -> str:
+    """
+    Нормализованный текст запроса: параметры заменены на ?, списки VALUES схлопнуты
+    """
+    normalized = _PARAM_RE.sub("?", _SPACE_RE.sub(" ", statement).strip())
+    return _VALUES_RE.sub(r"\1, ...", normalized)
+
+
+class RequestStats:
+    """
+    SQL-статистика одного HTTP-запроса
+    """
+    def __init__(self):
+        self.queries = 0
+        self.db_time = 0.0
+        self.statements = {}
+
+    def record(self, statement: str, elapsed: float) -> None:
+        self.queries += 1
+        self.db_time += elapsed
+        key = fingerprint(statement)
+        count, total = self.statements.get(key, (0, 0.0))
+        self.statements[key] = (count + 1, total + elapsed)
+
+
+_current_stats: ContextVar[Optional[RequestStats]] = ContextVar("request_sql_stats", default=None)
+
+
+# время старта хранится на контексте выполнения, а не в conn.info: statement, упавший с ошибкой,
+# не доходит до after_cursor_execute, и стек в соединении из пула рос бы и сбивал пары старт/финиш
+def _before_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    if context is not None:
+        context._profiler_start_time = time.perf_counter()
+
+
+def _after_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    start = getattr(context, "_profiler_start_time", None)
+    if start is None:
+        return
+    elapsed = time.perf_counter() - start
+    stats = _current_stats.get()
+    if stats is not None:
+        stats.record(statement, elapsed)
+
+
+def instrument_engine(engine) -> None:
+    """
+    Подписывает движок на события курсора; для AsyncEngine передавать engine.sync_engine
+    """
+    event.listen(engine, "before_cursor_execute", _before_cursor_execute)
+    event.listen(engine, "after_cursor_execute", _after_cursor_execute)
+
+
+class QueryProfilerMiddleware:
+    """
+    ASGI-middleware: считает SQL-запросы и время в БД на каждый запрос,
+    отдаёт их в заголовке Server-Timing и пишет в лог выборку медленных запросов
+    с отпечатками выполненных statement'ов.
+    """
+    def __init__(self, app, slow_ms: float = PROFILER_SLOW_MS, slow_queries: int = PROFILER_SLOW_QUERIES,
+                 sample_rate: float = PROFILER_SAMPLE_RATE):
+        self.app = app
+        self.slow_ms = slow_ms
+        self.slow_queries = slow_queries
+        self.sample_rate = sample_rate
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        stats = RequestStats()
+        token = _current_stats.set(stats)
+        start = time.perf_counter()
+
+        async def send_with_timing(message):
+            if message["type"] == "http.response.start":
+                elapsed = (time.perf_counter() - start) * 1000
+                headers = MutableHeaders(scope=message)
+                headers.append(
+                    "Server-Timing",
+                    f'db;dur={stats.db_time * 1000:.2f};desc="{stats.queries} queries", app;dur={elapsed:.2f}'
+                )
+            await send(message)
+
+        try:
+            await self.app(scope, receive, send_with_timing)
+        finally:
+            _current_stats.reset(token)
+            self._log_if_slow(scope, stats, (time.perf_counter() - start) * 1000)
+
+    def _log_if_slow(self, scope, stats: RequestStats, elapsed_ms: float) -> None:
+        if elapsed_ms < self.slow_ms and stats.queries < self.slow_queries:
+            return
+        if random.random() >= self.sample_rate:
+            return
+        top = sorted(stats.statements.items(), key=lambda item: item[1][1], reverse=True)[:10]
+        logger.warning(
+            "slow request %s %s: %.1f ms, %d queries, %.1f ms in db\n%s",
+            scope["method"], scope["path"], elapsed_ms, stats.queries, stats.db_time * 1000,
+            "\n".join(f"  {count}x {total * 1000:.1f} ms  {sql[:300]}" for sql, (count, total) in top),
+        )
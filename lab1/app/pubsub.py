@@ -0,0 +1,176 @@
+import os
+import json
+import asyncio
+import logging
+import select
+import threading
+from contextlib import asynccontextmanager
+from typing import Dict, List, Set, Tuple, AsyncIterator
+
+from dotenv import load_dotenv
+from sqlalchemy import text
+from sqlmodel import Session, select as sql_select
+
+from app.models import Message
+
+load_dotenv()
+
+logger = logging.getLogger(__name__)
+
+PUBSUB_BACKEND = os.getenv("PUBSUB_BACKEND", "memory")
+PUBSUB_CHANNEL = "trip_messages"
+SUBSCRIBER_QUEUE_SIZE = 100
+# id сообщений в одном NOTIFY: 500 id даже по 10 цифр укладываются в лимит payload 8000 байт
+NOTIFY_IDS_PER_PAYLOAD = 500
+# пауза перед переподключением слушателя LISTEN: удваивается после каждой неудачи до максимума
+PUBSUB_RETRY_MIN_SECONDS = float(os.getenv("PUBSUB_RETRY_MIN_SECONDS", "0.5"))
+PUBSUB_RETRY_MAX_SECONDS = float(os.getenv("PUBSUB_RETRY_MAX_SECONDS", "30"))
+
+
+def _put_nowait(queue: asyncio.Queue, data: str) -> None:
+    # медленный подписчик не должен тормозить остальных — лишнее просто отбрасываем
+    try:
+        queue.put_nowait(data)
+    except asyncio.QueueFull:
+        pass
+
+
+class MessageHub:
+    """
+    Внутрипроцессный pub/sub: подписчики одной поездки получают только новые сообщения.
+    publish можно вызывать из sync-роутов (пул потоков), доставка идёт через call_soon_threadsafe.
+    """
+    def __init__(self):
+        self._subscribers: Dict[int, Set[Tuple[asyncio.AbstractEventLoop, asyncio.Queue]]] = {}
+        self._lock = threading.Lock()
+
+    def start(self) -> None:
+        pass
+
+    def stop(self) -> None:
+        pass
+
+    @asynccontextmanager
+    async def subscribe(self, trip_id: int) -> AsyncIterator[asyncio.Queue]:
+        entry = (asyncio.get_running_loop(), asyncio.Queue(maxsize=SUBSCRIBER_QUEUE_SIZE))
+        with self._lock:
+            self._subscribers.setdefault(trip_id, set()).add(entry)
+        try:
+            yield entry[1]
+        finally:
+            with self._lock:
+                subscribers = self._subscribers.get(trip_id)
+                if subscribers is not None:
+                    subscribers.discard(entry)
+                    if not subscribers:
+                        del self._subscribers[trip_id]
+
+    def publish(self, trip_id: int, message: Message) -> None:
+        self.publish_many(trip_id, [message])
+
+    def publish_many(self, trip_id: int, messages: List[Message]) -> None:
+        for message in messages:
+            self._dispatch(trip_id, message.model_dump_json())
+
+    def _dispatch(self, trip_id: int, data: str) -> None:
+        with self._lock:
+            subscribers = list(self._subscribers.get(trip_id, ()))
+        for loop, queue in subscribers:
+            loop.call_soon_threadsafe(_put_nowait, queue, data)
+
+
+class PostgresMessageHub(MessageHub):
+    """
+    Рассылка через LISTEN/NOTIFY: publish уходит в Postgres, а каждый воркер uvicorn
+    слушает канал в отдельном потоке и раздаёт сообщения своим локальным подписчикам.
+    В NOTIFY передаются только id сообщений (payload ограничен 8000 байт), слушатель
+    читает саму строку из БД. При обрыве соединения слушатель переподключается с паузой;
+    сообщения, отправленные за время обрыва, клиент дочитывает через GET /trips/{id}/messages.
+    """
+    def __init__(self, engine, channel: str = PUBSUB_CHANNEL):
+        super().__init__()
+        self.engine = engine
+        self.channel = channel
+        self._stopped = threading.Event()
+        self._thread = None
+        self._retry_delay = PUBSUB_RETRY_MIN_SECONDS
+
+    def start(self) -> None:
+        self._stopped.clear()
+        self._thread = threading.Thread(target=self._listen, name="pubsub-listener", daemon=True)
+        self._thread.start()
+
+    def stop(self) -> None:
+        self._stopped.set()
+
+    def publish_many(self, trip_id: int, messages: List[Message]) -> None:
+        """
+        Одно соединение и одна транзакция на пакет: id уходят пачками по NOTIFY_IDS_PER_PAYLOAD
+        """
+        ids = [message.id for message in messages]
+        params = [
+            {"channel": self.channel, "payload": json.dumps({"trip_id": trip_id, "ids": ids[i:i + NOTIFY_IDS_PER_PAYLOAD]})}
+            for i in range(0, len(ids), NOTIFY_IDS_PER_PAYLOAD)
+        ]
+        if not params:
+            return
+        with self.engine.connect() as conn:
+            conn.execute(text("SELECT pg_notify(:channel, :payload)"), params)
+            conn.commit()
+
+    def _listen(self) -> None:
+        while not self._stopped.is_set():
+            try:
+                self._listen_once()
+            except Exception:
+                logger.exception("pubsub listener failed, reconnecting in %.1fs", self._retry_delay)
+                self._stopped.wait(self._retry_delay)
+                self._retry_delay = min(self._retry_delay * 2, PUBSUB_RETRY_MAX_SECONDS)
+
+    def _listen_once(self) -> None:
+        import psycopg2
+        import psycopg2.extensions
+
+        dsn = self.engine.url.set(drivername="postgresql").render_as_string(hide_password=False)
+        conn = psycopg2.connect(dsn)
+        conn.set_isolation_level(psycopg2.extensions.ISOLATION_LEVEL_AUTOCOMMIT)
+        try:
+            with conn.cursor() as cur:
+                cur.execute(f'LISTEN "{self.channel}"')
+            self._retry_delay = PUBSUB_RETRY_MIN_SECONDS
+            while not self._stopped.is_set():
+                if select.select([conn], [], [], 1.0) == ([], [], []):
+                    continue
+                conn.poll()
+                notifies = [json.loads(notify.payload) for notify in conn.notifies]
+                conn.notifies.clear()
+                if notifies:
+                    self._dispatch_rows(notifies)
+        finally:
+            conn.close()
+
+    def _dispatch_rows(self, notifies) -> None:
+        """
+        Одна выборка на все уведомления, пришедшие за один poll
+        """
+        with Session(self.engine) as session:
+            rows = session.exec(
+                sql_select(Message).where(Message.id.in_([i for n in notifies for i in n["ids"]])).order_by(Message.id)
+            ).all()
+        for row in rows:
+            self._dispatch(row.trip_id, row.model_dump_json())
+
+
+def create_hub(backend: str = PUBSUB_BACKEND) -> MessageHub:
+    """
+    Выбор реализации по PUBSUB_BACKEND: memory (один процесс) или postgres (несколько воркеров)
+    """
+    if backend == "memory":
+        return MessageHub()
+    if backend == "postgres":
+        from app.connection import engine
+        return PostgresMessageHub(engine)
+    raise RuntimeError(f"Unknown PUBSUB_BACKEND: {backend}")
+
+
+hub = create_hub()
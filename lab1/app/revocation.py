@@ -0,0 +1,144 @@
+import asyncio
+import hashlib
+import math
+import os
+import threading
+import time
+from typing import Dict, Optional
+
+from sqlalchemy import delete
+from sqlalchemy.dialects import postgresql, sqlite
+from sqlmodel import select
+
+from app.models import RevokedToken
+
+# ожидаемое число одновременно отозванных токенов и доля ложных срабатываний фильтра
+REVOCATION_BLOOM_CAPACITY = int(os.getenv("REVOCATION_BLOOM_CAPACITY", "100000"))
+REVOCATION_BLOOM_ERROR_RATE = float(os.getenv("REVOCATION_BLOOM_ERROR_RATE", "0.001"))
+# как часто процесс перечитывает список из БД (отзывы, сделанные другими воркерами)
+REVOCATION_SYNC_SECONDS = float(os.getenv("REVOCATION_SYNC_SECONDS", "30"))
+
+
+class BloomFilter:
+    """
+    Битовый массив на m бит и k хэшей (двойное хэширование blake2b):
+    «нет» — точно нет, «да» — возможно, нужно проверить точным множеством
+    """
+    def __init__(self, capacity: int = REVOCATION_BLOOM_CAPACITY, error_rate: float = REVOCATION_BLOOM_ERROR_RATE):
+        self.capacity = max(capacity, 1)
+        self.error_rate = error_rate
+        self.size = max(8, int(math.ceil(-self.capacity * math.log(error_rate) / math.log(2) ** 2)))
+        self.hashes = max(1, round(self.size / self.capacity * math.log(2)))
+        self._bits = bytearray((self.size + 7) // 8)
+
+    def _positions(self, key: str):
+        digest = hashlib.blake2b(key.encode("utf-8"), digest_size=16).digest()
+        h1 = int.from_bytes(digest[:8], "little")
+        h2 = int.from_bytes(digest[8:], "little") | 1
+        return ((h1 + i * h2) % self.size for i in range(self.hashes))
+
+    def add(self, key: str) -> None:
+        for position in self._positions(key):
+            self._bits[position >> 3] |= 1 << (position & 7)
+
+    def __contains__(self, key: str) -> bool:
+        return all(self._bits[position >> 3] & (1 << (position & 7)) for position in self._positions(key))
+
+
+def revoke_statement(dialect: str, jti: str, expires_at: int):
+    """
+    INSERT ... ON CONFLICT DO NOTHING RETURNING: пустой результат — jti уже был отозван
+    (так же ловится повторное использование refresh-токена)
+    """
+    dialect_insert = postgresql.insert if dialect == "postgresql" else sqlite.insert
+    return dialect_insert(RevokedToken).values(jti=jti, expires_at=expires_at).on_conflict_do_nothing().returning(
+        RevokedToken.jti
+    )
+
+
+class RevocationStore:
+    """
+    Отозванные jti в памяти процесса: блум-фильтр отсекает почти все проверки,
+    точное множество (jti -> exp) подтверждает срабатывания фильтра.
+    Источник истины — таблица revokedtoken; она читается лениво при первой проверке
+    и затем раз в sync_interval секунд.
+    """
+    def __init__(self, sync_interval: float = REVOCATION_SYNC_SECONDS, capacity: int = REVOCATION_BLOOM_CAPACITY):
+        self.sync_interval = sync_interval
+        self.capacity = capacity
+        self._bloom = BloomFilter(capacity)
+        self._revoked: Dict[str, int] = {}
+        # отзывы этого процесса, сделанные после начала текущей синхронизации: снимок из БД их может не содержать
+        self._added_during_sync: Dict[str, int] = {}
+        self._lock = threading.Lock()
+        self._sync_lock = asyncio.Lock()
+        self._next_sync = 0.0
+
+    def is_revoked(self, jti: Optional[str]) -> bool:
+        if not jti or jti not in self._bloom:
+            return False
+        with self._lock:
+            return jti in self._revoked
+
+    def _add(self, jti: str, expires_at: int) -> None:
+        with self._lock:
+            self._revoked[jti] = expires_at
+            self._added_during_sync[jti] = expires_at
+            if len(self._revoked) > self._bloom.capacity:
+                # фильтр переполнен — ложных срабатываний станет больше заданного, пересобираем вдвое больше
+                self._rebuild(self._bloom.capacity * 2)
+            else:
+                self._bloom.add(jti)
+
+    def _rebuild(self, capacity: int) -> None:
+        bloom = BloomFilter(capacity)
+        for jti in self._revoked:
+            bloom.add(jti)
+        self._bloom = bloom
+
+    async def ensure_loaded(self, session) -> None:
+        """
+        Дешёвая проверка на каждый запрос; раз в sync_interval — перечитывание действующих записей из БД
+        """
+        if time.monotonic() < self._next_sync:
+            return
+        async with self._sync_lock:
+            if time.monotonic() < self._next_sync:
+                return
+            with self._lock:
+                self._added_during_sync = {}
+            now = int(time.time())
+            rows = (await session.exec(
+                select(RevokedToken.jti, RevokedToken.expires_at).where(RevokedToken.expires_at > now)
+            )).all()
+            revoked = {jti: expires_at for jti, expires_at in rows}
+            with self._lock:
+                # revoke(), закоммиченный пока шёл SELECT, не должен пропасть до следующей синхронизации
+                revoked.update(self._added_during_sync)
+                self._revoked = revoked
+                self._rebuild(max(self.capacity, len(revoked) * 2))
+            self._next_sync = time.monotonic() + self.sync_interval
+
+    async def revoke(self, session, dialect: str, jti: str, expires_at: int) -> bool:
+        """
+        Отзывает jti до его exp и коммитит. False — jti уже был отозван раньше.
+        Заодно удаляет из таблицы записи, чей срок истёк: такие токены не пройдут проверку exp.
+        """
+        now = int(time.time())
+        inserted = (await session.exec(revoke_statement(dialect, jti, expires_at))).first()
+        await session.exec(delete(RevokedToken).where(RevokedToken.expires_at <= now))
+        await session.commit()
+        self._add(jti, expires_at)
+        return inserted is not None
+
+    def metrics(self) -> dict:
+        with self._lock:
+            return {
+                "revoked": len(self._revoked),
+                "bloom_bits": self._bloom.size,
+                "bloom_hashes": self._bloom.hashes,
+                "bloom_capacity": self._bloom.capacity,
+            }
+
+
+revocation_store = RevocationStore()
@@ -0,0 +1,143 @@
+import re
+from typing import Optional
+
+from sqlalchemy import Float, Integer, func, literal_column, or_, text
+from sqlmodel import select
+
+from app.models import Trip, Message
+
+# конфигурация без стемминга: текст поездок смешанный (русский, английский, названия городов)
+TS_CONFIG = literal_column("'simple'::regconfig")
+
+# SQLite: внешние FTS5-индексы поверх trip и message, синхронизируются триггерами.
+# trip_place_fts с токенизатором trigram — замена pg_trgm для нечёткого поиска по origin/destination.
+_SQLITE_FTS = {
+    "trip_fts": ("trip", ("title", "description", "origin", "destination"), ""),
+    "trip_place_fts": ("trip", ("origin", "destination"), ", tokenize='trigram'"),
+    "message_fts": ("message", ("content",), ""),
+}
+
+
+# Postgres: генерируемые tsvector-колонки (вес A — title, B — места, C — описание) и GIN-индексы;
+# то же создаёт миграция b71e0c9d4a36, здесь — для баз, созданных через create_all
+_POSTGRES_SEARCH_DDL = [
+    "CREATE EXTENSION IF NOT EXISTS pg_trgm",
+    "ALTER TABLE trip ADD COLUMN IF NOT EXISTS search_vector tsvector GENERATED ALWAYS AS ("
+    "setweight(to_tsvector('simple', coalesce(title, '')), 'A') || "
+    "setweight(to_tsvector('simple', coalesce(origin, '') || ' ' || coalesce(destination, '')), 'B') || "
+    "setweight(to_tsvector('simple', coalesce(description, '')), 'C')"
+    ") STORED",
+    "ALTER TABLE message ADD COLUMN IF NOT EXISTS search_vector tsvector GENERATED ALWAYS AS ("
+    "to_tsvector('simple', coalesce(content, ''))"
+    ") STORED",
+    "CREATE INDEX IF NOT EXISTS ix_trip_search_vector ON trip USING gin (search_vector)",
+    "CREATE INDEX IF NOT EXISTS ix_message_search_vector ON message USING gin (search_vector)",
+    "CREATE INDEX IF NOT EXISTS ix_trip_origin_trgm ON trip USING gin (origin gin_trgm_ops)",
+    "CREATE INDEX IF NOT EXISTS ix_trip_destination_trgm ON trip USING gin (destination gin_trgm_ops)",
+]
+
+
+def install_postgres_search(engine) -> None:
+    """
+    Создаёт колонки search_vector, GIN- и триграммные индексы, если их ещё нет
+    """
+    if engine.dialect.name != "postgresql":
+        return
+    with engine.begin() as conn:
+        for statement in _POSTGRES_SEARCH_DDL:
+            conn.exec_driver_sql(statement)
+
+
+def install_sqlite_fts(engine) -> None:
+    """
+    Создаёт FTS5-таблицы и триггеры для локальной SQLite-базы
+    """
+    if engine.dialect.name != "sqlite":
+        return
+    with engine.begin() as conn:
+        existing = set(conn.exec_driver_sql("SELECT name FROM sqlite_master WHERE type = 'table'").scalars())
+        for fts, (table, columns, options) in _SQLITE_FTS.items():
+            if fts in existing:
+                continue
+            cols = ", ".join(columns)
+            new = ", ".join(f"new.{c}" for c in columns)
+            old = ", ".join(f"old.{c}" for c in columns)
+            conn.exec_driver_sql(
+                f"CREATE VIRTUAL TABLE {fts} USING fts5({cols}, content='{table}', content_rowid='id'{options})"
+            )
+            conn.exec_driver_sql(
+                f"CREATE TRIGGER {fts}_ai AFTER INSERT ON {table} BEGIN "
+                f"INSERT INTO {fts}(rowid, {cols}) VALUES (new.id, {new}); END"
+            )
+            conn.exec_driver_sql(
+                f"CREATE TRIGGER {fts}_ad AFTER DELETE ON {table} BEGIN "
+                f"INSERT INTO {fts}({fts}, rowid, {cols}) VALUES ('delete', old.id, {old}); END"
+            )
+            conn.exec_driver_sql(
+                f"CREATE TRIGGER {fts}_au AFTER UPDATE ON {table} BEGIN "
+                f"INSERT INTO {fts}({fts}, rowid, {cols}) VALUES ('delete', old.id, {old}); "
+                f"INSERT INTO {fts}(rowid, {cols}) VALUES (new.id, {new}); END"
+            )
+            # индекс по уже существующим строкам
+            conn.exec_driver_sql(f"INSERT INTO {fts}({fts}) VALUES ('rebuild')")
+
+
+def _fts5_query(q: str) -> Optional[str]:
+    # пользовательский ввод не должен попадать в синтаксис MATCH: только слова, каждое как префикс
+    words = re.findall(r"\w+", q)
+    return " ".join(f'"{word}"*' for word in words) or None
+
+
+def trip_search_statement(dialect: str, q: str, fuzzy: bool = True):
+    """
+    Поездки по запросу q от лучших к худшим: полнотекстовый ранг по title/origin/destination/description,
+    плюс (fuzzy) похожесть origin/destination на q. None — если в q нет слов для поиска.
+    """
+    if dialect == "postgresql":
+        query = func.websearch_to_tsquery(TS_CONFIG, q)
+        vector = literal_column("trip.search_vector")
+        condition = vector.bool_op("@@")(query)
+        rank = func.ts_rank(vector, query)
+        if fuzzy:
+            # оператор % использует GIN-индексы gin_trgm_ops
+            condition = or_(condition, Trip.origin.bool_op("%")(q), Trip.destination.bool_op("%")(q))
+            rank = rank + func.greatest(func.similarity(Trip.origin, q), func.similarity(Trip.destination, q))
+        return select(Trip).where(condition).order_by(rank.desc(), Trip.id)
+
+    match = _fts5_query(q)
+    if match is None:
+        return None
+    # bm25 отрицательный: чем меньше, тем релевантнее; вес title выше описания
+    sql = "SELECT rowid AS id, bm25(trip_fts, 10.0, 1.0, 5.0, 5.0) AS rank FROM trip_fts WHERE trip_fts MATCH :match"
+    params = {"match": match}
+    if fuzzy and len(q.strip()) >= 3:
+        sql = (
+            f"SELECT id, min(rank) AS rank FROM ({sql} UNION ALL "
+            "SELECT rowid, bm25(trip_place_fts) FROM trip_place_fts WHERE trip_place_fts MATCH :place) GROUP BY id"
+        )
+        params["place"] = '"' + q.strip().replace('"', '""') + '"'
+    hits = text(sql).bindparams(**params).columns(id=Integer, rank=Float).subquery("hits")
+    return select(Trip).join(hits, hits.c.id == Trip.id).order_by(hits.c.rank, Trip.id)
+
+
+def message_search_statement(dialect: str, q: str, trip_id: Optional[int] = None):
+    """
+    Сообщения по запросу q от лучших к худшим, при равном ранге — новые первыми
+    """
+    if dialect == "postgresql":
+        query = func.websearch_to_tsquery(TS_CONFIG, q)
+        vector = literal_column("message.search_vector")
+        statement = select(Message).where(vector.bool_op("@@")(query)).order_by(
+            func.ts_rank(vector, query).desc(), Message.id.desc()
+        )
+    else:
+        match = _fts5_query(q)
+        if match is None:
+            return None
+        hits = text(
+            "SELECT rowid AS id, bm25(message_fts) AS rank FROM message_fts WHERE message_fts MATCH :match"
+        ).bindparams(match=match).columns(id=Integer, rank=Float).subquery("hits")
+        statement = select(Message).join(hits, hits.c.id == Message.id).order_by(hits.c.rank, Message.id.desc())
+    if trip_id is not None:
+        statement = statement.where(Message.trip_id == trip_id)
+    return statement
@@ -0,0 +1,256 @@
+"""
+Нагрузочный бенчмарк API поездок.
+
+Заполняет базу (по умолчанию локальный SQLite-файл) пользователями, поездками,
+пунктами маршрута и сообщениями, затем гоняет эндпоинты app.main конкурентными
+клиентами через httpx.ASGITransport — без сети и без uvicorn. Для каждого
+эндпоинта считаются throughput, p50/p95/p99 и число SQL-запросов на запрос.
+Запуск из каталога lab1:
+
+    python -m bench.api --trips 2000 --requests 500 --concurrency 16 --output bench.json
+    python -m bench.api --output new.json --compare bench.json
+    FAST_JSON=1 python -m bench.api --endpoints trips_large messages_list --compare bench.json
+
+my_trips должен держаться ровно при росте таблицы, если поездок на пользователя столько же:
+
+    python -m bench.api --users 100 --trips 1000 --endpoints my_trips
+    python -m bench.api --users 2000 --trips 20000 --endpoints my_trips
+
+Для Postgres достаточно задать DB_ADMIN (и DB_MODE) в окружении.
+"""
+import argparse
+import asyncio
+import json
+import os
+import random
+import statistics
+import subprocess
+import sys
+import time
+from datetime import date, datetime, timedelta, timezone
+
+BENCH_DB = "bench.sqlite3"
+# SQLite по умолчанию, чтобы бенчмарк запускался без внешних сервисов
+os.environ.setdefault("DB_ADMIN", f"sqlite:///{BENCH_DB}")
+
+import httpx
+from sqlalchemy import event, func, update
+from sqlmodel import select
+
+from app import connection
+from app.auth import create_jwt, hash_password
+from app.connection import init_db, _session_manager
+from app.main import app
+from app.models import UserProfile, Trip, TripParticipantLink, ItineraryItem, Message
+
+# (имя, метод, путь, нужна ли авторизация)
+SCENARIOS = [
+    ("trips_list", "GET", "/trips?limit=50", False),
+    ("trips_large", "GET", "/trips?limit=200", False),
+    ("trips_filtered", "GET", "/trips?origin=City{city}&limit=50", False),
+    ("trip_get", "GET", "/trips/{trip_id}", False),
+    ("trip_detail", "GET", "/trips/{trip_id}/detail", False),
+    ("itinerary_list", "GET", "/trips/{trip_id}/itinerary", False),
+    ("messages_list", "GET", "/trips/{trip_id}/messages?limit=100", False),
+    ("messages_range", "GET", "/trips/{trip_id}/messages?since=2025-01-01T00:10:00Z&until=2025-01-01T00:40:00Z", False),
+    ("trips_dates", "GET", "/trips?start_date_from=2025-06-01&end_date_to=2025-12-31&limit=50", False),
+    ("search_trips", "GET", "/search/trips?q=City{city}&limit=20", False),
+    ("search_messages", "GET", "/search/messages?q=message&trip_id={trip_id}&limit=20", False),
+    ("participants_list", "GET", "/trips/{trip_id}/participants?limit=50", False),
+    ("users_me", "GET", "/users/me", True),
+    ("my_trips", "GET", "/users/me/trips?limit=50", True),
+    ("message_post", "POST", "/trips/{trip_id}/messages", True),
+    ("trip_join", "POST", "/trips/{trip_id}/join", True),
+]
+CITIES = 20
+# сообщения поездки идут с интервалом в минуту от этого момента
+SEED_TIME = datetime(2025, 1, 1, tzinfo=timezone.utc)
+
+
+class QueryCounter:
+    """
+    Считает SQL-запросы на всех движках приложения
+    """
+    def __init__(self):
+        self.count = 0
+        engines = [connection.engine]
+        if connection.async_engine is not None:
+            engines.append(connection.async_engine.sync_engine)
+        for engine in engines:
+            event.listen(engine, "before_cursor_execute", self._on_execute)
+
+    def _on_execute(self, *args):
+        self.count += 1
+
+
+def seed(users: int, trips: int, items_per_trip: int, messages_per_trip: int, rng: random.Random) -> None:
+    """
+    Заполнение через модели app.models; пароль хэшируется один раз на всех
+    """
+    if connection.DATABASE_URL == f"sqlite:///{BENCH_DB}" and os.path.exists(BENCH_DB):
+        os.remove(BENCH_DB)
+    init_db()
+    hashed = hash_password("bench")
+    with _session_manager() as session:
+        session.add_all(UserProfile(username=f"user{i}", hashed_password=hashed) for i in range(users))
+        session.commit()
+        user_ids = list(session.exec(select(UserProfile.id)))
+
+        for i in range(trips):
+            trip = Trip(
+                title=f"Trip {i}", description="benchmark trip",
+                start_date=date(2025, rng.randint(1, 12), rng.randint(1, 28)), end_date=date(2025, 12, 31),
+                origin=f"City{rng.randrange(CITIES)}", destination=f"City{rng.randrange(CITIES)}",
+                duration_days=rng.randint(1, 30), owner_id=rng.choice(user_ids),
+            )
+            trip.itinerary_items = [
+                ItineraryItem(day_number=d + 1, location=f"Place {d}", description=None) for d in range(items_per_trip)
+            ]
+            trip.messages = [
+                Message(content=f"message {m}", sender_id=rng.choice(user_ids), timestamp=SEED_TIME + timedelta(minutes=m))
+                for m in range(messages_per_trip)
+            ]
+            session.add(trip)
+            if i % 500 == 499:
+                session.commit()
+        session.commit()
+
+        trip_ids = list(session.exec(select(Trip.id)))
+        links = {(rng.choice(trip_ids), rng.choice(user_ids)) for _ in range(trips)}
+        session.add_all(TripParticipantLink(trip_id=t, user_id=u, joined_at=SEED_TIME) for t, u in links)
+        # связи вставлены напрямую, минуя join — счётчики пересчитываются одним UPDATE
+        session.exec(update(Trip).values(participant_count=select(func.count()).where(
+            TripParticipantLink.trip_id == Trip.id
+        ).scalar_subquery()))
+        session.commit()
+
+
+def _percentile(sorted_values, q: float) -> float:
+    index = min(len(sorted_values) - 1, max(0, int(round(q * len(sorted_values))) - 1))
+    return sorted_values[index]
+
+
+async def run_scenario(client, counter, scenario, requests: int, concurrency: int, trip_ids, headers, rng) -> dict:
+    name, method, path, needs_auth = scenario
+    semaphore = asyncio.Semaphore(concurrency)
+    latencies, errors = [], 0
+
+    async def one():
+        nonlocal errors
+        url = path.format(trip_id=rng.choice(trip_ids), city=rng.randrange(CITIES))
+        kwargs = {"headers": headers} if needs_auth else {}
+        if method == "POST":
+            kwargs["json"] = {"content": "benchmark"}
+        async with semaphore:
+            start = time.perf_counter()
+            response = await client.request(method, url, **kwargs)
+            latencies.append(time.perf_counter() - start)
+        if response.status_code >= 400:
+            errors += 1
+
+    queries_before = counter.count
+    start = time.perf_counter()
+    await asyncio.gather(*(one() for _ in range(requests)))
+    elapsed = time.perf_counter() - start
+
+    latencies.sort()
+    return {
+        "requests": requests,
+        "errors": errors,
+        "throughput_rps": requests / elapsed,
+        "p50_ms": statistics.median(latencies) * 1000,
+        "p95_ms": _percentile(latencies, 0.95) * 1000,
+        "p99_ms": _percentile(latencies, 0.99) * 1000,
+        "queries_per_request": (counter.count - queries_before) / requests,
+    }
+
+
+async def run(args) -> dict:
+    rng = random.Random(args.seed)
+    if not args.no_seed:
+        seed(args.users, args.trips, args.items_per_trip, args.messages_per_trip, rng)
+    with _session_manager() as session:
+        trip_ids = list(session.exec(select(Trip.id)))
+        user_id = session.exec(select(UserProfile.id)).first()
+
+    counter = QueryCounter()
+    headers = {"Authorization": f"Bearer {create_jwt({'user_id': user_id})}"}
+    scenarios = [s for s in SCENARIOS if not args.endpoints or s[0] in args.endpoints]
+    results = {}
+    transport = httpx.ASGITransport(app=app)
+    async with httpx.AsyncClient(transport=transport, base_url="http://bench") as client:
+        for scenario in scenarios:
+            # прогрев, чтобы не мерить первое подключение и кэши
+            await run_scenario(client, counter, scenario, min(20, args.requests), args.concurrency, trip_ids, headers, rng)
+            results[scenario[0]] = await run_scenario(
+                client, counter, scenario, args.requests, args.concurrency, trip_ids, headers, rng
+            )
+    return results
+
+
+def _git_commit() -> str:
+    try:
+        return subprocess.check_output(["git", "rev-parse", "--short", "HEAD"], text=True).strip()
+    except (OSError, subprocess.CalledProcessError):
+        return "unknown"
+
+
+def compare(baseline: dict, current: dict, threshold: float) -> bool:
+    """
+    Печатает разницу с прошлым прогоном; False, если p95 где-то вырос больше порога
+    """
+    ok = True
+    for name, row in current["results"].items():
+        base = baseline["results"].get(name)
+        if not base:
+            continue
+        change = row["p95_ms"] / base["p95_ms"] - 1 if base["p95_ms"] else 0.0
+        queries = row["queries_per_request"] - base["queries_per_request"]
+        flag = ""
+        if change > threshold or queries > 0:
+            ok = False
+            flag = "  REGRESSION"
+        print(f"{name:<16} p95 {base['p95_ms']:8.2f} -> {row['p95_ms']:8.2f} ms ({change:+.0%})  "
+              f"queries {base['queries_per_request']:.2f} -> {row['queries_per_request']:.2f}{flag}")
+    return ok
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--users", type=int, default=100)
+    parser.add_argument("--trips", type=int, default=1000)
+    parser.add_argument("--items-per-trip", type=int, default=10)
+    parser.add_argument("--messages-per-trip", type=int, default=50)
+    parser.add_argument("--requests", type=int, default=300)
+    parser.add_argument("--concurrency", type=int, default=16)
+    parser.add_argument("--endpoints", nargs="*", help="только указанные сценарии")
+    parser.add_argument("--seed", type=int, default=42)
+    parser.add_argument("--no-seed", action="store_true", help="не пересоздавать данные")
+    parser.add_argument("--output", help="куда сохранить результаты в JSON")
+    parser.add_argument("--compare", help="JSON прошлого прогона для сравнения")
+    parser.add_argument("--threshold", type=float, default=0.2, help="допустимый рост p95")
+    args = parser.parse_args()
+
+    report = {
+        "meta": {
+            "commit": _git_commit(),
+            "db": connection.engine.url.get_backend_name(),
+            "db_mode": connection.DB_MODE,
+            "params": {k: v for k, v in vars(args).items() if k not in ("output", "compare")},
+        },
+        "results": asyncio.run(run(args)),
+    }
+    for name, row in report["results"].items():
+        print(f"{name:<16} {row['throughput_rps']:9.1f} req/s  p50={row['p50_ms']:7.2f}  p95={row['p95_ms']:7.2f}  "
+              f"p99={row['p99_ms']:7.2f} ms  queries/req={row['queries_per_request']:.2f}  errors={row['errors']}")
+    if args.output:
+        with open(args.output, "w") as f:
+            json.dump(report, f, indent=2)
+    if args.compare:
+        with open(args.compare) as f:
+            if not compare(json.load(f), report, args.threshold):
+                sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,97 @@
+"""
+Создание и проверка JWT: TokenService против PyJWT.
+
+Для каждой реализации замеряется число операций в секунду на одном и том же payload и ключе (HS256):
+  token_service — app.auth.TokenService (заранее посчитанные header и HMAC-состояние ключа);
+  per_call      — та же схема, но header и ключ обрабатываются заново на каждый токен
+                  (так TokenService работал раньше);
+  pyjwt         — jwt.encode / jwt.decode (если установлен PyJWT: pip install PyJWT).
+Запуск из каталога lab1:
+
+    python -m bench.jwt_tokens --number 50000
+"""
+import argparse
+import hashlib
+import hmac
+import json
+import secrets
+import time
+
+from app.auth import TokenService, _urlsafe_base64_encode, _urlsafe_base64_decode
+
+SECRET = "bench-secret-key-0123456789abcdef"
+PAYLOAD = {"user_id": 42, "type": "access"}
+TTL = 900
+
+
+def per_call_create(payload: dict) -> str:
+    header_b64 = _urlsafe_base64_encode(json.dumps({"alg": "HS256", "typ": "JWT"}).encode("utf-8"))
+    now = int(time.time())
+    claims = dict(payload, iat=now, exp=now + TTL, jti=secrets.token_urlsafe(16))
+    payload_b64 = _urlsafe_base64_encode(json.dumps(claims).encode("utf-8"))
+    signing_input = f"{header_b64}.{payload_b64}".encode("utf-8")
+    signature = hmac.new(SECRET.encode("utf-8"), signing_input, hashlib.sha256).digest()
+    return f"{header_b64}.{payload_b64}.{_urlsafe_base64_encode(signature)}"
+
+
+def per_call_verify(token: str):
+    header_b64, payload_b64, signature_b64 = token.split(".")
+    signature = hmac.new(SECRET.encode("utf-8"), f"{header_b64}.{payload_b64}".encode("utf-8"), hashlib.sha256).digest()
+    if not hmac.compare_digest(_urlsafe_base64_encode(signature), signature_b64):
+        return None
+    claims = json.loads(_urlsafe_base64_decode(payload_b64))
+    if claims.get("exp", 0) < time.time() or claims.get("type", "access") != "access":
+        return None
+    return claims
+
+
+def implementations():
+    service = TokenService(keys={"bench": SECRET})
+    result = {
+        "token_service": (lambda: service.create_jwt(PAYLOAD, TTL), service.verify_jwt),
+        "per_call": (lambda: per_call_create(PAYLOAD), per_call_verify),
+    }
+    try:
+        import jwt
+    except ImportError:
+        return result
+    result["pyjwt"] = (
+        lambda: jwt.encode(
+            dict(PAYLOAD, iat=int(time.time()), exp=int(time.time()) + TTL, jti=secrets.token_urlsafe(16)),
+            SECRET, algorithm="HS256", headers={"kid": "bench"},
+        ),
+        lambda token: jwt.decode(token, SECRET, algorithms=["HS256"]),
+    )
+    return result
+
+
+def ops_per_second(func, number: int, *args) -> float:
+    func(*args)
+    start = time.perf_counter()
+    for _ in range(number):
+        func(*args)
+    return number / (time.perf_counter() - start)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--number", type=int, default=50000)
+    args = parser.parse_args()
+
+    impls = implementations()
+    if "pyjwt" not in impls:
+        print("PyJWT не установлен — сравнение только с per_call")
+    rates = {}
+    for name, (create, verify) in impls.items():
+        token = create()
+        assert verify(token)["user_id"] == PAYLOAD["user_id"]
+        rates[name] = (ops_per_second(create, args.number), ops_per_second(verify, args.number, token))
+
+    base_create, base_verify = rates.get("pyjwt", rates["per_call"])
+    for name, (create_rate, verify_rate) in rates.items():
+        print(f"{name:<14} create={create_rate:10.0f} ops/s (x{create_rate / base_create:4.2f})  "
+              f"verify={verify_rate:10.0f} ops/s (x{verify_rate / base_verify:4.2f})")
+
+
+if __name__ == "__main__":
+    main()
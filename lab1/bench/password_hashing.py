@@ -0,0 +1,70 @@
+"""
+Пропускная способность логина при разных параметрах scrypt.
+
+Меряется CPU-часть /login — проверка пароля через HashingPool, — при заданном
+числе одновременных клиентов. Запуск из каталога lab1:
+
+    python -m bench.password_hashing --costs 8192 16384 32768 --logins 200 --concurrency 16
+"""
+import argparse
+import asyncio
+import json
+import statistics
+import time
+
+from app.auth import ScryptHasher, HashingPool, PASSWORD_HASH_WORKERS
+
+
+async def _run_cost(n: int, logins: int, concurrency: int, workers: int) -> dict:
+    hasher = ScryptHasher(n=n)
+    pool = HashingPool(workers=workers, max_queue=concurrency)
+    stored = hasher.hash("correct horse battery staple")
+    semaphore = asyncio.Semaphore(concurrency)
+    latencies = []
+
+    async def login():
+        async with semaphore:
+            start = time.perf_counter()
+            ok = await pool.run(hasher.verify, "correct horse battery staple", stored)
+            latencies.append(time.perf_counter() - start)
+            assert ok
+
+    start = time.perf_counter()
+    await asyncio.gather(*(login() for _ in range(logins)))
+    elapsed = time.perf_counter() - start
+
+    latencies.sort()
+    return {
+        "n": n,
+        "r": hasher.r,
+        "p": hasher.p,
+        "logins": logins,
+        "concurrency": concurrency,
+        "workers": workers,
+        "logins_per_sec": logins / elapsed,
+        "p50_ms": statistics.median(latencies) * 1000,
+        "p99_ms": latencies[int(len(latencies) * 0.99) - 1] * 1000,
+        "avg_hash_ms": pool.metrics()["avg_hash_ms"],
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--costs", type=int, nargs="+", default=[4096, 8192, 16384, 32768])
+    parser.add_argument("--logins", type=int, default=100)
+    parser.add_argument("--concurrency", type=int, default=16)
+    parser.add_argument("--workers", type=int, default=PASSWORD_HASH_WORKERS)
+    parser.add_argument("--json", help="куда сохранить результаты")
+    args = parser.parse_args()
+
+    results = [asyncio.run(_run_cost(n, args.logins, args.concurrency, args.workers)) for n in args.costs]
+    for row in results:
+        print(f"N={row['n']:>6}  {row['logins_per_sec']:8.1f} logins/s  "
+              f"p50={row['p50_ms']:7.1f}ms  p99={row['p99_ms']:7.1f}ms  hash={row['avg_hash_ms']:6.1f}ms")
+    if args.json:
+        with open(args.json, "w") as f:
+            json.dump(results, f, indent=2)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,114 @@
+"""
+Сериализация больших списков: обычный путь response_model против FAST_JSON.
+
+Строки собираются в памяти (без БД), затем для каждого размера замеряются:
+  response_model — как FastAPI по умолчанию: serialize_response по response_model
+                   настоящего роута (валидация и dump) и рендер ответа;
+  fast           — TypeAdapter.dump_json по объявленной схеме (путь FAST_JSON);
+  orjson         — dump_python + orjson.dumps (если orjson установлен).
+Запуск из каталога lab1:
+
+    DB_ADMIN=sqlite:// python -m bench.serialization --rows 200 1000 5000 --repeat 20
+
+Сквозное сравнение через HTTP — bench.api со сценариями *_large при FAST_JSON=0 и FAST_JSON=1.
+"""
+import argparse
+import asyncio
+import inspect
+import json
+import time
+from datetime import date, datetime, timezone
+from typing import List
+
+from fastapi.responses import JSONResponse
+from fastapi.routing import serialize_response
+from pydantic import TypeAdapter
+
+from app.main import app
+from app.models import Trip, Message
+
+# роуты, чей response_model используется как эталон обычного пути
+ROUTES = {Trip: "/trips", Message: "/trips/{trip_id}/messages"}
+
+
+def make_rows(model, count: int):
+    now = datetime.now(timezone.utc)
+    if model is Trip:
+        return [
+            Trip(id=i, title=f"Trip {i}", description="benchmark trip " * 4, start_date=date(2025, 1, 1),
+                 end_date=date(2025, 12, 31), origin="City1", destination="City2", duration_days=10,
+                 owner_id=i % 100, updated_at=now)
+            for i in range(count)
+        ]
+    return [
+        Message(id=i, trip_id=1, sender_id=i % 100, content=f"message {i} " * 5,
+                timestamp=now, updated_at=now)
+        for i in range(count)
+    ]
+
+
+def _response_field(model):
+    return next(
+        route.response_field for route in app.routes
+        if getattr(route, "path", None) == ROUTES[model] and "GET" in route.methods
+    )
+
+
+async def response_model_path(field, adapter: TypeAdapter, rows) -> bytes:
+    content = await serialize_response(field=field, response_content=rows, is_coroutine=True)
+    return JSONResponse(content).body
+
+
+def fast_path(field, adapter: TypeAdapter, rows) -> bytes:
+    return adapter.dump_json(rows)
+
+
+def orjson_path(field, adapter: TypeAdapter, rows) -> bytes:
+    import orjson
+
+    return orjson.dumps(adapter.dump_python(rows, mode="json"))
+
+
+async def _call(func, *args) -> bytes:
+    result = func(*args)
+    return await result if inspect.isawaitable(result) else result
+
+
+async def measure(func, field, adapter, rows, repeat: int) -> float:
+    await _call(func, field, adapter, rows)
+    start = time.perf_counter()
+    for _ in range(repeat):
+        await _call(func, field, adapter, rows)
+    return (time.perf_counter() - start) / repeat * 1000
+
+
+async def run(args) -> None:
+    paths = [("response_model", response_model_path), ("fast", fast_path)]
+    try:
+        import orjson  # noqa: F401
+        paths.append(("orjson", orjson_path))
+    except ImportError:
+        pass
+
+    for model in (Trip, Message):
+        field = _response_field(model)
+        adapter = TypeAdapter(List[model])
+        for count in args.rows:
+            rows = make_rows(model, count)
+            assert json.loads(fast_path(field, adapter, rows)) == json.loads(await response_model_path(field, adapter, rows))
+            timings = {name: await measure(func, field, adapter, rows, args.repeat) for name, func in paths}
+            base = timings["response_model"]
+            print(f"{model.__name__:<8} {count:>6} rows  " + "  ".join(
+                f"{name}={ms:8.2f} ms (x{base / ms:4.1f})" for name, ms in timings.items()
+            ))
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--rows", type=int, nargs="*", default=[200, 1000, 5000])
+    parser.add_argument("--repeat", type=int, default=20)
+    asyncio.run(run(parser.parse_args()))
+
+
+if __name__ == "__main__":
+    main()
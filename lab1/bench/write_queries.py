@@ -0,0 +1,100 @@
+"""
+Число SQL-запросов на защищённые записи (владелец поездки).
+
+Каждый эндпоинт вызывается один раз от имени владельца и один раз от чужого пользователя;
+запросы считаются тем же QueryCounter, что и в bench.api. Токены прогреваются заранее,
+поэтому в счёт попадают только запросы самого эндпоинта. Если число запросов превышает
+бюджет из BUDGET, скрипт завершается с кодом 1. Запуск из каталога lab1:
+
+    python -m bench.write_queries
+    DB_MODE=sync python -m bench.write_queries
+"""
+import asyncio
+import os
+import sys
+from datetime import date
+
+BENCH_DB = "write_queries.sqlite3"
+os.environ.setdefault("DB_ADMIN", f"sqlite:///{BENCH_DB}")
+
+import httpx
+
+from app import connection
+from app.auth import create_jwt, hash_password
+from app.connection import init_db, _session_manager
+from app.main import app
+from app.models import UserProfile, Trip, TripParticipantLink, ItineraryItem, Message
+from bench.api import QueryCounter
+
+# (имя, метод, путь, тело, статус для владельца, статус для чужого пользователя)
+SCENARIOS = [
+    ("update_trip", "PATCH", "/trips/{trip_id}", "trip", 200, 404),
+    ("create_itinerary_item", "POST", "/trips/{trip_id}/itinerary", "item", 200, 403),
+    ("delete_itinerary_item", "DELETE", "/trips/{trip_id}/itinerary/{item_id}", None, 200, 403),
+    ("delete_trip", "DELETE", "/trips/{trip_id}", None, 200, 404),
+]
+BUDGET = {
+    ("update_trip", "owner"): 1, ("update_trip", "stranger"): 1,
+    ("create_itinerary_item", "owner"): 1, ("create_itinerary_item", "stranger"): 1,
+    # чужому пользователю нужен второй запрос, чтобы отличить 403 от 404
+    ("delete_itinerary_item", "owner"): 1, ("delete_itinerary_item", "stranger"): 2,
+    # участия, отвязка пунктов маршрута и сообщений, сама поездка
+    ("delete_trip", "owner"): 4, ("delete_trip", "stranger"): 4,
+}
+BODIES = {
+    "trip": {"title": "Updated", "description": None, "start_date": "2025-06-01", "end_date": "2025-06-10",
+             "origin": "A", "destination": "B", "duration_days": 9},
+    "item": {"day_number": 1, "location": "Place", "description": None},
+}
+
+
+def seed() -> dict:
+    if connection.DATABASE_URL == f"sqlite:///{BENCH_DB}" and os.path.exists(BENCH_DB):
+        os.remove(BENCH_DB)
+    init_db()
+    hashed = hash_password("bench")
+    with _session_manager() as session:
+        owner = UserProfile(username="owner", hashed_password=hashed)
+        stranger = UserProfile(username="stranger", hashed_password=hashed)
+        session.add_all([owner, stranger])
+        session.commit()
+        trip = Trip(title="Trip", description=None, start_date=date(2025, 6, 1), end_date=date(2025, 6, 10),
+                    origin="A", destination="B", duration_days=9, owner_id=owner.id, participant_count=1)
+        trip.itinerary_items = [ItineraryItem(day_number=d + 1, location=f"Place {d}", description=None) for d in range(5)]
+        trip.messages = [Message(content=f"message {m}", sender_id=stranger.id) for m in range(5)]
+        session.add(trip)
+        session.commit()
+        session.add(TripParticipantLink(trip_id=trip.id, user_id=stranger.id))
+        session.commit()
+        return {"owner": owner.id, "stranger": stranger.id, "trip_id": trip.id, "item_id": trip.itinerary_items[0].id}
+
+
+async def run() -> bool:
+    ids = seed()
+    counter = QueryCounter()
+    headers = {role: {"Authorization": f"Bearer {create_jwt({'user_id': ids[role]})}"} for role in ("owner", "stranger")}
+    ok = True
+    transport = httpx.ASGITransport(app=app)
+    async with httpx.AsyncClient(transport=transport, base_url="http://bench") as client:
+        for role in headers:
+            await client.get("/users/me", headers=headers[role])
+        for name, method, path, body, owner_status, stranger_status in SCENARIOS:
+            url = path.format(**ids)
+            # сначала чужой пользователь: после удаления владельцем проверять было бы нечего
+            for role, expected in (("stranger", stranger_status), ("owner", owner_status)):
+                counter.count = 0
+                response = await client.request(method, url, json=BODIES.get(body), headers=headers[role])
+                queries, budget = counter.count, BUDGET[(name, role)]
+                status_ok = response.status_code == expected
+                ok = ok and status_ok and queries <= budget
+                print(f"{name:<24} {role:<9} status={response.status_code}{'' if status_ok else '!'} "
+                      f"queries={queries} budget={budget}{'' if queries <= budget else '  OVER'}")
+    return ok
+
+
+def main():
+    sys.exit(0 if asyncio.run(run()) else 1)
+
+
+if __name__ == "__main__":
+    main()
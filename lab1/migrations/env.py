@@ -20,8 +20,45 @@ if config.config_file_name:
     fileConfig(config.config_file_name)
 
 # 4) импортируем модели из вашего пакета `app`
-from app.models import UserProfile, Trip, TripParticipantLink  # noqa
+from app.models import UserProfile, Trip, TripParticipantLink, ItineraryItem, Message, RevokedToken  # noqa
 
 target_metadata = SQLModel.metadata
 
-# … дальше обычный код run_migrations_offline/online …
+# колонки и индексы поиска создаются миграцией вручную и в моделях не описаны
+SEARCH_OBJECTS = {
+    "search_vector", "ix_trip_search_vector", "ix_message_search_vector",
+    "ix_trip_origin_trgm", "ix_trip_destination_trgm",
+}
+
+
+def include_object(obj, name, type_, reflected, compare_to):
+    return not (reflected and name in SEARCH_OBJECTS)
+
+
+def run_migrations_offline() -> None:
+    url = config.get_main_option("sqlalchemy.url")
+    context.configure(
+        url=url, target_metadata=target_metadata, include_object=include_object,
+        literal_binds=True, dialect_opts={"paramstyle": "named"}
+    )
+    with context.begin_transaction():
+        context.run_migrations()
+
+
+def run_migrations_online() -> None:
+    connectable = engine_from_config(
+        config.get_section(config.config_ini_section),
+        prefix="sqlalchemy.", poolclass=pool.NullPool
+    )
+    with connectable.connect() as connection:
+        context.configure(connection=connection,
+                          target_metadata=target_metadata,
+                          include_object=include_object)
+        with context.begin_transaction():
+            context.run_migrations()
+
+
+if context.is_offline_mode():
+    run_migrations_offline()
+else:
+    run_migrations_online()
@@ -0,0 +1,36 @@
+"""token revocation
+
+Revision ID: 0c5e9b7a3d62
+Revises: f6b3d2e81a45
+Create Date: 2026-10-18 21:48:05.672931
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = '0c5e9b7a3d62'
+down_revision: Union[str, None] = 'f6b3d2e81a45'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    op.create_table('revokedtoken',
+    sa.Column('jti', sa.String(length=64), nullable=False),
+    sa.Column('expires_at', sa.Integer(), nullable=False),
+    sa.PrimaryKeyConstraint('jti')
+    )
+    op.create_index(op.f('ix_revokedtoken_expires_at'), 'revokedtoken', ['expires_at'], unique=False)
+    op.add_column('userprofile', sa.Column('tokens_valid_after', sa.Integer(), server_default='0', nullable=False))
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    op.drop_column('userprofile', 'tokens_valid_after')
+    op.drop_index(op.f('ix_revokedtoken_expires_at'), table_name='revokedtoken')
+    op.drop_table('revokedtoken')
@@ -0,0 +1,36 @@
+"""trip listing indexes
+
+Revision ID: 3c1f0a7d2b94
+Revises: 768426f9c890
+Create Date: 2026-10-18 12:04:11.402117
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = '3c1f0a7d2b94'
+down_revision: Union[str, None] = '768426f9c890'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    op.create_index('ix_trip_origin_id', 'trip', ['origin', 'id'], unique=False)
+    op.create_index('ix_trip_destination_id', 'trip', ['destination', 'id'], unique=False)
+    op.create_index('ix_trip_owner_id_id', 'trip', ['owner_id', 'id'], unique=False)
+    op.create_index('ix_trip_start_date_id', 'trip', ['start_date', 'id'], unique=False)
+    op.create_index('ix_trip_end_date_id', 'trip', ['end_date', 'id'], unique=False)
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    op.drop_index('ix_trip_end_date_id', table_name='trip')
+    op.drop_index('ix_trip_start_date_id', table_name='trip')
+    op.drop_index('ix_trip_owner_id_id', table_name='trip')
+    op.drop_index('ix_trip_destination_id', table_name='trip')
+    op.drop_index('ix_trip_origin_id', table_name='trip')
@@ -0,0 +1,28 @@
+"""message cursor index
+
+Revision ID: 5e2b8c41d0a7
+Revises: 3c1f0a7d2b94
+Create Date: 2026-10-18 13:22:47.915302
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = '5e2b8c41d0a7'
+down_revision: Union[str, None] = '3c1f0a7d2b94'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    op.create_index('ix_message_trip_id_id', 'message', ['trip_id', 'id'], unique=False)
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    op.drop_index('ix_message_trip_id_id', table_name='message')
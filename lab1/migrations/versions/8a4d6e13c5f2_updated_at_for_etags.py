@@ -0,0 +1,40 @@
+"""updated_at for etags
+
+Revision ID: 8a4d6e13c5f2
+Revises: 5e2b8c41d0a7
+Create Date: 2026-10-18 15:41:09.228713
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = '8a4d6e13c5f2'
+down_revision: Union[str, None] = '5e2b8c41d0a7'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    # server_default заполняет уже существующие строки, новые значения ставит приложение.
+    # SQLite не добавляет колонку с неконстантным DEFAULT — там колонка без default и UPDATE следом
+    is_postgres = op.get_context().dialect.name == 'postgresql'
+    for table in ('trip', 'itineraryitem', 'message'):
+        op.add_column(table, sa.Column(
+            'updated_at', sa.DateTime(timezone=True), nullable=True,
+            server_default=sa.func.now() if is_postgres else None,
+        ))
+        if not is_postgres:
+            op.execute(f"UPDATE {table} SET updated_at = CURRENT_TIMESTAMP")
+    op.create_index('ix_itineraryitem_trip_id', 'itineraryitem', ['trip_id'], unique=False)
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    op.drop_index('ix_itineraryitem_trip_id', table_name='itineraryitem')
+    for table in ('message', 'itineraryitem', 'trip'):
+        op.drop_column(table, 'updated_at')
@@ -0,0 +1,56 @@
+"""search indexes
+
+Revision ID: b71e0c9d4a36
+Revises: 8a4d6e13c5f2
+Create Date: 2026-10-18 16:11:52.304918
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'b71e0c9d4a36'
+down_revision: Union[str, None] = '8a4d6e13c5f2'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    # для SQLite поиск строится на FTS5 в init_db
+    if op.get_context().dialect.name != 'postgresql':
+        return
+    op.execute('CREATE EXTENSION IF NOT EXISTS pg_trgm')
+    op.execute(
+        "ALTER TABLE trip ADD COLUMN search_vector tsvector GENERATED ALWAYS AS ("
+        "setweight(to_tsvector('simple', coalesce(title, '')), 'A') || "
+        "setweight(to_tsvector('simple', coalesce(origin, '') || ' ' || coalesce(destination, '')), 'B') || "
+        "setweight(to_tsvector('simple', coalesce(description, '')), 'C')"
+        ") STORED"
+    )
+    op.execute(
+        "ALTER TABLE message ADD COLUMN search_vector tsvector GENERATED ALWAYS AS ("
+        "to_tsvector('simple', coalesce(content, ''))"
+        ") STORED"
+    )
+    op.create_index('ix_trip_search_vector', 'trip', ['search_vector'], unique=False, postgresql_using='gin')
+    op.create_index('ix_message_search_vector', 'message', ['search_vector'], unique=False, postgresql_using='gin')
+    op.create_index('ix_trip_origin_trgm', 'trip', ['origin'], unique=False,
+                    postgresql_using='gin', postgresql_ops={'origin': 'gin_trgm_ops'})
+    op.create_index('ix_trip_destination_trgm', 'trip', ['destination'], unique=False,
+                    postgresql_using='gin', postgresql_ops={'destination': 'gin_trgm_ops'})
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    if op.get_context().dialect.name != 'postgresql':
+        return
+    op.drop_index('ix_trip_destination_trgm', table_name='trip')
+    op.drop_index('ix_trip_origin_trgm', table_name='trip')
+    op.drop_index('ix_message_search_vector', table_name='message')
+    op.drop_index('ix_trip_search_vector', table_name='trip')
+    op.drop_column('message', 'search_vector')
+    op.drop_column('trip', 'search_vector')
@@ -0,0 +1,190 @@
+"""typed dates and timestamps
+
+Revision ID: d4e8a1f0b2c7
+Revises: b71e0c9d4a36
+Create Date: 2026-10-18 18:02:37.519204
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'd4e8a1f0b2c7'
+down_revision: Union[str, None] = 'b71e0c9d4a36'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+# строк за одно UPDATE при переносе данных; каждая пачка коммитится отдельно
+BATCH_SIZE = 5000
+
+# старые значения — str(datetime.utcnow()) в UTC и даты YYYY-MM-DD из формы.
+# Приведение типа в plpgsql-функции с EXCEPTION: любая нераспознанная строка (2024-02-30, мусор в конце)
+# даёт NULL, а не ошибку посреди переноса, когда часть пачек уже закоммичена
+_FUNCTIONS = {
+    'typed_migration_timestamp': ('timestamptz', "v::timestamp AT TIME ZONE 'UTC'"),
+    'typed_migration_date': ('date', 'left(v, 10)::date'),
+}
+_TIMESTAMP = "typed_migration_timestamp({col})"
+_DATE = "typed_migration_date({col})"
+# для NOT NULL-колонок триггер приводит тип без перехвата: некорректная запись во время миграции
+# отклоняется сразу, иначе NULL в новой колонке сорвал бы VALIDATE CONSTRAINT в конце
+_DATE_STRICT = "left({col}, 10)::date"
+
+# таблица -> (ключ для разбиения на пачки, [(старая колонка, новый тип, выражение, NOT NULL)])
+COLUMNS = {
+    'message': ('id', [('timestamp', 'timestamptz', _TIMESTAMP, False)]),
+    'tripparticipantlink': ('trip_id', [('joined_at', 'timestamptz', _TIMESTAMP, False)]),
+    'trip': ('id', [('start_date', 'date', _DATE, True), ('end_date', 'date', _DATE, True)]),
+}
+# выражение для триггера, если оно отличается от выражения переноса
+_TRIGGER_EXPRESSIONS = {
+    ('trip', 'start_date'): _DATE_STRICT,
+    ('trip', 'end_date'): _DATE_STRICT,
+}
+
+# индексы строятся по новым колонкам до переименования: (имя, таблица, колонки, временное имя)
+INDEXES = [
+    ('ix_message_trip_id_timestamp', 'message', ('trip_id', 'timestamp_new'), None),
+    ('ix_tripparticipantlink_trip_id_joined_at', 'tripparticipantlink', ('trip_id', 'joined_at_new'), None),
+    ('ix_trip_start_date_id', 'trip', ('start_date_new', 'id'), 'ix_trip_start_date_id_new'),
+    ('ix_trip_end_date_id', 'trip', ('end_date_new', 'id'), 'ix_trip_end_date_id_new'),
+]
+
+
+def _convert(expr, col, prefix=''):
+    return expr.format(col=f'{prefix}"{col}"')
+
+
+def _create_functions():
+    for name, (type_, cast) in _FUNCTIONS.items():
+        op.execute(
+            f"CREATE FUNCTION {name}(v varchar) RETURNS {type_} AS $$ "
+            f"BEGIN RETURN {cast}; EXCEPTION WHEN others THEN RETURN NULL; END $$ LANGUAGE plpgsql STABLE"
+        )
+
+
+def _check_trip_dates():
+    """
+    Поездка без даты начала или конца недопустима (NOT NULL), а подставить дату за пользователя нельзя.
+    Поэтому такие строки ищутся до первого autocommit_block: миграция падает целиком и ничего не оставляет
+    за собой, а строки из сообщения об ошибке нужно исправить вручную и запустить миграцию снова.
+    """
+    if op.get_context().as_sql:
+        # офлайн-режим (--sql): данных нет, проверку выполняет тот, кто применяет скрипт
+        return
+    rows = op.get_bind().execute(sa.text(
+        "SELECT id, start_date, end_date FROM trip "
+        "WHERE typed_migration_date(start_date) IS NULL OR typed_migration_date(end_date) IS NULL "
+        "ORDER BY id LIMIT 20"
+    )).all()
+    if rows:
+        sample = ", ".join(f"{id_}: {start!r}..{end!r}" for id_, start, end in rows)
+        raise RuntimeError(f"trip rows with unparseable start_date/end_date, fix them before migrating: {sample}")
+
+
+def _sync_trigger(table, columns):
+    # пока идёт перенос, приложение продолжает писать в старые колонки — триггер дублирует запись в новые
+    assignments = "; ".join(
+        f"NEW.{col}_new := {_convert(_TRIGGER_EXPRESSIONS.get((table, col), expr), col, 'NEW.')}"
+        for col, _, expr, _ in columns
+    )
+    op.execute(
+        f"CREATE FUNCTION {table}_typed_sync() RETURNS trigger AS $$ "
+        f"BEGIN {assignments}; RETURN NEW; END $$ LANGUAGE plpgsql"
+    )
+    op.execute(
+        f"CREATE TRIGGER {table}_typed_sync BEFORE INSERT OR UPDATE ON {table} "
+        f"FOR EACH ROW EXECUTE FUNCTION {table}_typed_sync()"
+    )
+
+
+def _backfill(table, key, columns):
+    """
+    Заполняет новые колонки пачками по диапазонам key; каждая пачка — отдельная короткая транзакция,
+    поэтому блокируются только строки текущей пачки
+    """
+    updates = ", ".join(f"{col}_new = {_convert(expr, col)}" for col, _, expr, _ in columns)
+    if op.get_context().as_sql:
+        # офлайн-режим (--sql): границы пачек неизвестны, один UPDATE на всю таблицу
+        op.execute(f"UPDATE {table} SET {updates}")
+        return
+    conn = op.get_bind()
+    low, high = conn.execute(sa.text(f"SELECT min({key}), max({key}) FROM {table}")).one()
+    if low is None:
+        return
+    statement = sa.text(f"UPDATE {table} SET {updates} WHERE {key} >= :start AND {key} < :stop")
+    with op.get_context().autocommit_block():
+        for start in range(low, high + 1, BATCH_SIZE):
+            conn.execute(statement, {"start": start, "stop": start + BATCH_SIZE})
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    # SQLite хранит DateTime/Date текстом в том же ISO-формате, поэтому существующие строки читаются как есть
+    if op.get_context().dialect.name != 'postgresql':
+        return
+
+    # 1. новые nullable-колонки без DEFAULT добавляются без перезаписи таблиц
+    _create_functions()
+    for table, (_, columns) in COLUMNS.items():
+        for col, type_, _, _ in columns:
+            op.execute(f"ALTER TABLE {table} ADD COLUMN {col}_new {type_}")
+        _sync_trigger(table, columns)
+    # ALTER TABLE держит блокировку до конца этой транзакции: проверенные здесь строки уже не изменятся
+    # в обход триггера, а при ошибке откатывается всё сделанное выше
+    _check_trip_dates()
+
+    # 2. перенос существующих строк и индексы без блокировки записи
+    for table, (key, columns) in COLUMNS.items():
+        _backfill(table, key, columns)
+    with op.get_context().autocommit_block():
+        for name, table, columns, temp_name in INDEXES:
+            op.execute(f"CREATE INDEX CONCURRENTLY {temp_name or name} ON {table} ({', '.join(columns)})")
+        # NOT NULL через проверенный CHECK: VALIDATE не блокирует запись, а SET NOT NULL его переиспользует
+        for table, (_, columns) in COLUMNS.items():
+            for col, _, _, not_null in columns:
+                if not_null:
+                    op.execute(
+                        f"ALTER TABLE {table} ADD CONSTRAINT {table}_{col}_new_not_null "
+                        f"CHECK ({col}_new IS NOT NULL) NOT VALID"
+                    )
+                    op.execute(f"ALTER TABLE {table} VALIDATE CONSTRAINT {table}_{col}_new_not_null")
+
+    # 3. подмена колонок — только изменения каталога, таблица блокируется на миллисекунды
+    for table, (_, columns) in COLUMNS.items():
+        op.execute(f"DROP TRIGGER {table}_typed_sync ON {table}")
+        op.execute(f"DROP FUNCTION {table}_typed_sync()")
+        for col, _, _, not_null in columns:
+            op.execute(f'ALTER TABLE {table} DROP COLUMN "{col}"')
+            op.execute(f'ALTER TABLE {table} RENAME COLUMN {col}_new TO "{col}"')
+            if not_null:
+                op.execute(f'ALTER TABLE {table} ALTER COLUMN "{col}" SET NOT NULL')
+                op.execute(f"ALTER TABLE {table} DROP CONSTRAINT {table}_{col}_new_not_null")
+    for name, _, _, temp_name in INDEXES:
+        if temp_name:
+            op.execute(f"ALTER INDEX {temp_name} RENAME TO {name}")
+    for name in _FUNCTIONS:
+        op.execute(f"DROP FUNCTION {name}(varchar)")
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    if op.get_context().dialect.name != 'postgresql':
+        return
+    op.drop_index('ix_tripparticipantlink_trip_id_joined_at', table_name='tripparticipantlink')
+    op.drop_index('ix_message_trip_id_timestamp', table_name='message')
+    op.execute(
+        "ALTER TABLE message ALTER COLUMN \"timestamp\" TYPE varchar "
+        "USING to_char(\"timestamp\" AT TIME ZONE 'UTC', 'YYYY-MM-DD HH24:MI:SS.US')"
+    )
+    op.execute(
+        "ALTER TABLE tripparticipantlink ALTER COLUMN joined_at TYPE varchar "
+        "USING to_char(joined_at AT TIME ZONE 'UTC', 'YYYY-MM-DD HH24:MI:SS.US')"
+    )
+    op.execute(
+        "ALTER TABLE trip ALTER COLUMN start_date TYPE varchar USING to_char(start_date, 'YYYY-MM-DD'), "
+        "ALTER COLUMN end_date TYPE varchar USING to_char(end_date, 'YYYY-MM-DD')"
+    )
@@ -0,0 +1,35 @@
+"""trip participant count
+
+Revision ID: e2a7c94f5b18
+Revises: d4e8a1f0b2c7
+Create Date: 2026-10-18 19:24:10.846391
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'e2a7c94f5b18'
+down_revision: Union[str, None] = 'd4e8a1f0b2c7'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    # NOT NULL с константным DEFAULT в Postgres 11+ добавляется без перезаписи таблицы
+    op.add_column('trip', sa.Column('participant_count', sa.Integer(), server_default='0', nullable=False))
+    # пересчёт для поездок, у которых уже есть участники
+    op.execute(
+        "UPDATE trip SET participant_count = ("
+        "SELECT count(*) FROM tripparticipantlink WHERE tripparticipantlink.trip_id = trip.id"
+        ") WHERE id IN (SELECT trip_id FROM tripparticipantlink)"
+    )
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    op.drop_column('trip', 'participant_count')
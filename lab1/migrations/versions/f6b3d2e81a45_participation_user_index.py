@@ -0,0 +1,41 @@
+"""participation user index
+
+Revision ID: f6b3d2e81a45
+Revises: e2a7c94f5b18
+Create Date: 2026-10-18 20:37:52.113870
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'f6b3d2e81a45'
+down_revision: Union[str, None] = 'e2a7c94f5b18'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+# поездки, созданные пользователем, уже покрывает ix_trip_owner_id_id (owner_id, id)
+INDEXES = [
+    ('ix_tripparticipantlink_user_id_trip_id', 'tripparticipantlink', ['user_id', 'trip_id']),
+]
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    # в Postgres индексы строятся CONCURRENTLY, без блокировки записи в tripparticipantlink
+    if op.get_context().dialect.name == 'postgresql':
+        with op.get_context().autocommit_block():
+            for name, table, columns in INDEXES:
+                op.create_index(name, table, columns, unique=False, postgresql_concurrently=True)
+    else:
+        for name, table, columns in INDEXES:
+            op.create_index(name, table, columns, unique=False)
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    for name, table, _ in INDEXES:
+        op.drop_index(name, table_name=table)
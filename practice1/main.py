@@ -1,98 +1,117 @@
 from fastapi import FastAPI, HTTPException, Path, status
-from typing import List
+from typing import List, Optional
 
 from models import Warrior, Profession, Skill, RaceType
+from repository import Repository, create_repository, AlreadyExists, NotFound
 
 app = FastAPI()
 
-# Временная БД
-warriors_db: List[Warrior] = [
-    Warrior(id=1, race=RaceType.worker, name="Ivan", level=5,
-            profession=Profession(id=1, title="Blacksmith", description="Works with metals"),
-            skills=[Skill(id=1, name="Forge", description="Can forge weapons")]),
-    Warrior(id=2, race=RaceType.junior, name="Olga", level=2,
-            profession=None,
-            skills=[]),
-]
-
-professions_db: List[Profession] = [
-    Profession(id=1, title="Blacksmith", description="Works with metals"),
-    Profession(id=2, title="Archer", description="Skilled with bow"),
-]
+# Хранилище по PRACTICE1_BACKEND (по умолчанию словари в памяти) с индексами по расе и профессии
+warriors_db: Repository[Warrior] = create_repository("warriors", Warrior, indexes={
+    "race": lambda w: w.race,
+    "profession_id": lambda w: w.profession.id if w.profession else None,
+})
+professions_db: Repository[Profession] = create_repository("professions", Profession)
+
+# начальные данные, если снапшот на диске ещё не создан
+if not len(warriors_db):
+    warriors_db.add(Warrior(id=1, race=RaceType.worker, name="Ivan", level=5,
+                            profession=Profession(id=1, title="Blacksmith", description="Works with metals"),
+                            skills=[Skill(id=1, name="Forge", description="Can forge weapons")]))
+    warriors_db.add(Warrior(id=2, race=RaceType.junior, name="Olga", level=2,
+                            profession=None,
+                            skills=[]))
+if not len(professions_db):
+    professions_db.add(Profession(id=1, title="Blacksmith", description="Works with metals"))
+    professions_db.add(Profession(id=2, title="Archer", description="Skilled with bow"))
+
+
+@app.on_event("shutdown")
+def on_shutdown():
+    warriors_db.close()
+    professions_db.close()
 
 # --- CRUD для Warrior ---
 
 @app.get("/warriors", response_model=List[Warrior])
-def get_warriors() -> List[Warrior]:
-    return warriors_db
+def get_warriors(race: Optional[RaceType] = None, profession_id: Optional[int] = None) -> List[Warrior]:
+    # фильтр идёт по индексу, при двух фильтрах второй проверяется на найденных
+    if race is not None:
+        warriors = warriors_db.find_by("race", race)
+        if profession_id is not None:
+            warriors = [w for w in warriors if w.profession and w.profession.id == profession_id]
+        return warriors
+    if profession_id is not None:
+        return warriors_db.find_by("profession_id", profession_id)
+    return warriors_db.list()
 
 @app.get("/warrior/{warrior_id}", response_model=Warrior)
 def get_warrior(
     warrior_id: int = Path(..., description="ID воина, которого нужно получить", ge=1)
 ) -> Warrior:
-    for w in warriors_db:
-        if w.id == warrior_id:
-            return w
-    raise HTTPException(status_code=404, detail="Warrior not found")
+    warrior = warriors_db.get(warrior_id)
+    if warrior is None:
+        raise HTTPException(status_code=404, detail="Warrior not found")
+    return warrior
 
 @app.post("/warrior", response_model=Warrior, status_code=status.HTTP_201_CREATED)
 def create_warrior(warrior: Warrior) -> Warrior:
-    if any(w.id == warrior.id for w in warriors_db):
+    try:
+        return warriors_db.add(warrior)
+    except AlreadyExists:
         raise HTTPException(status_code=400, detail="ID already exists")
-    warriors_db.append(warrior)
-    return warrior
 
 @app.put("/warrior/{warrior_id}", response_model=Warrior)
 def update_warrior(
     warrior_id: int,
     warrior: Warrior
 ) -> Warrior:
-    for idx, w in enumerate(warriors_db):
-        if w.id == warrior_id:
-            warriors_db[idx] = warrior
-            return warrior
-    raise HTTPException(status_code=404, detail="Warrior not found")
+    try:
+        return warriors_db.replace(warrior_id, warrior)
+    except NotFound:
+        raise HTTPException(status_code=404, detail="Warrior not found")
+    except AlreadyExists:
+        raise HTTPException(status_code=400, detail="ID already exists")
 
 @app.delete("/warrior/{warrior_id}", status_code=status.HTTP_204_NO_CONTENT)
 def delete_warrior(warrior_id: int):
-    for idx, w in enumerate(warriors_db):
-        if w.id == warrior_id:
-            warriors_db.pop(idx)
-            return
-    raise HTTPException(status_code=404, detail="Warrior not found")
+    try:
+        warriors_db.delete(warrior_id)
+    except NotFound:
+        raise HTTPException(status_code=404, detail="Warrior not found")
 
 # --- CRUD для Profession ---
 
 @app.get("/professions", response_model=List[Profession])
 def get_professions() -> List[Profession]:
-    return professions_db
+    return professions_db.list()
 
 @app.get("/profession/{profession_id}", response_model=Profession)
 def get_profession(profession_id: int = Path(..., ge=1)) -> Profession:
-    for p in professions_db:
-        if p.id == profession_id:
-            return p
-    raise HTTPException(status_code=404, detail="Profession not found")
+    profession = professions_db.get(profession_id)
+    if profession is None:
+        raise HTTPException(status_code=404, detail="Profession not found")
+    return profession
 
 @app.post("/profession", response_model=Profession, status_code=status.HTTP_201_CREATED)
 def create_profession(profession: Profession) -> Profession:
-    if any(p.id == profession.id for p in professions_db):
+    try:
+        return professions_db.add(profession)
+    except AlreadyExists:
         raise HTTPException(status_code=400, detail="ID already exists")
-    professions_db.append(profession)
-    return profession
 
 @app.put("/profession/{profession_id}", response_model=Profession)
 def update_profession(profession_id: int, profession: Profession) -> Profession:
-    for idx, p in enumerate(professions_db):
-        if p.id == profession_id:
-            professions_db[idx] = profession
-            return profession
-    raise HTTPException(status_code=404, detail="Profession not found")
+    try:
+        return professions_db.replace(profession_id, profession)
+    except NotFound:
+        raise HTTPException(status_code=404, detail="Profession not found")
+    except AlreadyExists:
+        raise HTTPException(status_code=400, detail="ID already exists")
 
 @app.delete("/profession/{profession_id}", status_code=status.HTTP_204_NO_CONTENT)
 def delete_profession(profession_id: int):
-    for idx, p in enumerate(professions_db):
-        if p.id == profession_id:
-            professions_db.pop(idx)
-            return
-    raise HTTPException(status_code=404, detail="Profession not found")
\ No newline at end of file
+    try:
+        professions_db.delete(profession_id)
+    except NotFound:
+        raise HTTPException(status_code=404, detail="Profession not found")
\ No newline at end of file
@@ -0,0 +1,334 @@
+import os
+import json
+import threading
+from abc import ABC, abstractmethod
+from enum import Enum
+from typing import Any, Callable, Dict, Generic, Hashable, List, Optional, Type, TypeVar
+
+from pydantic import BaseModel
+
+T = TypeVar("T", bound=BaseModel)
+
+# каталог для снапшотов и журналов; если не задан — данные живут только в памяти
+DATA_DIR = os.getenv("PRACTICE1_DATA_DIR")
+# после скольких записей в журнале он сворачивается в новый снапшот
+SNAPSHOT_EVERY = int(os.getenv("PRACTICE1_SNAPSHOT_EVERY", "1000"))
+PRACTICE1_FSYNC = os.getenv("PRACTICE1_FSYNC", "0").lower() in ("1", "true", "yes")
+
+# хранилище: memory, sqlite или postgres; для SQL-бэкендов строка подключения в PRACTICE1_DB_URL
+PRACTICE1_BACKEND = os.getenv("PRACTICE1_BACKEND", "memory")
+PRACTICE1_DB_URL = os.getenv("PRACTICE1_DB_URL")
+
+
+class AlreadyExists(Exception):
+    pass
+
+
+class NotFound(Exception):
+    pass
+
+
+class Repository(ABC, Generic[T]):
+    """
+    Общий интерфейс хранилищ practice1: роуты работают с ним и не знают о бэкенде.
+    Бэкенд без какого-либо из методов не создастся — TypeError ещё при инстанцировании.
+    """
+    @abstractmethod
+    def __len__(self) -> int:
+        ...
+
+    @abstractmethod
+    def list(self) -> List[T]:
+        ...
+
+    @abstractmethod
+    def get(self, item_id: int) -> Optional[T]:
+        ...
+
+    @abstractmethod
+    def find_by(self, index: str, value: Hashable) -> List[T]:
+        ...
+
+    @abstractmethod
+    def add(self, item: T) -> T:
+        ...
+
+    @abstractmethod
+    def replace(self, item_id: int, item: T) -> T:
+        ...
+
+    @abstractmethod
+    def delete(self, item_id: int) -> None:
+        ...
+
+    def close(self) -> None:
+        pass
+
+
+class InMemoryRepository(Repository[T]):
+    """
+    Хранилище моделей по id: словарь вместо списка даёт O(1) на поиск, замену и удаление.
+    Вторичные индексы (значение -> id) обновляются вместе с основным словарём под одной блокировкой,
+    так что sync-роуты FastAPI из пула потоков не видят полузаписанного состояния.
+
+    Если задан data_dir, каждая запись дописывается в журнал <name>.journal, а журнал
+    периодически сворачивается в снапшот <name>.json; при старте снапшот читается и журнал проигрывается.
+    """
+    def __init__(self, name: str, model: Type[T], indexes: Optional[Dict[str, Callable[[T], Hashable]]] = None,
+                 data_dir: Optional[str] = DATA_DIR, snapshot_every: int = SNAPSHOT_EVERY):
+        self.name = name
+        self.model = model
+        self._items: Dict[int, T] = {}
+        self._key_funcs = indexes or {}
+        # dict вместо set, чтобы выдача по индексу сохраняла порядок добавления
+        self._indexes: Dict[str, Dict[Hashable, Dict[int, None]]] = {name: {} for name in self._key_funcs}
+        self._lock = threading.RLock()
+
+        self._snapshot_path = self._journal_path = None
+        self._journal = None
+        self._journal_entries = 0
+        self._snapshot_every = snapshot_every
+        if data_dir:
+            os.makedirs(data_dir, exist_ok=True)
+            self._snapshot_path = os.path.join(data_dir, f"{name}.json")
+            self._journal_path = os.path.join(data_dir, f"{name}.journal")
+            self._load()
+            self._journal = open(self._journal_path, "a", encoding="utf-8")
+
+    # --- чтение ---
+
+    def __len__(self) -> int:
+        return len(self._items)
+
+    def list(self) -> List[T]:
+        with self._lock:
+            return list(self._items.values())
+
+    def get(self, item_id: int) -> Optional[T]:
+        return self._items.get(item_id)
+
+    def find_by(self, index: str, value: Hashable) -> List[T]:
+        with self._lock:
+            return [self._items[item_id] for item_id in self._indexes[index].get(value, ())]
+
+    # --- запись ---
+
+    def add(self, item: T) -> T:
+        with self._lock:
+            if item.id in self._items:
+                raise AlreadyExists(item.id)
+            self._put(item)
+            self._log({"op": "put", "data": item.model_dump(mode="json")})
+        return item
+
+    def replace(self, item_id: int, item: T) -> T:
+        """
+        Замена записи item_id; новая запись может прийти с другим id
+        """
+        with self._lock:
+            if item_id not in self._items:
+                raise NotFound(item_id)
+            if item.id != item_id and item.id in self._items:
+                raise AlreadyExists(item.id)
+            if item.id != item_id:
+                self._remove(item_id)
+                self._log({"op": "delete", "id": item_id})
+            self._put(item)
+            self._log({"op": "put", "data": item.model_dump(mode="json")})
+        return item
+
+    def delete(self, item_id: int) -> None:
+        with self._lock:
+            if item_id not in self._items:
+                raise NotFound(item_id)
+            self._remove(item_id)
+            self._log({"op": "delete", "id": item_id})
+
+    def _put(self, item: T) -> None:
+        if item.id in self._items:
+            self._unindex(self._items[item.id])
+        self._items[item.id] = item
+        for name, key in self._key_funcs.items():
+            self._indexes[name].setdefault(key(item), {})[item.id] = None
+
+    def _remove(self, item_id: int) -> None:
+        self._unindex(self._items.pop(item_id))
+
+    def _unindex(self, item: T) -> None:
+        for name, key in self._key_funcs.items():
+            bucket = self._indexes[name].get(key(item))
+            if bucket is not None:
+                bucket.pop(item.id, None)
+                if not bucket:
+                    del self._indexes[name][key(item)]
+
+    # --- снапшот и журнал ---
+
+    def _load(self) -> None:
+        if os.path.exists(self._snapshot_path):
+            with open(self._snapshot_path, encoding="utf-8") as f:
+                for data in json.load(f):
+                    self._put(self.model.model_validate(data))
+        if os.path.exists(self._journal_path):
+            valid_size = 0
+            with open(self._journal_path, "rb") as f:
+                for line in f:
+                    try:
+                        entry = json.loads(line)
+                    except ValueError:
+                        break
+                    if not line.endswith(b"\n"):
+                        break
+                    if entry["op"] == "put":
+                        self._put(self.model.model_validate(entry["data"]))
+                    elif entry["id"] in self._items:
+                        self._remove(entry["id"])
+                    self._journal_entries += 1
+                    valid_size += len(line)
+            # недописанная последняя строка после падения процесса отрезается
+            if valid_size != os.path.getsize(self._journal_path):
+                with open(self._journal_path, "r+b") as f:
+                    f.truncate(valid_size)
+
+    def _log(self, entry: dict) -> None:
+        if self._journal is None:
+            return
+        self._journal.write(json.dumps(entry, ensure_ascii=False) + "\n")
+        self._journal.flush()
+        if PRACTICE1_FSYNC:
+            os.fsync(self._journal.fileno())
+        self._journal_entries += 1
+        if self._journal_entries >= self._snapshot_every:
+            self.snapshot()
+
+    def snapshot(self) -> None:
+        """
+        Записывает всё состояние в снапшот (через временный файл) и обнуляет журнал
+        """
+        if self._snapshot_path is None:
+            return
+        with self._lock:
+            tmp_path = self._snapshot_path + ".tmp"
+            with open(tmp_path, "w", encoding="utf-8") as f:
+                json.dump([item.model_dump(mode="json") for item in self._items.values()], f, ensure_ascii=False)
+                f.flush()
+                os.fsync(f.fileno())
+            os.replace(tmp_path, self._snapshot_path)
+            self._journal.close()
+            self._journal = open(self._journal_path, "w", encoding="utf-8")
+            self._journal_entries = 0
+
+    def close(self) -> None:
+        if self._journal is not None:
+            self.snapshot()
+            self._journal.close()
+            self._journal = None
+
+
+def _index_value(value: Any) -> Optional[str]:
+    # значения индексов хранятся строками, чтобы одна схема подходила для любых ключей
+    if value is None:
+        return None
+    if isinstance(value, Enum):
+        return str(value.value)
+    return str(value)
+
+
+class SqlRepository(Repository[T]):
+    """
+    Те же операции поверх SQL (SQLite или Postgres через SQLAlchemy Core).
+    Модель хранится JSON-документом, а индексируемые поля — отдельными колонками с индексами,
+    поэтому схема не зависит от вложенности модели (профессия и навыки внутри воина).
+    """
+    def __init__(self, name: str, model: Type[T], url: str,
+                 indexes: Optional[Dict[str, Callable[[T], Hashable]]] = None):
+        from sqlalchemy import MetaData, Table, Column, Integer, String, Text, create_engine
+
+        self.model = model
+        self._key_funcs = indexes or {}
+        self.engine = create_engine(url)
+        self.table = Table(
+            name, MetaData(),
+            Column("id", Integer, primary_key=True, autoincrement=False),
+            *(Column(index, String, index=True) for index in self._key_funcs),
+            Column("data", Text, nullable=False),
+        )
+        self.table.create(self.engine, checkfirst=True)
+
+    def _row(self, item: T) -> dict:
+        row = {"id": item.id, "data": item.model_dump_json()}
+        for name, key in self._key_funcs.items():
+            row[name] = _index_value(key(item))
+        return row
+
+    def _select(self, *where) -> List[T]:
+        from sqlalchemy import select
+
+        statement = select(self.table.c.data).where(*where).order_by(self.table.c.id)
+        with self.engine.connect() as conn:
+            return [self.model.model_validate_json(data) for data in conn.execute(statement).scalars()]
+
+    def __len__(self) -> int:
+        from sqlalchemy import select, func
+
+        with self.engine.connect() as conn:
+            return conn.execute(select(func.count()).select_from(self.table)).scalar_one()
+
+    def list(self) -> List[T]:
+        return self._select()
+
+    def get(self, item_id: int) -> Optional[T]:
+        items = self._select(self.table.c.id == item_id)
+        return items[0] if items else None
+
+    def find_by(self, index: str, value: Hashable) -> List[T]:
+        column = self.table.c[index]
+        value = _index_value(value)
+        return self._select(column.is_(None) if value is None else column == value)
+
+    def add(self, item: T) -> T:
+        from sqlalchemy import exc
+
+        try:
+            with self.engine.begin() as conn:
+                conn.execute(self.table.insert().values(self._row(item)))
+        except exc.IntegrityError:
+            raise AlreadyExists(item.id)
+        return item
+
+    def replace(self, item_id: int, item: T) -> T:
+        from sqlalchemy import exc
+
+        try:
+            with self.engine.begin() as conn:
+                result = conn.execute(self.table.update().where(self.table.c.id == item_id).values(self._row(item)))
+        except exc.IntegrityError:
+            raise AlreadyExists(item.id)
+        if result.rowcount == 0:
+            raise NotFound(item_id)
+        return item
+
+    def delete(self, item_id: int) -> None:
+        with self.engine.begin() as conn:
+            result = conn.execute(self.table.delete().where(self.table.c.id == item_id))
+        if result.rowcount == 0:
+            raise NotFound(item_id)
+
+    def close(self) -> None:
+        self.engine.dispose()
+
+
+def create_repository(name: str, model: Type[T], indexes: Optional[Dict[str, Callable[[T], Hashable]]] = None,
+                      backend: str = PRACTICE1_BACKEND, url: Optional[str] = PRACTICE1_DB_URL) -> Repository[T]:
+    """
+    Выбор хранилища по PRACTICE1_BACKEND: memory (без зависимостей), sqlite или postgres (нужен SQLAlchemy)
+    """
+    if backend == "memory":
+        return InMemoryRepository(name, model, indexes=indexes)
+    if backend == "sqlite":
+        return SqlRepository(name, model, url or "sqlite:///practice1.sqlite3", indexes=indexes)
+    if backend == "postgres":
+        if not url:
+            raise RuntimeError("Environment variable PRACTICE1_DB_URL is not set")
+        return SqlRepository(name, model, url, indexes=indexes)
+    raise RuntimeError(f"Unknown PRACTICE1_BACKEND: {backend}")
@@ -1,7 +1,7 @@
 from fastapi import FastAPI, Depends, HTTPException
 from typing import List
 from sqlmodel import select
-from app.connection import init_db, get_session
+from app.connection import init_db, get_session, pool_metrics
 from app.models import (
     Warrior, WarriorDefault, WarriorResponse,
     Skill, SkillCreate,
@@ -19,6 +19,12 @@ def on_startup():
     init_db()
 
 
+# метрики пула соединений для подбора DB_POOL_SIZE / DB_MAX_OVERFLOW
+@app.get("/health/db", summary="Состояние пула соединений")
+def db_health():
+    return pool_metrics()
+
+
 # ============================================================================
 
 # post запрос на создание warrior
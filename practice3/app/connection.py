@@ -1,6 +1,12 @@
 import os
+import time
+import threading
+
+from sqlalchemy import exc
+from sqlalchemy.engine import make_url
+from sqlalchemy.pool import QueuePool
 from dotenv import load_dotenv
-from sqlmodel import SQLModel, create_engine
+from sqlmodel import SQLModel, Session, create_engine
 
 # загружаем .env из корня проекта
 load_dotenv()
@@ -9,7 +15,107 @@ DATABASE_URL = os.getenv("DB_ADMIN")
 if not DATABASE_URL:
     raise RuntimeError("Не задана переменная окружения DB_ADMIN")
 
-engine = create_engine(DATABASE_URL, echo=True)
+def _env_flag(name: str, default: str) -> bool:
+    return os.getenv(name, default).lower() in ("1", "true", "yes")
+
+
+# настройки пула соединений, echo по умолчанию выключен
+DB_ECHO = _env_flag("DB_ECHO", "0")
+DB_POOL_SIZE = int(os.getenv("DB_POOL_SIZE", "5"))
+DB_MAX_OVERFLOW = int(os.getenv("DB_MAX_OVERFLOW", "10"))
+DB_POOL_TIMEOUT = float(os.getenv("DB_POOL_TIMEOUT", "30"))
+DB_POOL_RECYCLE = int(os.getenv("DB_POOL_RECYCLE", "1800"))
+DB_POOL_PRE_PING = _env_flag("DB_POOL_PRE_PING", "1")
+DB_STATEMENT_TIMEOUT_MS = int(os.getenv("DB_STATEMENT_TIMEOUT_MS", "0"))
+
+
+class PoolWaitStats:
+    """
+    Сколько запросов ждали соединение из пула и как долго
+    """
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.checkouts = 0
+        self.timeouts = 0
+        self.total_wait = 0.0
+        self.max_wait = 0.0
+
+    def record(self, elapsed: float, timed_out: bool = False) -> None:
+        with self._lock:
+            self.checkouts += 1
+            self.timeouts += timed_out
+            self.total_wait += elapsed
+            self.max_wait = max(self.max_wait, elapsed)
+
+    def snapshot(self) -> dict:
+        with self._lock:
+            return {
+                "checkouts": self.checkouts,
+                "timeouts": self.timeouts,
+                "avg_wait_ms": self.total_wait / self.checkouts * 1000 if self.checkouts else 0.0,
+                "max_wait_ms": self.max_wait * 1000,
+            }
+
+
+def _timed_pool(base):
+    """
+    Подкласс пула, замеряющий время ожидания свободного соединения.
+    Класс и статистика создаются на каждый движок, поэтому пулы не смешивают счётчики,
+    а pool.recreate() (dispose, переподключение) продолжает ту же статистику.
+    """
+    stats = PoolWaitStats()
+
+    class TimedPool(base):
+        wait_stats = stats
+
+        def _do_get(self):
+            start = time.perf_counter()
+            try:
+                conn = super()._do_get()
+            except exc.TimeoutError:
+                stats.record(time.perf_counter() - start, timed_out=True)
+                raise
+            stats.record(time.perf_counter() - start)
+            return conn
+
+    return TimedPool
+
+
+connect_args = {}
+if DB_STATEMENT_TIMEOUT_MS and make_url(DATABASE_URL).get_backend_name() == "postgresql":
+    connect_args["options"] = f"-c statement_timeout={DB_STATEMENT_TIMEOUT_MS}"
+
+engine = create_engine(
+    DATABASE_URL,
+    echo=DB_ECHO,
+    poolclass=_timed_pool(QueuePool),
+    pool_size=DB_POOL_SIZE,
+    max_overflow=DB_MAX_OVERFLOW,
+    pool_timeout=DB_POOL_TIMEOUT,
+    pool_recycle=DB_POOL_RECYCLE,
+    pool_pre_ping=DB_POOL_PRE_PING,
+    connect_args=connect_args,
+)
+
+
+def pool_metrics() -> dict:
+    """
+    состояние пула: занятые соединения, overflow и время ожидания
+    """
+    pool = engine.pool
+    return {
+        "size": pool.size(),
+        "checked_out": pool.checkedout(),
+        "checked_in": pool.checkedin(),
+        "overflow": pool.overflow(),
+        **pool.wait_stats.snapshot(),
+    }
+
 
 def init_db():
     SQLModel.metadata.create_all(engine)
+
+
+def get_session():
+    with Session(engine) as session:
+        yield session
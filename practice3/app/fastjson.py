@@ -0,0 +1,38 @@
+import os
+from typing import Any, Optional
+
+from fastapi import Response
+from fastapi.responses import JSONResponse
+from pydantic import TypeAdapter
+
+# быстрый путь ответов (по умолчанию выключен): ORJSONResponse для словарей и
+# сериализация строк БД напрямую по объявленной схеме, без повторной валидации response_model
+FAST_JSON = os.getenv("FAST_JSON", "0").lower() in ("1", "true", "yes")
+
+
+def default_response_class():
+    """
+    Класс ответа приложения: ORJSONResponse, если включён FAST_JSON и установлен orjson
+    """
+    if FAST_JSON:
+        try:
+            import orjson  # noqa: F401
+        except ImportError:
+            return JSONResponse
+        from fastapi.responses import ORJSONResponse
+        return ORJSONResponse
+    return JSONResponse
+
+
+def json_response(data: Any, adapter: TypeAdapter, response: Optional[Response] = None, **dump_options) -> Any:
+    """
+    При FAST_JSON сериализует data сериализатором pydantic-core по схеме adapter и сразу
+    возвращает Response, поэтому FastAPI не валидирует результат повторно через response_model.
+    Иначе возвращает data как есть (обычный путь). Заголовки из response (ETag, X-Next-Cursor) переносятся.
+    """
+    if not FAST_JSON:
+        return data
+    headers = None
+    if response is not None:
+        headers = {name: value for name, value in response.headers.items() if name != "content-length"}
+    return Response(content=adapter.dump_json(data, **dump_options), media_type="application/json", headers=headers)
@@ -1,16 +1,28 @@
-from fastapi import FastAPI, Depends, HTTPException
-from typing import List
+from fastapi import FastAPI, Depends, HTTPException, Query, Response
+from typing import Any, List, Optional
+from pydantic import ValidationError, TypeAdapter
+from sqlalchemy import insert
+from sqlalchemy.orm import selectinload
 from sqlmodel import select
-from app.connection import init_db, get_session
+from app.connection import init_db, get_session, pool_metrics, engine
+from app.profiling import QueryProfilerMiddleware, instrument_engine
 from app.models import (
-    Warrior, WarriorDefault, WarriorResponse,
-    Skill, SkillCreate,
-    Profession, ProfessionCreate
+    Warrior, WarriorDefault, WarriorResponse, RaceType,
+    Skill, SkillCreate, SkillLinkCreate, SkillWarriorLink,
+    Profession, ProfessionCreate,
+    SkillLeader, LevelBucket, ProfessionStats
 )
+from app.cache import response_cache, cached_json_response
+from app.fastjson import default_response_class, json_response
+from app.stats import stats_cache, top_warriors_by_skill, level_histogram_by_race, profession_stats
 
 
 
-app = FastAPI()
+app = FastAPI(default_response_class=default_response_class())
+
+# число SQL-запросов и время в БД на каждый запрос (Server-Timing, лог медленных)
+instrument_engine(engine)
+app.add_middleware(QueryProfilerMiddleware)
 
 
 # создание таблиц прис старте, если их пока нет
@@ -19,6 +31,17 @@ def on_startup():
     init_db()
 
 
+# метрики пула соединений для подбора DB_POOL_SIZE / DB_MAX_OVERFLOW
+@app.get("/health/db", summary="Состояние пула соединений")
+def db_health():
+    return pool_metrics()
+
+# попадания и промахи кэша справочников
+@app.get("/health/cache", summary="Состояние кэша ответов")
+def cache_health():
+    return response_cache.metrics()
+
+
 # ============================================================================
 
 # post запрос на создание warrior
@@ -27,21 +50,74 @@ def create_warrior(warrior: WarriorDefault, session=Depends(get_session)):
     db_warrior = Warrior(**warrior.dict())
     session.add(db_warrior)
     session.commit()
+    stats_cache.invalidate_warriors()
     session.refresh(db_warrior)
     return db_warrior
 
+# профессия и навыки подгружаются пачкой (по запросу на связь), а не лениво на каждого воина
+WARRIOR_RELATIONS = (selectinload(Warrior.profession), selectinload(Warrior.skills))
+
+WARRIOR_ADAPTER = TypeAdapter(WarriorResponse)
+WARRIORS_ADAPTER = TypeAdapter(List[WarriorResponse])
+
+def _warrior_response(warrior: Warrior) -> WarriorResponse:
+    # поля уже проверены при загрузке из БД, поэтому без повторной валидации
+    return WarriorResponse.model_construct(
+        id=warrior.id,
+        race=warrior.race,
+        name=warrior.name,
+        level=warrior.level,
+        profession_id=warrior.profession_id,
+        profession=warrior.profession,
+        skills=warrior.skills,
+    )
+
 # get запрос на получение списка воинов
 @app.get("/warriors", response_model=List[WarriorResponse], summary="Получить список всех воинов")
-def list_warriors(session=Depends(get_session)):
-    return session.exec(select(Warrior)).all()
+def list_warriors(
+        response: Response,
+        after_id: Optional[int] = Query(None, ge=0, description="Курсор: id последнего воина предыдущей страницы"),
+        limit: int = Query(50, ge=1, le=200),
+        race: Optional[RaceType] = None,
+        level_min: Optional[int] = None,
+        level_max: Optional[int] = None,
+        profession_id: Optional[int] = None,
+        skill_id: Optional[int] = None,
+        session=Depends(get_session)
+):
+    """
+    Keyset-пагинация по Warrior.id, курсор следующей страницы — в заголовке X-Next-Cursor.
+    На страницу уходит три запроса: воины, их профессии и их навыки.
+    """
+    statement = select(Warrior)
+    if after_id is not None:
+        statement = statement.where(Warrior.id > after_id)
+    if race is not None:
+        statement = statement.where(Warrior.race == race)
+    if level_min is not None:
+        statement = statement.where(Warrior.level >= level_min)
+    if level_max is not None:
+        statement = statement.where(Warrior.level <= level_max)
+    if profession_id is not None:
+        statement = statement.where(Warrior.profession_id == profession_id)
+    if skill_id is not None:
+        statement = statement.where(Warrior.id.in_(
+            select(SkillWarriorLink.warrior_id).where(SkillWarriorLink.skill_id == skill_id)
+        ))
+
+    statement = statement.options(*WARRIOR_RELATIONS).order_by(Warrior.id).limit(limit)
+    warriors = session.exec(statement).all()
+    if len(warriors) == limit:
+        response.headers["X-Next-Cursor"] = str(warriors[-1].id)
+    return json_response([_warrior_response(w) for w in warriors], WARRIORS_ADAPTER, response)
 
 # get запрос на получения воина по id
 @app.get("/warriors/{warrior_id}", response_model=WarriorResponse, summary="Получить воина по ID (с вложенными навыками)")
 def get_warrior(warrior_id: int, session=Depends(get_session)):
-    warrior = session.get(Warrior, warrior_id)
+    warrior = session.exec(select(Warrior).where(Warrior.id == warrior_id).options(*WARRIOR_RELATIONS)).first()
     if not warrior:
         raise HTTPException(status_code=404, detail="Warrior not found")
-    return warrior
+    return json_response(_warrior_response(warrior), WARRIOR_ADAPTER)
 
 # patch запрос для частичного обновления данных
 @app.patch("/warriors/{warrior_id}", response_model=WarriorResponse, summary="Частично обновить воина")
@@ -57,6 +133,7 @@ def update_warrior(warrior_id: int, warrior: WarriorDefault, session=Depends(get
 
     session.add(db_warrior)
     session.commit()
+    stats_cache.invalidate_warriors()
     session.refresh(db_warrior)
     return db_warrior
 
@@ -68,6 +145,7 @@ def delete_warrior(warrior_id: int, session=Depends(get_session)):
         raise HTTPException(status_code=404, detail="Warrior not found")
     session.delete(warrior)
     session.commit()
+    stats_cache.invalidate_warriors()
     return {"ok": True}
 
 # ============================================================================
@@ -77,19 +155,27 @@ def create_skill(skill: SkillCreate, session=Depends(get_session)):
     db_skill = Skill(**skill.dict())
     session.add(db_skill)
     session.commit()
+    response_cache.invalidate("skills")
     session.refresh(db_skill)
     return db_skill
 
+# справочники отдаются готовым JSON из кэша и сбрасываются при любой записи
+SKILLS_ADAPTER = TypeAdapter(List[Skill])
+SKILL_ADAPTER = TypeAdapter(Skill)
+PROFESSIONS_ADAPTER = TypeAdapter(List[Profession])
+
 @app.get("/skills", response_model=List[Skill], summary="Получить все навыки")
 def list_skills(session=Depends(get_session)):
-    return session.exec(select(Skill)).all()
+    return cached_json_response("skills", "list", lambda: session.exec(select(Skill)).all(), SKILLS_ADAPTER)
 
 @app.get("/skills/{skill_id}", response_model=Skill, summary="Получить навык по id")
 def get_skill(skill_id: int, session=Depends(get_session)):
-    skill = session.get(Skill, skill_id)
-    if not skill:
-        raise HTTPException(status_code=404, detail="Skill not found")
-    return skill
+    def load():
+        skill = session.get(Skill, skill_id)
+        if not skill:
+            raise HTTPException(status_code=404, detail="Skill not found")
+        return skill
+    return cached_json_response("skills", str(skill_id), load, SKILL_ADAPTER)
 
 @app.patch("/skills/{skill_id}", response_model=Skill, summary="Обновить навык")
 def update_skill( skill_id: int, skill: SkillCreate, session=Depends(get_session)):
@@ -101,6 +187,7 @@ def update_skill( skill_id: int, skill: SkillCreate, session=Depends(get_session
         setattr(db_skill, key, val)
     session.add(db_skill)
     session.commit()
+    response_cache.invalidate("skills")
     session.refresh(db_skill)
     return db_skill
 
@@ -111,6 +198,8 @@ def delete_skill(skill_id: int, session=Depends(get_session)):
         raise HTTPException(status_code=404, detail="Skill not found")
     session.delete(skill)
     session.commit()
+    response_cache.invalidate("skills")
+    stats_cache.invalidate_skill(skill_id)
     return {"ok": True}
 
 # ============================================================================
@@ -126,8 +215,58 @@ def link_skill_to_warrior(warrior_id: int, skill_id:   int, session=    Depends(
     warrior.skills.append(skill)
     session.add(warrior)
     session.commit()
+    stats_cache.invalidate_skill(skill_id)
     return {"ok": True}
 
+MAX_BULK_ITEMS = 500
+
+@app.post("/warriors/{warrior_id}/skills", summary="Привязать воину несколько навыков")
+def link_skills_to_warrior_bulk(warrior_id: int, items: List[Any], session=Depends(get_session)):
+    if len(items) > MAX_BULK_ITEMS:
+        raise HTTPException(status_code=413, detail=f"At most {MAX_BULK_ITEMS} items per request")
+    if session.exec(select(Warrior.id).where(Warrior.id == warrior_id)).first() is None:
+        raise HTTPException(status_code=404, detail="Warrior not found")
+
+    # валидация каждого элемента отдельно, ошибки возвращаются по индексу
+    links, errors = {}, []
+    for index, raw in enumerate(items):
+        try:
+            link = SkillLinkCreate.model_validate(raw)
+        except ValidationError as e:
+            errors.append({"index": index, "errors": e.errors(include_url=False, include_context=False)})
+            continue
+        if link.skill_id in links:
+            errors.append({"index": index, "errors": ["Duplicate skill_id in request"]})
+            continue
+        links[link.skill_id] = (index, link)
+
+    # существующие навыки и уже привязанные — двумя запросами на весь пакет
+    ids = list(links)
+    known = set(session.exec(select(Skill.id).where(Skill.id.in_(ids))).all()) if ids else set()
+    linked = set(session.exec(
+        select(SkillWarriorLink.skill_id)
+        .where(SkillWarriorLink.warrior_id == warrior_id, SkillWarriorLink.skill_id.in_(ids))
+    ).all()) if ids else set()
+
+    rows = []
+    for skill_id, (index, link) in links.items():
+        if skill_id not in known:
+            errors.append({"index": index, "errors": ["Skill not found"]})
+        elif skill_id in linked:
+            errors.append({"index": index, "errors": ["Skill already linked"]})
+        else:
+            rows.append({"warrior_id": warrior_id, "skill_id": skill_id, "level": link.level})
+
+    created = []
+    if rows:
+        # один многострочный INSERT ... RETURNING в одной транзакции
+        created = session.exec(insert(SkillWarriorLink).values(rows).returning(SkillWarriorLink.skill_id)).scalars().all()
+        session.commit()
+        for skill_id in created:
+            stats_cache.invalidate_skill(skill_id)
+    errors.sort(key=lambda e: e["index"])
+    return {"ok": True, "linked": list(created), "errors": errors}
+
 @app.delete("/warriors/{warrior_id}/skills/{skill_id}", summary="Отвязать навык от воина")
 def unlink_skill_from_warrior(warrior_id: int, skill_id:   int, session=    Depends(get_session)):
     warrior = session.get(Warrior, warrior_id)
@@ -138,6 +277,7 @@ def unlink_skill_from_warrior(warrior_id: int, skill_id:   int, session=    Depe
     warrior.skills.remove(skill)
     session.add(warrior)
     session.commit()
+    stats_cache.invalidate_skill(skill_id)
     return {"ok": True}
 
 # ============================================================================
@@ -147,14 +287,32 @@ def create_profession(prof: ProfessionCreate, session=Depends(get_session)):
     db_prof = Profession(**prof.dict())
     session.add(db_prof)
     session.commit()
+    stats_cache.invalidate_professions()
+    response_cache.invalidate("professions")
     session.refresh(db_prof)
     return db_prof
 
 @app.get("/professions", response_model=List[Profession], summary="Список профессий")
 def list_professions(session=Depends(get_session)):
-    return session.exec(select(Profession)).all()
+    return cached_json_response("professions", "list", lambda: session.exec(select(Profession)).all(), PROFESSIONS_ADAPTER)
 
 # ============================================================================
+# агрегаты для дашборда: считаются в SQL и кэшируются до изменения данных
 
+@app.get("/stats/skills/top", response_model=List[SkillLeader], summary="Лучшие воины по уровню каждого навыка")
+def skills_leaderboard(
+        k: int = Query(10, ge=1, le=100),
+        skill_id: Optional[int] = None,
+        session=Depends(get_session)
+):
+    return stats_cache.get_or_compute(("top", skill_id, k), lambda: top_warriors_by_skill(session, k, skill_id))
 
+@app.get("/stats/races/levels", response_model=List[LevelBucket], summary="Гистограмма уровней по расам")
+def race_level_histogram(width: int = Query(10, ge=1), session=Depends(get_session)):
+    return stats_cache.get_or_compute(("races", width), lambda: level_histogram_by_race(session, width))
 
+@app.get("/stats/professions", response_model=List[ProfessionStats], summary="Воины и уровни по профессиям")
+def professions_summary(session=Depends(get_session)):
+    return stats_cache.get_or_compute(("professions",), lambda: profession_stats(session))
+
+# ============================================================================
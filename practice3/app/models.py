@@ -1,5 +1,6 @@
 from enum import Enum
 from typing import Optional, List
+from sqlalchemy import Index
 from sqlmodel import SQLModel, Field, Relationship
 
 
@@ -15,6 +16,13 @@ class SkillWarriorLink(SQLModel, table=True):
     """
     ассоциативная сущность для many to many
     """
+    # PK (skill_id, warrior_id) покрывает фильтр по навыку, а этот индекс — подгрузку навыков воинов
+    __table_args__ = (
+        Index("ix_skillwarriorlink_warrior_id", "warrior_id"),
+        # лидерборд навыка: row_number() по skill_id с сортировкой по level
+        Index("ix_skillwarriorlink_skill_id_level", "skill_id", "level"),
+    )
+
     skill_id: Optional[int] = Field(
                                     default=None, 
                                     foreign_key="skill.id", 
@@ -50,6 +58,13 @@ class SkillCreate(SQLModel):
     name:        str
     description: Optional[str] = ""
 
+class SkillLinkCreate(SQLModel):
+    """
+    dto для пакетной привязки навыка к воину
+    """
+    skill_id:    int
+    level:       Optional[int] = 1
+
 # ============================================================================
 
 class Profession(SQLModel, table=True):
@@ -85,6 +100,13 @@ class Warrior(WarriorDefault, table=True):
     """
     сущность воинов
     """
+    # индексы под фильтры списка воинов, id в конце — для keyset-пагинации
+    __table_args__ = (
+        Index("ix_warrior_race_id", "race", "id"),
+        Index("ix_warrior_level_id", "level", "id"),
+        Index("ix_warrior_profession_id_id", "profession_id", "id"),
+    )
+
     id:             Optional[int] = Field(default=None, primary_key=True)
 
     # связь many to many на Skill через SkillWarriorLink
@@ -106,3 +128,34 @@ class WarriorResponse(WarriorDefault):
 
 # ============================================================================
 
+
+class SkillLeader(SQLModel):
+    """
+    dto строка лидерборда навыка
+    """
+    skill_id:       int
+    warrior_id:     int
+    name:           str
+    level:          Optional[int]
+    position:       int
+
+class LevelBucket(SQLModel):
+    """
+    dto корзина гистограммы уровней по расе
+    """
+    race:           RaceType
+    level_from:     int
+    level_to:       int
+    warriors:       int
+
+class ProfessionStats(SQLModel):
+    """
+    dto агрегаты по профессии
+    """
+    profession_id:  int
+    title:          str
+    warriors:       int
+    avg_level:      Optional[float]
+    max_level:      Optional[int]
+
+# ============================================================================
@@ -0,0 +1,114 @@
+import os
+import time
+import threading
+from typing import Callable, Dict, Hashable, List, Optional
+
+from sqlalchemy import func
+from sqlmodel import Session, select
+
+from app.models import Warrior, Profession, SkillWarriorLink
+
+# страховка для нескольких воркеров: инвалидация локальная, поэтому кэш живёт не дольше TTL
+STATS_CACHE_TTL = float(os.getenv("STATS_CACHE_TTL", "60"))
+
+
+class StatsCache:
+    """
+    Кэш агрегатов для дашборда. Записи сбрасываются точечно:
+    изменение связей навыка трогает только лидерборды этого навыка.
+    """
+    def __init__(self, ttl: float = STATS_CACHE_TTL):
+        self.ttl = ttl
+        self._entries: Dict[Hashable, tuple] = {}
+        self._lock = threading.Lock()
+        # растёт при каждой инвалидации: результат, посчитанный во время записи, не кэшируется
+        self._generation = 0
+
+    def get_or_compute(self, key: Hashable, compute: Callable[[], list]) -> list:
+        now = time.monotonic()
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None and entry[0] > now:
+                return entry[1]
+            generation = self._generation
+        value = compute()
+        with self._lock:
+            if generation == self._generation:
+                self._entries[key] = (now + self.ttl, value)
+        return value
+
+    def _drop(self, predicate: Callable[[tuple], bool]) -> None:
+        with self._lock:
+            self._generation += 1
+            for key in [k for k in self._entries if predicate(k)]:
+                del self._entries[key]
+
+    def invalidate_skill(self, skill_id: int) -> None:
+        # лидерборд по всем навыкам тоже содержит этот навык
+        self._drop(lambda key: key[0] == "top" and key[1] in (skill_id, None))
+
+    def invalidate_professions(self) -> None:
+        self._drop(lambda key: key[0] == "professions")
+
+    def invalidate_warriors(self) -> None:
+        # воин входит во все агрегаты (имя в лидербордах, раса, уровень, профессия)
+        self._drop(lambda key: True)
+
+
+stats_cache = StatsCache()
+
+
+def top_warriors_by_skill(session: Session, k: int, skill_id: Optional[int] = None) -> List[dict]:
+    """
+    Top-K воинов по уровню навыка для каждого навыка: row_number() по разделам skill_id
+    """
+    position = func.row_number().over(
+        partition_by=SkillWarriorLink.skill_id,
+        order_by=(SkillWarriorLink.level.desc(), SkillWarriorLink.warrior_id),
+    ).label("position")
+    ranked = (
+        select(SkillWarriorLink.skill_id, SkillWarriorLink.warrior_id, Warrior.name, SkillWarriorLink.level, position)
+        .join(Warrior, Warrior.id == SkillWarriorLink.warrior_id)
+    )
+    if skill_id is not None:
+        ranked = ranked.where(SkillWarriorLink.skill_id == skill_id)
+    ranked = ranked.subquery()
+    rows = session.exec(
+        select(*ranked.c).where(ranked.c.position <= k).order_by(ranked.c.skill_id, ranked.c.position)
+    ).all()
+    return [row._asdict() for row in rows]
+
+
+def level_histogram_by_race(session: Session, width: int) -> List[dict]:
+    """
+    Гистограмма уровней воинов по расам с корзинами ширины width
+    """
+    bucket = (Warrior.level // width * width).label("level_from")
+    rows = session.exec(
+        select(Warrior.race, bucket, func.count().label("warriors"))
+        .group_by(Warrior.race, bucket)
+        .order_by(Warrior.race, bucket)
+    ).all()
+    return [
+        {"race": race, "level_from": level_from, "level_to": level_from + width - 1, "warriors": count}
+        for race, level_from, count in rows
+    ]
+
+
+def profession_stats(session: Session) -> List[dict]:
+    """
+    Число воинов, средний и максимальный уровень по каждой профессии
+    """
+    rows = session.exec(
+        select(
+            Profession.id.label("profession_id"),
+            Profession.title,
+            func.count(Warrior.id).label("warriors"),
+            func.avg(Warrior.level).label("avg_level"),
+            func.max(Warrior.level).label("max_level"),
+        )
+        .outerjoin(Warrior, Warrior.profession_id == Profession.id)
+        .group_by(Profession.id, Profession.title)
+        .order_by(Profession.id)
+    ).all()
+    return [row._asdict() for row in rows]
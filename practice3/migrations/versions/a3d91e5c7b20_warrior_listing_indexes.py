@@ -0,0 +1,34 @@
+"""warrior listing indexes
+
+Revision ID: a3d91e5c7b20
+Revises: f95c002f07c5
+Create Date: 2026-10-18 14:20:37.518204
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'a3d91e5c7b20'
+down_revision: Union[str, None] = 'f95c002f07c5'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    op.create_index('ix_warrior_race_id', 'warrior', ['race', 'id'], unique=False)
+    op.create_index('ix_warrior_level_id', 'warrior', ['level', 'id'], unique=False)
+    op.create_index('ix_warrior_profession_id_id', 'warrior', ['profession_id', 'id'], unique=False)
+    op.create_index('ix_skillwarriorlink_warrior_id', 'skillwarriorlink', ['warrior_id'], unique=False)
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    op.drop_index('ix_skillwarriorlink_warrior_id', table_name='skillwarriorlink')
+    op.drop_index('ix_warrior_profession_id_id', table_name='warrior')
+    op.drop_index('ix_warrior_level_id', table_name='warrior')
+    op.drop_index('ix_warrior_race_id', table_name='warrior')
@@ -0,0 +1,28 @@
+"""skill leaderboard index
+
+Revision ID: c6f2b8e40d19
+Revises: a3d91e5c7b20
+Create Date: 2026-10-18 15:02:49.661370
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'c6f2b8e40d19'
+down_revision: Union[str, None] = 'a3d91e5c7b20'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    op.create_index('ix_skillwarriorlink_skill_id_level', 'skillwarriorlink', ['skill_id', 'level'], unique=False)
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    op.drop_index('ix_skillwarriorlink_skill_id_level', table_name='skillwarriorlink')